@@ -9,6 +9,7 @@ to show their combined impact on the multimodal agents lab.
 import os
 import json
 from process_new_data import process_text_file
+from docx_extraction import get_docx_texts
 from collections import Counter
 import re
 
@@ -85,12 +86,16 @@ def analyze_docx_content():
         print(f"  {i:2d}. {filename}")
     
     # Analyze each file
-    all_content = ""
+    content_parts = []
     file_analysis = {}
     
     print(f"\n📊 Processing DOCX files...")
     print("=" * 50)
     
+    # Extract every file up front in parallel; process_text_file below reads the cache.
+    # Files that fail here are reported by the per-file error handling below
+    get_docx_texts((f'data/text/{filename}' for filename in docx_files), errors={})
+    
     for filename in docx_files:
         filepath = f'data/text/{filename}'
         print(f"\n🔍 Analyzing: {filename}")
@@ -100,7 +105,7 @@ def analyze_docx_content():
             if docs:
                 doc = docs[0]
                 content = doc['full_content']
-                all_content += content + " "
+                content_parts.append(content + " ")
                 
                 # Basic analysis
                 char_count = len(content)
@@ -124,7 +129,7 @@ def analyze_docx_content():
         except Exception as e:
             print(f"  ❌ Error processing {filename}: {e}")
     
-    return file_analysis, all_content
+    return file_analysis, "".join(content_parts)
 
 def analyze_combined_impact():
     """Analyze the combined impact of both data types"""
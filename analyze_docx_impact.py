@@ -7,6 +7,7 @@ This script analyzes the DOCX files added to data/text/ and shows how they affec
 
 import os
 from process_new_data import process_text_file
+from docx_extraction import get_docx_texts
 from collections import Counter
 import re
 
@@ -26,13 +27,17 @@ def analyze_docx_content():
         print(f"  {i:2d}. {filename}")
     
     # Analyze each file
-    all_content = ""
+    content_parts = []
     file_analysis = {}
     medical_terms = []
     
     print(f"\n📊 Processing and analyzing each file...")
     print("=" * 60)
     
+    # Extract every file up front in parallel; process_text_file below reads the cache.
+    # Files that fail here are reported by the per-file error handling below
+    get_docx_texts((f'data/text/{filename}' for filename in docx_files), errors={})
+    
     for filename in docx_files:
         filepath = f'data/text/{filename}'
         print(f"\n🔍 Analyzing: {filename}")
@@ -42,7 +47,7 @@ def analyze_docx_content():
             if docs:
                 doc = docs[0]
                 content = doc['full_content']
-                all_content += content + " "
+                content_parts.append(content + " ")
                 
                 # Basic analysis
                 char_count = len(content)
@@ -127,7 +132,7 @@ def analyze_docx_content():
             for file in files:
                 print(f"    - {file}")
     
-    return file_analysis, all_content
+    return file_analysis, "".join(content_parts)
 
 def show_impact_on_ai_agent():
     """Show how the DOCX files impact the AI agent"""
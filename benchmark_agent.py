@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Agent turn benchmark for Snowflake Multimodal Agents Lab
+
+Drives concurrent simulated sessions through the SnowflakeAgent loops (basic,
+with memory, and ReAct) against local stand-ins: the deterministic fake Gemini
+client and embedding server from fake_backends, and a SQLite documents table per
+session with small page images on disk.
+
+Model latency is simulated, so what is left of each turn is the orchestration
+overhead we control: prompt assembly, retrieval, SQL, image decoding, history I/O
+and the HTTP round trip to the embedding endpoint. Turns are traced, and the report
+gives turns/sec, turn latency percentiles and the overhead per span kind with the
+simulated model time subtracted.
+
+Usage:
+    python benchmark_agent.py --mode memory --sessions 16 --turns 10 --llm-latency 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+import tracing
+from embedding_codec import format_embeddings_for_snowflake
+from fake_backends import FakeEmbeddingServer, FakeGeminiClient
+from snowflake_agent import SnowflakeAgent
+from snowflake_config import get_config
+from sqlite_standin import SQLiteConnection
+from tracing import Tracer, latency_breakdown
+
+MODES = ("basic", "memory", "react")
+
+class TurnCollector:
+    """Trace exporter that keeps the latency breakdown of every benchmark turn"""
+
+    def __init__(self):
+        self.breakdowns: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[tracing.Span]) -> None:
+        root = next((s for s in spans if s.parent_id is None), None)
+        if root is not None and root.name == "loadgen.turn":
+            breakdown = latency_breakdown(spans)
+            with self._lock:
+                self.breakdowns.append(breakdown)
+
+def write_page_images(directory: str, count: int, size: int = 256) -> List[str]:
+    """Small PNG page images for the retrieved keys, so image decoding is part of the turn"""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    paths = []
+    for n in range(count):
+        path = os.path.join(directory, f"page_{n}.png")
+        pixels = rng.integers(0, 255, size=(size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+def document_text(n: int) -> str:
+    return f"document {n}"
+
+def make_session_connection(keys: List[str], embeddings: List[List[float]]) -> SQLiteConnection:
+    conn = SQLiteConnection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO multimodal_documents (key, width, height, embedding) VALUES (%s, %s, %s, %s)",
+        [(key, 256, 256, embedding) for key, embedding in zip(keys, format_embeddings_for_snowflake(embeddings))],
+    )
+    cursor.close()
+    conn.commit()
+    return conn
+
+def run_load(mode: str = "basic", sessions: int = 4, turns: int = 5, corpus_size: int = 100,
+             dimensions: int = 256, llm_latency: float = 0.0, embedding_latency: float = 0.0,
+             workdir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run concurrent sessions through an agent loop and report throughput and overhead
+
+    Args:
+        mode: Agent loop: `basic` (generate_answer), `memory` (generate_answer_with_memory)
+            or `react` (generate_answer_react)
+        sessions: Concurrent sessions, each with its own agent and connection
+        turns: Turns per session
+        corpus_size: Documents (and page images) per session's table
+        dimensions: Embedding dimensions
+        llm_latency: Simulated seconds per Gemini call
+        embedding_latency: Simulated seconds per embedding request
+        workdir: Directory for the page images. Defaults to a temporary directory.
+
+    Returns:
+        Dict[str, Any]: Report with `turns_per_second`, `p50_ms`, `p99_ms`, `model_seconds`,
+            `overhead_ms_per_turn` and `overhead_breakdown` (seconds per span kind)
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode}. Use one of {', '.join(MODES)}")
+
+    # A real connection has loaded snowflake.connector already; load it here too, so the
+    # lazy import in dict_cursor is not timed as part of the first turns
+    import snowflake.connector  # noqa: F401
+
+    scratch = workdir or tempfile.mkdtemp(prefix="agent_benchmark_")
+    keys = write_page_images(os.path.join(scratch, "images"), corpus_size)
+    client = FakeGeminiClient(latency_seconds=llm_latency)
+    collector = TurnCollector()
+    tracer = Tracer(capacity=1024, exporter=collector)
+
+    config = get_config()
+    overrides = {"embedding_dimensions": dimensions, "search_mode": "client", "multi_vector_search": False}
+    saved_config = {name: getattr(config, name) for name in overrides}
+    saved_tracer = tracing._default_tracer
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    tracing._default_tracer = tracer
+
+    latencies = []
+    latencies_lock = threading.Lock()
+    try:
+        with FakeEmbeddingServer(dimensions=dimensions, latency_seconds=embedding_latency) as server:
+            embeddings = [server.backend.vector(document_text(n)) for n in range(corpus_size)]
+            agents = [
+                SnowflakeAgent(make_session_connection(keys, embeddings), gemini_client=client, LLM="fake",
+                               serverless_url=server.url, config=config)
+                for _ in range(sessions)
+            ]
+
+            def run_session(session: int) -> None:
+                agent = agents[session]
+                for turn in range(turns):
+                    query = document_text((session * turns + turn) % corpus_size)
+                    started = time.perf_counter()
+                    with tracer.span("loadgen.turn", kind="loadgen", session=session, turn=turn):
+                        if mode == "basic":
+                            agent.generate_answer(query)
+                        elif mode == "memory":
+                            agent.generate_answer_with_memory(f"session-{session}", query)
+                        else:
+                            agent.generate_answer_react(query)
+                    with latencies_lock:
+                        latencies.append(time.perf_counter() - started)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=sessions) as executor:
+                    list(executor.map(run_session, range(sessions)))
+                wall_seconds = time.perf_counter() - started
+
+            for agent in agents:
+                agent.conn.close()
+            embedding_seconds = server.backend.latency.total_seconds
+            embedding_calls = server.backend.latency.calls
+    finally:
+        for name, value in saved_config.items():
+            setattr(config, name, value)
+        tracing._default_tracer = saved_tracer
+        if workdir is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    # Per-kind self time summed over all turns, with the simulated model time taken out
+    stages: Dict[str, float] = {}
+    for breakdown in collector.breakdowns:
+        for kind, seconds in breakdown["stages"].items():
+            stages[kind] = stages.get(kind, 0.0) + seconds
+    stages["llm"] = max(0.0, stages.get("llm", 0.0) - client.latency.total_seconds)
+    stages["embedding"] = max(0.0, stages.get("embedding", 0.0) - embedding_seconds)
+
+    total_turns = len(latencies)
+    turn_seconds = sum(latencies)
+    model_seconds = client.latency.total_seconds + embedding_seconds
+    overhead_seconds = max(0.0, turn_seconds - model_seconds)
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "turns": total_turns,
+        "corpus_size": corpus_size,
+        "llm_latency_seconds": llm_latency,
+        "embedding_latency_seconds": embedding_latency,
+        "wall_seconds": round(wall_seconds, 4),
+        "turns_per_second": round(total_turns / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "llm_calls": client.latency.calls,
+        "embedding_calls": embedding_calls,
+        "model_seconds": round(model_seconds, 4),
+        "overhead_seconds": round(overhead_seconds, 4),
+        "overhead_ms_per_turn": round(overhead_seconds / total_turns * 1000, 3) if total_turns else 0.0,
+        "overhead_fraction": round(overhead_seconds / turn_seconds, 4) if turn_seconds else 0.0,
+        "overhead_breakdown": {kind: round(seconds, 4)
+                               for kind, seconds in sorted(stages.items(), key=lambda x: -x[1])},
+    }
+
+def main():
+    """Run the load generator from the command line"""
+    parser = argparse.ArgumentParser(description="Benchmark agent turns against local model stand-ins")
+    parser.add_argument("--mode", default="all", help="basic, memory, react or all")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session")
+    parser.add_argument("--corpus-size", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per Gemini call")
+    parser.add_argument("--embedding-latency", type=float, default=0.0,
+                        help="Simulated seconds per embedding request")
+    parser.add_argument("--output", default="benchmarks/agent.json")
+    args = parser.parse_args()
+
+    modes = MODES if args.mode == "all" else [args.mode]
+    reports = []
+    for mode in modes:
+        report = run_load(mode, args.sessions, args.turns, args.corpus_size, args.dimensions,
+                          args.llm_latency, args.embedding_latency)
+        reports.append(report)
+        top = ", ".join(f"{kind} {seconds / report['turns'] * 1000:.2f}"
+                        for kind, seconds in list(report["overhead_breakdown"].items())[:4])
+        print(f"{mode:>7}: {report['turns_per_second']:>8.1f} turns/s  p50 {report['p50_ms']:.1f} ms  "
+              f"p99 {report['p99_ms']:.1f} ms  overhead {report['overhead_ms_per_turn']:.2f} ms/turn ({top})")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(reports, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Ingestion throughput benchmark for Snowflake Multimodal Agents Lab
+
+Generates PDFs and DOCX files in a scratch directory and times each ingestion
+stage against the SQLite stand-in of the documents table:
+
+    render    process_pdf_file (page rendering for every render profile)
+    extract   process_text_file on DOCX files (cold text cache)
+    encode    format_embeddings_for_snowflake on 1024-dim embeddings
+    load      process_new_data.load_embeddings_to_snowflake (upsert)
+    pipeline  ingest_directories end to end (extract, embed and write overlapped)
+
+Each stage reports items/sec (in its own unit: pages, files, embeddings or
+documents), MB/sec of input and the peak RSS so far. Results can be stored as a
+baseline; later runs flag every stage whose throughput dropped by more than the
+tolerance and exit with status 1.
+
+Usage:
+    python benchmark_ingestion.py --save-baseline
+    python benchmark_ingestion.py --baseline benchmarks/ingestion_baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pymupdf
+
+import docx_extraction
+import process_new_data
+from embedding_codec import format_embeddings_for_snowflake
+from snowflake_config import get_config
+from sqlite_standin import SQLiteConnection
+
+DEFAULT_BASELINE = "benchmarks/ingestion_baseline.json"
+
+WORDS = ("carotid artery stenosis plaque imaging sequence contrast velocity vessel lumen wall "
+         "patient scan protocol resolution signal measurement flow analysis report").split()
+
+def generate_pdfs(directory: str, count: int, pages: int, seed: int = 0) -> List[str]:
+    """Write PDFs with a page of text each, every third page with a colored figure"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for n in range(count):
+        path = os.path.join(directory, f"report_{n}.pdf")
+        with pymupdf.Document() as pdf:
+            for p in range(pages):
+                page = pdf.new_page(width=612, height=792)
+                text = " ".join(rng.choice(WORDS, size=400))
+                page.insert_textbox(pymupdf.Rect(50, 50, 562, 500), text, fontsize=10)
+                if p % 3 == 0:
+                    page.draw_rect(pymupdf.Rect(100, 520, 500, 740), color=(0.8, 0.1, 0.1), fill=(0.2, 0.4, 0.9))
+            pdf.save(path)
+        paths.append(path)
+    return paths
+
+def generate_docx_files(directory: str, count: int, paragraphs: int, seed: int = 0) -> List[str]:
+    """Write DOCX files with paragraphs of text and a small table"""
+    from docx import Document
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for n in range(count):
+        document = Document()
+        for _ in range(paragraphs):
+            document.add_paragraph(" ".join(rng.choice(WORDS, size=60)))
+        table = document.add_table(rows=5, cols=4)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = f"{rng.random():.3f}"
+        path = os.path.join(directory, f"notes_{n}.docx")
+        document.save(path)
+        paths.append(path)
+    return paths
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children, in MB"""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def time_stage(name: str, unit: str, items: int, input_bytes: int, run: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Run a stage with its output silenced and measure its throughput
+
+    Args:
+        name: Stage name
+        unit: What `items` counts (pages, files, ...)
+        items: Number of items the stage handles
+        input_bytes: Size of the stage's input
+        run: Runs the stage
+
+    Returns:
+        Dict[str, Any]: Stage record
+    """
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+    return {
+        "stage": name,
+        "unit": unit,
+        "items": items,
+        "seconds": round(seconds, 4),
+        "items_per_second": round(items / seconds, 2) if seconds > 0 else 0.0,
+        "mb_per_second": round(input_bytes / (1024 * 1024) / seconds, 3) if seconds > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def reset_docx_cache() -> None:
+    """Start from an empty DOCX text cache so extraction is measured cold"""
+    shutil.rmtree(get_config().docx_cache_dir, ignore_errors=True)
+    docx_extraction._default_cache = None
+
+def run_benchmark(workdir: str, pdfs: int = 4, pages: int = 10, docx_files: int = 20, paragraphs: int = 40,
+                  embeddings: int = 2000, dimensions: int = 1024, workers: Optional[int] = None,
+                  seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate inputs in `workdir` and time every ingestion stage
+
+    The benchmark runs with `workdir` as the current directory, so the relative
+    `data/...` paths used by the ingestion code (images, renders, caches) all land
+    in the scratch directory.
+
+    Args:
+        workdir: Scratch directory
+        pdfs: Number of PDFs
+        pages: Pages per PDF
+        docx_files: Number of DOCX files
+        paragraphs: Paragraphs per DOCX file
+        embeddings: Embeddings for the encode and load stages
+        dimensions: Embedding dimensions
+        workers: Extraction processes for the pipeline stage. Defaults to `SnowflakeConfig.ingest_workers`.
+        seed: Seed for the generated content
+
+    Returns:
+        List[Dict[str, Any]]: One record per stage
+    """
+    previous_dir = os.getcwd()
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    try:
+        pdf_paths = generate_pdfs("data/pdfs", pdfs, pages, seed)
+        docx_paths = generate_docx_files("data/text", docx_files, paragraphs, seed)
+        pdf_bytes = sum(os.path.getsize(p) for p in pdf_paths)
+        docx_bytes = sum(os.path.getsize(p) for p in docx_paths)
+        rng = np.random.default_rng(seed)
+        vectors = rng.normal(size=(embeddings, dimensions)).astype(np.float32)
+        results = []
+
+        results.append(time_stage("render", "pages", pdfs * pages, pdf_bytes,
+                                  lambda: [process_new_data.process_pdf_file(p, lazy=False) for p in pdf_paths]))
+
+        reset_docx_cache()
+        results.append(time_stage("extract", "files", docx_files, docx_bytes,
+                                  lambda: [process_new_data.process_text_file(p) for p in docx_paths]))
+
+        encoded = []
+        results.append(time_stage("encode", "embeddings", embeddings, vectors.nbytes,
+                                  lambda: encoded.extend(format_embeddings_for_snowflake(vectors))))
+
+        documents = [{"key": f"data/images/doc_{n}.png", "width": 612, "height": 792} for n in range(embeddings)]
+        conn = SQLiteConnection()
+        results.append(time_stage("load", "documents", embeddings, sum(len(e) for e in encoded),
+                                  lambda: process_new_data.load_embeddings_to_snowflake(conn, documents,
+                                                                                        vectors.tolist())))
+        conn.close()
+
+        reset_docx_cache()
+        shutil.rmtree("data/images", ignore_errors=True)
+        config = get_config()
+        overrides = {"ingest_workers": workers or config.ingest_workers, "lazy_pdf_rendering": False}
+        saved = {name: getattr(config, name) for name in overrides}
+        for name, value in overrides.items():
+            setattr(config, name, value)
+        conn = SQLiteConnection()
+        embed = lambda batch: rng.normal(size=(len(batch), dimensions)).tolist()
+        try:
+            results.append(time_stage(
+                "pipeline", "documents", pdfs * pages + docx_files, pdf_bytes + docx_bytes,
+                lambda: process_new_data.ingest_directories(conn, ["data/pdfs", "data/text"], embed=embed),
+            ))
+        finally:
+            for name, value in saved.items():
+                setattr(config, name, value)
+            conn.close()
+        return results
+    finally:
+        os.chdir(previous_dir)
+
+def compare_to_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any],
+                        tolerance: float = 0.2) -> List[str]:
+    """
+    Find stages that got slower than the baseline
+
+    Args:
+        results: Stage records of this run
+        baseline: A report previously written by this benchmark
+        tolerance: Allowed fractional drop in items/sec before a stage is flagged
+
+    Returns:
+        List[str]: One message per regressed stage
+    """
+    previous = {record["stage"]: record for record in baseline.get("results", [])}
+    regressions = []
+    for record in results:
+        before = previous.get(record["stage"])
+        if not before or not before.get("items_per_second"):
+            continue
+        change = record["items_per_second"] / before["items_per_second"] - 1
+        record["change_vs_baseline"] = round(change, 4)
+        if change < -tolerance:
+            regressions.append(f"{record['stage']}: {record['items_per_second']} {record['unit']}/s vs "
+                               f"{before['items_per_second']} in the baseline ({change:+.0%})")
+    return regressions
+
+def main():
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description="Benchmark ingestion stages on generated documents")
+    parser.add_argument("--pdfs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per PDF")
+    parser.add_argument("--docx", type=int, default=20, help="Number of DOCX files")
+    parser.add_argument("--embeddings", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--workdir", default=None, help="Scratch directory; a temporary one by default")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed throughput drop, e.g. 0.2 = 20%%")
+    parser.add_argument("--output", default="benchmarks/ingestion.json")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ingestion_benchmark_")
+    try:
+        results = run_benchmark(os.path.abspath(workdir), args.pdfs, args.pages, args.docx,
+                                embeddings=args.embeddings, workers=args.workers)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+
+    for record in results:
+        change = record.get("change_vs_baseline")
+        print(f"{record['stage']:>9}  {record['items_per_second']:>10.1f} {record['unit']}/s  "
+              f"{record['mb_per_second']:>8.2f} MB/s  peak RSS {record['peak_rss_mb']:.0f} MB"
+              + (f"  ({change:+.0%} vs baseline)" if change is not None else ""))
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "results": results,
+        "regressions": regressions,
+    }
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}" + (f" and {args.baseline}" if args.save_baseline else ""))
+
+    if regressions:
+        print("Throughput regressions:")
+        for message in regressions:
+            print(f"  {message}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
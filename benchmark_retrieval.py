@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark for Snowflake Multimodal Agents Lab
+
+Generates synthetic corpora shaped like data/embeddings.json (1024-dim embeddings
+clustered around topics, keys that look like page images and documents) and
+measures every retrieval engine on the same queries:
+
+    python-loop   per-document cosine in Python, as in the original solutions
+    vector-index  the NumPy VectorIndex used by the working final solution
+    ivf           NumPy inverted-file ANN, swept over the number of probed lists
+    hnsw          hnswlib graph ANN, if hnswlib is installed
+    sql           server_search pushdown against the local SQLite stand-in
+    retriever     a retrieval.py strategy (SEARCH_MODE) end to end, as the agent runs it
+
+For each engine and corpus size it reports build time, index memory, QPS,
+p50/p99 latency and recall@k against exact search, as JSON. Slow engines have a
+maximum corpus size and are reported as skipped above it.
+
+Usage:
+    python benchmark_retrieval.py --sizes 1000,10000,100000 --output benchmarks/retrieval.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from embedding_codec import format_embeddings_for_snowflake
+from vector_index import VectorIndex
+
+# Optional ANN library
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+class Corpus(NamedTuple):
+    """Synthetic documents: keys and a (possibly memory-mapped) float32 embedding matrix"""
+    keys: List[str]
+    vectors: np.ndarray
+
+def make_key(n: int) -> str:
+    # Mostly page images, with some text documents and metadata files, like the real corpus
+    if n % 10 == 8:
+        return f"data/text/document_{n}.docx"
+    if n % 10 == 9:
+        return f"data/metadata/series_{n}.json"
+    return f"data/images/report_{n // 50}_page_{n % 50 + 1}.png"
+
+def generate_corpus(size: int, dimensions: int = 1024, topics: int = 64, seed: int = 0,
+                    memmap_dir: Optional[str] = None, chunk_size: int = 100_000) -> Corpus:
+    """
+    Generate a clustered embedding corpus
+
+    Vectors are topic centroids plus noise, which gives the skewed similarity
+    distribution of real embeddings (a uniform random corpus makes ANN look better
+    than it is).
+
+    Args:
+        size: Number of documents
+        dimensions: Embedding dimensions
+        topics: Number of clusters
+        seed: Random seed; the same seed always gives the same corpus
+        memmap_dir: Write the matrix to a memory-mapped file here instead of RAM
+            (needed for the largest sizes: 10M x 1024 float32 is 40 GB)
+        chunk_size: Rows generated at a time
+
+    Returns:
+        Corpus: Keys and embedding matrix
+    """
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(topics, dimensions)).astype(np.float32)
+    if memmap_dir:
+        os.makedirs(memmap_dir, exist_ok=True)
+        path = os.path.join(memmap_dir, f"corpus_{size}_{dimensions}_{seed}.f32")
+        vectors = np.memmap(path, dtype=np.float32, mode="w+", shape=(size, dimensions))
+    else:
+        vectors = np.empty((size, dimensions), dtype=np.float32)
+
+    for start in range(0, size, chunk_size):
+        rows = min(chunk_size, size - start)
+        assignments = rng.integers(0, topics, size=rows)
+        noise = rng.normal(scale=0.8, size=(rows, dimensions)).astype(np.float32)
+        vectors[start:start + rows] = centroids[assignments] + noise
+    return Corpus([make_key(n) for n in range(size)], vectors)
+
+def generate_queries(corpus: Corpus, count: int, seed: int = 1) -> np.ndarray:
+    """Queries near random documents, as a user query lands near the pages that answer it"""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(corpus.keys), size=count)
+    noise = rng.normal(scale=0.5, size=(count, corpus.vectors.shape[1])).astype(np.float32)
+    return np.asarray(corpus.vectors[rows]) + noise
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+def exact_top_k(corpus: Corpus, queries: np.ndarray, k: int, chunk_size: int = 200_000) -> np.ndarray:
+    """Ground truth row ids, scanning the corpus in chunks so memory-mapped corpora work"""
+    queries = normalize(queries)
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(corpus.keys), chunk_size):
+        chunk = normalize(np.asarray(corpus.vectors[start:start + chunk_size]))
+        scores = queries @ chunk.T
+        rows = np.broadcast_to(np.arange(start, start + len(chunk)), scores.shape)
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_rows = np.concatenate([best_rows, rows], axis=1)
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, top, axis=1)
+        best_rows = np.take_along_axis(all_rows, top, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1)
+
+class Engine:
+    """A retrieval implementation under test; `search` returns corpus row ids, best first"""
+    name = "engine"
+    max_size: Optional[int] = None
+    max_queries: Optional[int] = None  # time only this many queries for slow engines
+
+    def __init__(self, **params):
+        self.params = params
+
+    def build(self, corpus: Corpus) -> None:
+        raise NotImplementedError
+
+    def search(self, query: np.ndarray, k: int) -> List[int]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class PythonLoopEngine(Engine):
+    """Cosine similarity computed document by document, as the original solutions did"""
+    name = "python-loop"
+    max_size = 100_000
+
+    def build(self, corpus: Corpus) -> None:
+        self.rows = [np.asarray(row, dtype=np.float64) for row in corpus.vectors]
+
+    def search(self, query: np.ndarray, k: int) -> List[int]:
+        query_norm = np.linalg.norm(query)
+        similarities = []
+        for row, doc in enumerate(self.rows):
+            similarities.append((float(np.dot(query, doc) / (query_norm * np.linalg.norm(doc))), row))
+        similarities.sort(key=lambda x: x[0], reverse=True)
+        return [row for _, row in similarities[:k]]
+
+class VectorIndexEngine(Engine):
+    """The production NumPy index (normalized matrix, one GEMV per query, argpartition)"""
+    name = "vector-index"
+    max_size = 2_000_000
+
+    def build(self, corpus: Corpus) -> None:
+        self.index = VectorIndex(corpus.vectors.shape[1])
+        for key, vector in zip(corpus.keys, corpus.vectors):
+            self.index.add(key, vector)
+        self.index.matrix  # normalize up front so it is not timed as part of the first query
+        self.rows = {key: row for row, key in enumerate(corpus.keys)}
+
+    def search(self, query: np.ndarray, k: int) -> List[int]:
+        return [self.rows[result["key"]] for result in self.index.search(query, k=k)]
+
+class IVFEngine(Engine):
+    """
+    Inverted-file ANN in NumPy: k-means lists, each query scores the `nprobe` nearest lists
+
+    Args:
+        nlist: Number of lists. Defaults to 4 * sqrt(corpus size).
+        nprobe: Lists scanned per query
+    """
+    name = "ivf"
+
+    def build(self, corpus: Corpus) -> None:
+        size = len(corpus.keys)
+        nlist = min(size, self.params.get("nlist") or max(1, int(4 * np.sqrt(size))))
+        rng = np.random.default_rng(0)
+
+        # Train centroids on a sample with a few rounds of spherical k-means
+        sample = normalize(np.asarray(corpus.vectors[rng.choice(size, size=min(size, 50 * nlist), replace=False)]))
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(10):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize(centroids)
+
+        # Assign every document a chunk at a time, so a memory-mapped corpus is never loaded whole
+        chunk_size = 100_000
+        assignments = np.concatenate([
+            np.argmax(normalize(np.asarray(corpus.vectors[start:start + chunk_size])) @ centroids.T, axis=1)
+            for start in range(0, size, chunk_size)
+        ])
+        order = np.argsort(assignments, kind="stable")
+        position = np.empty(size, dtype=np.int64)
+        position[order] = np.arange(size)
+
+        # Store the lists contiguously: next to a memory-mapped corpus on disk, otherwise in RAM
+        if isinstance(corpus.vectors, np.memmap):
+            self.matrix_path = f"{corpus.vectors.filename}.ivf"
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="w+", shape=corpus.vectors.shape)
+        else:
+            self.matrix_path = None
+            self.matrix = np.empty(corpus.vectors.shape, dtype=np.float32)
+        for start in range(0, size, chunk_size):
+            chunk = normalize(np.asarray(corpus.vectors[start:start + chunk_size]))
+            self.matrix[position[start:start + chunk_size]] = chunk
+
+        self.rows = order
+        self.offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self.centroids = centroids
+
+    def close(self) -> None:
+        if getattr(self, "matrix_path", None):
+            del self.matrix
+            os.remove(self.matrix_path)
+            self.matrix_path = None
+
+    def search(self, query: np.ndarray, k: int) -> List[int]:
+        query = normalize(query.reshape(1, -1))[0]
+        nprobe = min(self.params.get("nprobe", 8), len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        positions = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+        if positions.size == 0:
+            return []
+        scores = self.matrix[positions] @ query
+        if positions.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(positions.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.rows[positions[top]].tolist()
+
+class HNSWEngine(Engine):
+    """
+    hnswlib graph index
+
+    Args:
+        ef: Search breadth; higher is slower and more accurate
+        M: Graph degree
+    """
+    name = "hnsw"
+    max_size = 2_000_000
+
+    def build(self, corpus: Corpus) -> None:
+        size, dimensions = corpus.vectors.shape
+        self.index = hnswlib.Index(space="cosine", dim=dimensions)
+        self.index.init_index(max_elements=size, ef_construction=200, M=self.params.get("M", 16))
+        for start in range(0, size, 100_000):
+            chunk = np.asarray(corpus.vectors[start:start + 100_000])
+            self.index.add_items(chunk, np.arange(start, start + len(chunk)))
+        self.index.set_ef(self.params.get("ef", 64))
+
+    def search(self, query: np.ndarray, k: int) -> List[int]:
+        labels, _ = self.index.knn_query(query, k=k)
+        return labels[0].tolist()
+
+class SQLPushdownEngine(Engine):
+    """server_search.search_top_k against the SQLite stand-in (scoring runs in SQL UDFs)"""
+    name = "sql"
+    max_size = 5_000
+    max_queries = 10
+
+    def build(self, corpus: Corpus) -> None:
+        from server_search import materialize_search_columns
+        from sqlite_standin import SQLITE_VECTOR_CAST, SQLiteConnection
+
+        self.vector_cast = SQLITE_VECTOR_CAST
+        self.dimensions = corpus.vectors.shape[1]
+        self.conn = SQLiteConnection()
+        cursor = self.conn.cursor()
+        cursor.executemany(
+            "INSERT INTO multimodal_documents (key, width, height, embedding) VALUES (%s, %s, %s, %s)",
+            [(key, 0, 0, embedding)
+             for key, embedding in zip(corpus.keys, format_embeddings_for_snowflake(np.asarray(corpus.vectors)))],
+        )
+        cursor.close()
+        materialize_search_columns(self.conn, dimensions=self.dimensions, vector_cast=self.vector_cast)
+        self.rows = {key: row for row, key in enumerate(corpus.keys)}
+
+    def search(self, query: np.ndarray, k: int) -> List[int]:
+        from server_search import search_top_k
+
+        results = search_top_k(self.conn, [query], k=k, threshold=-1.0, dimensions=self.dimensions,
+                               vector_cast=self.vector_cast)[0]
+        return [self.rows[result["key"]] for result in results]
+
+    def close(self) -> None:
+        self.conn.close()
+
+class RetrieverEngine(Engine):
+    """
+    A retrieval.py strategy: the corpus is stored in the SQLite stand-in of the documents
+    table, prepared by the strategy's ingest hooks and searched through `get_retriever`
+
+    Params:
+        mode: Search mode (`client`, `server`, ...)
+        mmr_lambda: MMR trade-off. Defaults to the configured value; 1.0 ranks by similarity only.
+    """
+    name = "retriever"
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        # Server-side scoring runs in Python UDFs on SQLite
+        self.max_size, self.max_queries = (5_000, 10) if params.get("mode") == "server" else (50_000, None)
+
+    def build(self, corpus: Corpus) -> None:
+        import copy
+
+        from retrieval import get_retriever
+        from snowflake_config import get_config
+        from sqlite_standin import SQLITE_VECTOR_CAST, SQLiteConnection
+
+        config = copy.copy(get_config())
+        config.embedding_dimensions = corpus.vectors.shape[1]
+        if self.params.get("mmr_lambda") is not None:
+            config.mmr_lambda = self.params["mmr_lambda"]
+        self.conn = SQLiteConnection()
+        self.retriever = get_retriever(self.conn, config, mode=self.params.get("mode", "client"))
+        self.retriever.vector_cast = SQLITE_VECTOR_CAST
+        self.retriever.prepare()
+        cursor = self.conn.cursor()
+        cursor.executemany(
+            "INSERT INTO multimodal_documents (key, width, height, embedding) VALUES (%s, %s, %s, %s)",
+            [(key, 0, 0, embedding)
+             for key, embedding in zip(corpus.keys, format_embeddings_for_snowflake(np.asarray(corpus.vectors)))],
+        )
+        cursor.close()
+        self.retriever.documents_changed()
+        # Load the index (client strategies) up front so it is not timed as part of the first query
+        self.retriever.search([np.asarray(corpus.vectors[0])], k=1, threshold=-1.0)
+        self.rows = {key: row for row, key in enumerate(corpus.keys)}
+
+    def search(self, query: np.ndarray, k: int) -> List[int]:
+        results = self.retriever.search([query], k=k, threshold=-1.0)[0]
+        return [self.rows[result["key"]] for result in results]
+
+    def close(self) -> None:
+        self.conn.close()
+
+def default_engines() -> List[Engine]:
+    """Every engine configuration benchmarked by default, ANN engines at several settings"""
+    engines: List[Engine] = [PythonLoopEngine(), VectorIndexEngine()]
+    engines += [IVFEngine(nprobe=nprobe) for nprobe in (1, 4, 16, 64)]
+    if hnswlib is not None:
+        engines += [HNSWEngine(ef=ef) for ef in (16, 64, 256)]
+    engines.append(SQLPushdownEngine())
+    engines += [RetrieverEngine(mode="client"), RetrieverEngine(mode="server")]
+    return engines
+
+def recall_at_k(found: Sequence[Sequence[int]], expected: np.ndarray, k: int) -> float:
+    """Mean fraction of the exact top k returned by an engine"""
+    hits = sum(len(set(f[:k]) & set(e[:k].tolist())) for f, e in zip(found, expected))
+    return hits / (k * len(expected))
+
+def benchmark_engine(engine: Engine, corpus: Corpus, queries: np.ndarray, expected: np.ndarray,
+                     k: int) -> Dict[str, Any]:
+    """
+    Build an engine and time its queries
+
+    Index memory is the peak of Python-tracked allocations (NumPy included) while
+    building; queries run without tracemalloc so its overhead is not in the latency.
+
+    Returns:
+        Dict[str, Any]: One result record
+    """
+    record = {"engine": engine.name, "params": engine.params, "corpus_size": len(corpus.keys),
+              "dimensions": int(corpus.vectors.shape[1]), "queries": len(queries), "k": k}
+    if engine.max_size is not None and len(corpus.keys) > engine.max_size:
+        record["skipped"] = f"corpus larger than {engine.max_size}"
+        return record
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    engine.build(corpus)
+    record["build_seconds"] = round(time.perf_counter() - started, 4)
+    record["index_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    if engine.max_queries is not None:
+        queries, expected = queries[:engine.max_queries], expected[:engine.max_queries]
+        record["queries"] = len(queries)
+    try:
+        engine.search(queries[0], k)  # warm-up
+        latencies = []
+        found = []
+        started = time.perf_counter()
+        for query in queries:
+            query_started = time.perf_counter()
+            found.append(engine.search(query, k))
+            latencies.append(time.perf_counter() - query_started)
+        total = time.perf_counter() - started
+    finally:
+        engine.close()
+
+    latencies_ms = np.asarray(latencies) * 1000
+    record.update({
+        "qps": round(len(queries) / total, 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 4),
+        "recall_at_k": round(recall_at_k(found, expected, k), 4),
+    })
+    return record
+
+def run_benchmark(sizes: Sequence[int], engines: Optional[List[Engine]] = None, dimensions: int = 1024,
+                  queries: int = 100, k: int = 10, seed: int = 0,
+                  memmap_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Benchmark engines over corpora of increasing size
+
+    Args:
+        sizes: Corpus sizes
+        engines: Engines to run. Defaults to `default_engines()`. Each engine is rebuilt per size.
+        dimensions: Embedding dimensions
+        queries: Queries per corpus
+        k: Results per query
+        seed: Corpus seed
+        memmap_dir: Keep corpora in memory-mapped files under this directory
+
+    Returns:
+        Iterator[Dict[str, Any]]: One record per engine and size, as they finish
+    """
+    engine_factories = engines or default_engines()
+    for size in sizes:
+        corpus = generate_corpus(size, dimensions, seed=seed, memmap_dir=memmap_dir)
+        query_vectors = generate_queries(corpus, queries, seed=seed + 1)
+        expected = exact_top_k(corpus, query_vectors, min(k, size))
+        for engine in engine_factories:
+            # A fresh engine per size with the same parameters
+            yield benchmark_engine(type(engine)(**engine.params), corpus, query_vectors, expected, min(k, size))
+
+def environment() -> Dict[str, Any]:
+    """Machine details stored with the results, so runs are comparable"""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "hnswlib": getattr(hnswlib, "__version__", "installed") if hnswlib else None,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def main():
+    """Run the benchmark from the command line and write the results as JSON"""
+    parser = argparse.ArgumentParser(description="Benchmark retrieval engines on synthetic corpora")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated corpus sizes (up to 10000000 with --memmap-dir)")
+    parser.add_argument("--engines", default="", help="Comma-separated engine names; all by default")
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memmap-dir", default=None, help="Directory for memory-mapped corpora")
+    parser.add_argument("--output", default="benchmarks/retrieval.json")
+    args = parser.parse_args()
+
+    engines = default_engines()
+    if args.engines:
+        names = set(args.engines.split(","))
+        engines = [engine for engine in engines if engine.name in names]
+
+    results = []
+    for record in run_benchmark([int(s) for s in args.sizes.split(",")], engines, args.dimensions,
+                                args.queries, args.k, args.seed, args.memmap_dir):
+        results.append(record)
+        if "skipped" in record:
+            print(f"{record['engine']:>12} n={record['corpus_size']:<9} skipped ({record['skipped']})")
+        else:
+            print(f"{record['engine']:>12} n={record['corpus_size']:<9} {record['params']} "
+                  f"qps={record['qps']:<10} p50={record['p50_ms']:.3f}ms p99={record['p99_ms']:.3f}ms "
+                  f"recall@{record['k']}={record['recall_at_k']:.3f}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "environment": environment(),
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Running corpus statistics for Snowflake Multimodal Agents Lab
+
+Dashboards poll the document count, the width and height range and the newest
+documents. Computing these with aggregates over multimodal_documents scans the
+whole table on every poll. Instead, the statistics are kept in a single row of
+multimodal_document_stats, keyed by `id = 1`:
+
+    total_docs, sum_width, sum_height     updated by the deltas of each write
+    min_/max_width, min_/max_height       extended by new values
+    recent_documents                      newest keys (JSON), most recent first
+
+`upsert_documents` applies each write's changes with one UPDATE that adds the
+deltas to the stored values (`total_docs = total_docs + %s`, ...), inside the
+explicit transaction that also writes the documents, so concurrent writers do
+not lose each other's changes. Rebuilds write the row with a MERGE (an upsert on
+the SQLite stand-in), so there is never more than one row.
+
+Reading the statistics is a single-row SELECT. Count and sums stay exact under
+inserts, updates and deletes. A minimum or maximum cannot be decremented: when a
+write removes the current extreme, or deletes one of the recent documents and
+adds too few new ones, the row is marked stale. The recent documents are read and
+written back in the transaction; if another writer changed them in between, the
+row is marked stale as well. The next read then rebuilds it with one aggregate query.
+
+Writes that bypass `upsert_documents` (the legacy loaders, bulk loads, restores
+from backup) call `invalidate_stats` afterwards.
+"""
+import json
+import weakref
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+STATS_TABLE = "multimodal_document_stats"
+# Key of the single statistics row
+STATS_ROW_ID = 1
+RECENT_DOCUMENTS = 5
+
+_COLUMNS = ("total_docs", "sum_width", "sum_height", "min_width", "max_width",
+            "min_height", "max_height", "recent_documents", "stale")
+
+# Connections on which the stats table is known to exist
+_stats_tables_ready = weakref.WeakSet()
+
+def ensure_stats_table(conn) -> None:
+    """
+    Create the statistics table if it is missing (once per connection)
+
+    Args:
+        conn: Snowflake connection object
+    """
+    if conn in _stats_tables_ready:
+        return
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            id INTEGER PRIMARY KEY, total_docs INTEGER, sum_width FLOAT, sum_height FLOAT,
+            min_width INTEGER, max_width INTEGER, min_height INTEGER, max_height INTEGER,
+            recent_documents STRING, stale BOOLEAN, updated_at TIMESTAMP_NTZ
+        )
+    """)
+    # Tables created before the key column get it; their unkeyed rows are dropped and rebuilt on the next read
+    cursor.execute(f"ALTER TABLE {STATS_TABLE} ADD COLUMN IF NOT EXISTS id INTEGER")
+    cursor.execute(f"DELETE FROM {STATS_TABLE} WHERE id IS NULL")
+    cursor.close()
+    _stats_tables_ready.add(conn)
+
+def _timestamp(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat(sep=" ") if isinstance(value, datetime) else str(value)
+
+class CorpusStatistics:
+    """Running aggregates over multimodal_documents"""
+
+    def __init__(self):
+        self.total_docs = 0
+        self.sum_width = 0.0
+        self.sum_height = 0.0
+        self.min_width: Optional[int] = None
+        self.max_width: Optional[int] = None
+        self.min_height: Optional[int] = None
+        self.max_height: Optional[int] = None
+        # Newest first, as {"KEY": ..., "CREATED_AT": ...}
+        self.recent_documents: List[Dict[str, Any]] = []
+        self.stale = False
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "CorpusStatistics":
+        stats = cls()
+        values = dict(zip(_COLUMNS, row))
+        stats.total_docs = int(values["total_docs"] or 0)
+        stats.sum_width = float(values["sum_width"] or 0)
+        stats.sum_height = float(values["sum_height"] or 0)
+        for name in ("min_width", "max_width", "min_height", "max_height"):
+            setattr(stats, name, values[name])
+        stats.recent_documents = json.loads(values["recent_documents"] or "[]")
+        stats.stale = bool(values["stale"])
+        return stats
+
+    def to_row(self) -> Tuple:
+        return (self.total_docs, self.sum_width, self.sum_height, self.min_width, self.max_width,
+                self.min_height, self.max_height, json.dumps(self.recent_documents), self.stale)
+
+    def as_statistics(self) -> Dict[str, Any]:
+        """The statistics in the layout returned by `get_document_statistics`"""
+        count = self.total_docs
+        return {
+            'total_documents': count,
+            'dimension_statistics': {
+                'AVG_WIDTH': self.sum_width / count if count else None,
+                'AVG_HEIGHT': self.sum_height / count if count else None,
+                'MIN_WIDTH': self.min_width,
+                'MIN_HEIGHT': self.min_height,
+                'MAX_WIDTH': self.max_width,
+                'MAX_HEIGHT': self.max_height,
+            },
+            'recent_documents': [dict(doc) for doc in self.recent_documents],
+        }
+
+def read_stats(conn) -> Optional[CorpusStatistics]:
+    """
+    Read the stored statistics with a single-row SELECT
+
+    Args:
+        conn: Snowflake connection object
+
+    Returns:
+        CorpusStatistics: Stored statistics, or None if they were never computed
+    """
+    ensure_stats_table(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(_COLUMNS)} FROM {STATS_TABLE} WHERE id = %s", (STATS_ROW_ID,))
+    row = cursor.fetchone()
+    cursor.close()
+    return CorpusStatistics.from_row(tuple(row)) if row else None
+
+def write_stats(conn, stats: CorpusStatistics) -> None:
+    """Replace the stored statistics, inserting the row if it is missing (committed by the caller)"""
+    ensure_stats_table(conn)
+    cursor = conn.cursor()
+    if getattr(conn, "dialect", "snowflake") == "sqlite":
+        cursor.execute(
+            f"INSERT INTO {STATS_TABLE} (id, {', '.join(_COLUMNS)}, updated_at) "
+            f"VALUES (%s, {', '.join(['%s'] * len(_COLUMNS))}, CURRENT_TIMESTAMP) "
+            f"ON CONFLICT (id) DO UPDATE SET "
+            f"{', '.join(f'{column} = excluded.{column}' for column in _COLUMNS)}, updated_at = excluded.updated_at",
+            (STATS_ROW_ID,) + stats.to_row(),
+        )
+    else:
+        cursor.execute(
+            f"""
+            MERGE INTO {STATS_TABLE} target
+            USING (SELECT %s AS id, {', '.join(f'%s AS {column}' for column in _COLUMNS)}) source
+            ON target.id = source.id
+            WHEN MATCHED THEN UPDATE SET
+                {', '.join(f'{column} = source.{column}' for column in _COLUMNS)}, updated_at = CURRENT_TIMESTAMP
+            WHEN NOT MATCHED THEN
+                INSERT (id, {', '.join(_COLUMNS)}, updated_at)
+                VALUES (source.id, {', '.join(f'source.{column}' for column in _COLUMNS)}, CURRENT_TIMESTAMP)
+            """,
+            (STATS_ROW_ID,) + stats.to_row(),
+        )
+    cursor.close()
+
+def rebuild_stats(conn) -> CorpusStatistics:
+    """
+    Recompute the statistics from multimodal_documents and store them
+
+    Args:
+        conn: Snowflake connection object
+
+    Returns:
+        CorpusStatistics: Freshly computed statistics
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*), SUM(width), SUM(height), MIN(width), MAX(width), MIN(height), MAX(height)
+        FROM multimodal_documents
+    """)
+    aggregates = cursor.fetchone()
+    cursor.execute(f"""
+        SELECT key, created_at
+        FROM multimodal_documents
+        ORDER BY created_at DESC
+        LIMIT {RECENT_DOCUMENTS}
+    """)
+    recent = cursor.fetchall()
+    cursor.close()
+
+    stats = CorpusStatistics.from_row(tuple(aggregates) + (None, False))
+    stats.recent_documents = [{"KEY": key, "CREATED_AT": _timestamp(created_at)} for key, created_at in recent]
+    write_stats(conn, stats)
+    conn.commit()
+    return stats
+
+def update_stats(conn, inserted: Iterable[Tuple[str, int, int]] = (),
+                 updated: Iterable[Tuple[int, int, int, int]] = (),
+                 deleted: Iterable[Tuple[str, int, int]] = ()) -> None:
+    """
+    Apply the changes of a write to the stored statistics with one UPDATE (committed by the caller)
+
+    Nothing is written if the statistics were never computed; the first read
+    computes them from the table, including these changes.
+
+    Args:
+        conn: Snowflake connection object
+        inserted: (key, width, height) of inserted documents, oldest first
+        updated: (old width, old height, width, height) of updated documents
+        deleted: (key, width, height) of deleted documents
+    """
+    inserted, updated, deleted = list(inserted), list(updated), list(deleted)
+    stats = read_stats(conn)
+    if stats is None:
+        return
+
+    count = len(inserted) - len(deleted)
+    assignments = ["total_docs = total_docs + %s", "sum_width = sum_width + %s", "sum_height = sum_height + %s"]
+    params: List[Any] = [
+        count,
+        sum(width for _, width, _ in inserted) + sum(width - old for old, _, width, _ in updated)
+        - sum(width for _, width, _ in deleted),
+        sum(height for _, _, height in inserted) + sum(height - old for _, old, _, height in updated)
+        - sum(height for _, _, height in deleted),
+    ]
+    stale_conditions, stale_params = [], []
+    for column, added, removed in (
+        ("width", [d[1] for d in inserted] + [u[2] for u in updated], [u[0] for u in updated] + [d[1] for d in deleted]),
+        ("height", [d[2] for d in inserted] + [u[3] for u in updated], [u[1] for u in updated] + [d[2] for d in deleted]),
+    ):
+        if added:
+            assignments.append(f"min_{column} = CASE WHEN min_{column} IS NULL OR min_{column} > %s "
+                               f"THEN %s ELSE min_{column} END")
+            assignments.append(f"max_{column} = CASE WHEN max_{column} IS NULL OR max_{column} < %s "
+                               f"THEN %s ELSE max_{column} END")
+            params += [min(added), min(added), max(added), max(added)]
+        if removed:
+            # Removing a current extreme leaves the next one unknown
+            stale_conditions += [f"min_{column} >= %s", f"max_{column} <= %s"]
+            stale_params += [min(removed), max(removed)]
+
+    if inserted or deleted:
+        # New documents are the newest; if deletes leave too few known ones, the next newest is unknown
+        deleted_keys = {key for key, _, _ in deleted}
+        created_at = _timestamp(datetime.now())
+        recent = [{"KEY": key, "CREATED_AT": created_at} for key, _, _ in reversed(inserted)]
+        recent += [doc for doc in stats.recent_documents if doc["KEY"] not in deleted_keys]
+        recent = recent[:RECENT_DOCUMENTS]
+        stored = json.dumps(stats.recent_documents)
+        # Keep another writer's list if it changed since it was read, and rebuild instead
+        assignments.append("recent_documents = CASE WHEN recent_documents = %s THEN %s ELSE recent_documents END")
+        params += [stored, json.dumps(recent)]
+        stale_conditions += ["recent_documents <> %s", "%s"]
+        stale_params += [stored, len(recent) < min(RECENT_DOCUMENTS, stats.total_docs + count)]
+
+    if stale_conditions:
+        assignments.append(f"stale = stale OR COALESCE({' OR '.join(stale_conditions)}, FALSE)")
+        params += stale_params
+    cursor = conn.cursor()
+    cursor.execute(
+        f"UPDATE {STATS_TABLE} SET {', '.join(assignments)}, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+        params + [STATS_ROW_ID],
+    )
+    cursor.close()
+
+def invalidate_stats(conn) -> None:
+    """Mark the stored statistics stale after writes that bypassed `upsert_documents`"""
+    ensure_stats_table(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"UPDATE {STATS_TABLE} SET stale = TRUE")
+    cursor.close()
+    conn.commit()
+
+def get_stats(conn) -> CorpusStatistics:
+    """
+    Current corpus statistics: one single-row read, or a rebuild if they are stale or missing
+
+    Args:
+        conn: Snowflake connection object
+
+    Returns:
+        CorpusStatistics: Statistics over multimodal_documents
+    """
+    stats = read_stats(conn)
+    if stats is None or stats.stale:
+        stats = rebuild_stats(conn)
+    return stats
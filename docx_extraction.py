@@ -0,0 +1,160 @@
+"""
+DOCX text extraction service for Snowflake Multimodal Agents Lab
+
+The ingestion script, the analysis scripts and the agent's answer step all need the
+text of the same Word files. This module extracts it once: text is cached on disk
+by file content hash, so copies of a file share one entry and only changed files
+are parsed again, and an in-process memo keyed by path, size and mtime avoids
+re-hashing unchanged files. Batches of uncached files are parsed in a process pool.
+"""
+
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from snowflake_config import get_config
+
+def extract_docx_text(docx_path: str) -> str:
+    """
+    Extract the text of a DOCX file with python-docx
+
+    Paragraphs come first, one per line, followed by table rows with each cell's
+    text followed by a space.
+
+    Args:
+        docx_path: Path to the DOCX file
+
+    Returns:
+        str: Extracted text
+    """
+    from docx import Document
+
+    doc = Document(docx_path)
+    parts = [paragraph.text + "\n" for paragraph in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            parts.extend(cell.text + " " for cell in row.cells)
+            parts.append("\n")
+    return "".join(parts)
+
+def hash_file(path: str) -> str:
+    """MD5 of a file's contents"""
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+class DocxTextCache:
+    """
+    On-disk cache of extracted DOCX text
+
+    Args:
+        cache_dir: Directory holding one `<content hash>.txt` file per distinct DOCX file
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        # (path, size, mtime_ns) -> content hash, so unchanged files are not re-read
+        self._hashes: Dict[tuple, str] = {}
+
+    def content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = hash_file(path)
+        return self._hashes[key]
+
+    def _entry_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}.txt")
+
+    def get(self, path: str) -> Optional[str]:
+        """Cached text for a file, or None if it has not been extracted yet"""
+        try:
+            with open(self._entry_path(self.content_hash(path)), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, path: str, text: str) -> None:
+        """Store extracted text; written atomically so concurrent writers never leave partial entries"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, self._entry_path(self.content_hash(path)))
+
+    def extract_many(self, paths: Iterable[str], workers: Optional[int] = None,
+                     errors: Optional[Dict[str, Exception]] = None) -> Dict[str, str]:
+        """
+        Get the text of several DOCX files, parsing uncached ones in parallel
+
+        Each file is extracted on its own, so one unreadable file does not lose the
+        text of the others: every successful extraction is cached.
+
+        Args:
+            paths: DOCX file paths
+            workers: Worker processes for uncached files. Defaults to the CPU count.
+            errors: Filled with the exception of each file that could not be extracted.
+                Without it, the first failure is raised once the other files are cached.
+
+        Returns:
+            Dict[str, str]: Text per successfully extracted path
+        """
+        texts = {}
+        missing = []
+        for path in dict.fromkeys(paths):
+            text = self.get(path)
+            if text is None:
+                missing.append(path)
+            else:
+                texts[path] = text
+
+        failures: Dict[str, Exception] = {}
+
+        def store(path, extract):
+            try:
+                text = extract()
+                self.put(path, text)
+            except Exception as error:
+                failures[path] = error
+            else:
+                texts[path] = text
+
+        if len(missing) == 1:
+            store(missing[0], lambda: extract_docx_text(missing[0]))
+        elif missing:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(missing))) as executor:
+                futures = {path: executor.submit(extract_docx_text, path) for path in missing}
+                for path, future in futures.items():
+                    store(path, future.result)
+
+        if failures:
+            if errors is None:
+                raise next(iter(failures.values()))
+            errors.update(failures)
+        return texts
+
+    def extract(self, path: str) -> str:
+        """Get the text of one DOCX file"""
+        return self.extract_many([path])[path]
+
+_default_cache: Optional[DocxTextCache] = None
+
+def get_docx_cache() -> DocxTextCache:
+    """Get the process-wide cache in `SnowflakeConfig.docx_cache_dir`"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DocxTextCache(get_config().docx_cache_dir)
+    return _default_cache
+
+def get_docx_text(path: str) -> str:
+    """Get the text of a DOCX file from the shared cache, extracting it if needed"""
+    return get_docx_cache().extract(path)
+
+def get_docx_texts(paths: Iterable[str], workers: Optional[int] = None,
+                   errors: Optional[Dict[str, Exception]] = None) -> Dict[str, str]:
+    """Get the text of several DOCX files from the shared cache, extracting uncached ones in parallel"""
+    return get_docx_cache().extract_many(paths, workers, errors)
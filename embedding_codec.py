@@ -0,0 +1,89 @@
+"""
+Embedding string codec for Snowflake Multimodal Agents Lab
+
+Embeddings are stored in Snowflake as comma-separated strings. This module is the
+single implementation of that format, replacing the per-float formatting and
+parsing loops that were copied into the solution, processing and test scripts.
+
+Values are written in fixed-point notation with up to 15 decimals and trailing
+zeros removed (e.g. `0.018798828125,-0.0065`), never in scientific notation, so
+the strings can be cast by Snowflake's STRTOK_TO_ARRAY(...)::VECTOR as well as
+parsed in Python. The parser also accepts scientific notation and `[...]`
+brackets, so rows written by older scripts still load.
+"""
+
+from typing import Iterable, List, Sequence, Union
+
+import numpy as np
+
+def _format_row(row: List[float]) -> str:
+    formatted = ','.join(f"{value:.15f}".rstrip('0').rstrip('.') for value in row)
+    # Negative values that round to zero come out as "-0"; a '-' only ever starts a value
+    if "-0," in formatted or formatted.endswith(",-0") or formatted == "-0":
+        formatted = ','.join("0" if value == "-0" else value for value in formatted.split(','))
+    return formatted
+
+def format_embeddings_for_snowflake(embeddings: Union[np.ndarray, Sequence[Sequence[float]]]) -> List[str]:
+    """
+    Format several embeddings as comma-separated strings
+
+    Args:
+        embeddings: Matrix of shape (n, dimensions)
+
+    Returns:
+        List[str]: One string per embedding
+    """
+    matrix = np.asarray(embeddings, dtype=np.float64)
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a 2D array of embeddings, got shape {matrix.shape}")
+    return [_format_row(row) for row in matrix.tolist()]
+
+def format_embedding_for_snowflake(embedding: Sequence[float]) -> str:
+    """
+    Format an embedding as a comma-separated string without scientific notation
+
+    Args:
+        embedding: Embedding values
+
+    Returns:
+        str: Comma-separated values, e.g. `0.018798828125,-0.0065`
+    """
+    return format_embeddings_for_snowflake(np.asarray(embedding, dtype=np.float64).reshape(1, -1))[0]
+
+def parse_embedding_from_string(embedding_str: str) -> np.ndarray:
+    """
+    Parse an embedding string back to an array
+
+    Accepts the format written by `format_embedding_for_snowflake`, scientific
+    notation, surrounding whitespace and `[...]` brackets (as returned for VECTOR
+    and ARRAY columns).
+
+    Args:
+        embedding_str: Comma-separated embedding values
+
+    Returns:
+        np.ndarray: float64 array of the values
+    """
+    text = embedding_str.strip().strip('[]')
+    if not text:
+        return np.empty(0, dtype=np.float64)
+    return np.array(text.split(','), dtype=np.float64)
+
+def parse_embeddings(embedding_strs: Iterable[str]) -> np.ndarray:
+    """
+    Parse many embedding strings into one matrix with a single conversion
+
+    Args:
+        embedding_strs: Embedding strings, all with the same number of values
+
+    Returns:
+        np.ndarray: float64 matrix of shape (n, dimensions)
+    """
+    texts = [s.strip().strip('[]') for s in embedding_strs]
+    if not texts:
+        return np.empty((0, 0), dtype=np.float64)
+
+    dimensions = texts[0].count(',') + 1
+    if any(text.count(',') + 1 != dimensions for text in texts):
+        raise ValueError("All embeddings must have the same number of dimensions")
+    return np.array(','.join(texts).split(','), dtype=np.float64).reshape(len(texts), dimensions)
@@ -6,12 +6,7 @@ This script demonstrates how to add new data and query the AI agent.
 """
 
 import os
-from snowflake_solution_working_final import (
-    setup_snowflake_connection, 
-    setup_gemini, 
-    execute_agent
-)
-from process_new_data import process_pdf_file, process_image_file, process_text_file
+from multimodal_agents import SnowflakeAgent, setup_gemini, setup_snowflake_connection
 
 def main():
     """Example usage of the multimodal agents lab"""
@@ -22,6 +17,7 @@ def main():
     print("🔌 Setting up connections...")
     conn = setup_snowflake_connection()
     gemini_client, LLM = setup_gemini()
+    agent = SnowflakeAgent(conn, gemini_client, LLM, serverless_url=os.getenv("SERVERLESS_URL", ""))
     print("✅ Connections established")
     
     try:
@@ -57,8 +53,7 @@ def main():
         
         # Run a sample query
         print("\n🔍 Running sample query...")
-        execute_agent(conn, gemini_client, LLM, 
-                     "What documents and images do you have access to?")
+        agent.execute_agent("What documents and images do you have access to?")
         
         # Example 5: Custom queries
         print("\n💡 Example 5: Custom queries")
@@ -78,7 +73,7 @@ def main():
                 if user_input.lower() in ['quit', 'exit', 'q']:
                     break
                 if user_input:
-                    execute_agent(conn, gemini_client, LLM, user_input)
+                    agent.execute_agent(user_input)
             except KeyboardInterrupt:
                 break
             except Exception as e:
@@ -0,0 +1,208 @@
+"""
+Deterministic local stand-ins for Gemini and the serverless embedding endpoint
+
+Both backends answer the same input the same way every time and wait a
+configurable latency, so agent loops can be driven end to end without network
+access or credentials, and the time spent outside the models can be measured.
+
+    client = FakeGeminiClient(latency_seconds=0.2)
+    with FakeEmbeddingServer(dimensions=1024, latency_seconds=0.05) as server:
+        agent = SnowflakeAgent(conn, gemini_client=client, serverless_url=server.url)
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from google.genai.types import FunctionCall
+
+def stable_seed(text: str) -> int:
+    """Seed derived from text, identical across processes (unlike hash())"""
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "little")
+
+class LatencyModel:
+    """
+    Sleeps a fixed latency plus seeded jitter and records the total time spent
+
+    Args:
+        latency_seconds: Base latency per call
+        jitter_seconds: Maximum extra latency, drawn from the text's seed so it is reproducible
+    """
+
+    def __init__(self, latency_seconds: float = 0.0, jitter_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.calls = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, text: str) -> None:
+        delay = self.latency_seconds
+        if self.jitter_seconds:
+            delay += self.jitter_seconds * np.random.default_rng(stable_seed(text)).random()
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += delay
+
+class FakeEmbeddingBackend:
+    """
+    Deterministic text embeddings: a unit vector seeded by the text
+
+    The same text always gets the same vector, so a corpus embedded from document
+    texts can be queried with those texts and return the matching documents.
+
+    Args:
+        dimensions: Embedding dimensions
+        latency_seconds: Latency per embedding request
+        jitter_seconds: Extra seeded latency per request
+    """
+
+    def __init__(self, dimensions: int = 1024, latency_seconds: float = 0.0, jitter_seconds: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = LatencyModel(latency_seconds, jitter_seconds)
+
+    def vector(self, text: str) -> List[float]:
+        vector = np.random.default_rng(stable_seed(text)).normal(size=self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed(self, texts: Union[str, Sequence[str]]) -> List[List[float]]:
+        """Embed one text or a batch, waiting the configured latency once per request"""
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        self.latency.wait("\n".join(texts))
+        return [self.vector(text) for text in texts]
+
+class FakeEmbeddingServer:
+    """
+    HTTP server speaking the serverless endpoint's `get_embedding` protocol
+
+    A string input is answered with `embedding`, a list with `embeddings`, as
+    `embed_queries` expects. Use as a context manager; `url` is set while running.
+
+    Args:
+        backend: Embedding backend. Defaults to FakeEmbeddingBackend(dimensions, latency_seconds).
+        dimensions: Embedding dimensions of the default backend
+        latency_seconds: Latency of the default backend
+        batching: Accept list inputs; without it a list is rejected with 400, like a
+            single-input endpoint
+    """
+
+    def __init__(self, backend: Optional[FakeEmbeddingBackend] = None, dimensions: int = 1024,
+                 latency_seconds: float = 0.0, batching: bool = True):
+        self.backend = backend or FakeEmbeddingBackend(dimensions, latency_seconds)
+        self.batching = batching
+        self.requests = 0
+        self.url: Optional[str] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _handler(self):
+        backend = self.backend
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if body.get("task") != "get_embedding":
+                    self.send_error(400, "Unsupported task")
+                    return
+                data = body["data"]["input"]
+                server.requests += 1
+                if isinstance(data, list) and not server.batching:
+                    self.send_error(400, "Expected a single input")
+                    return
+                embeddings = backend.embed(data)
+                payload = {"embeddings": embeddings} if isinstance(data, list) else {"embedding": embeddings[0]}
+                encoded = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> str:
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-embedding-server", daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/"
+        return self.url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeEmbeddingServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def _text_of(contents: Sequence) -> str:
+    """The text parts of a request, used for seeding and for deciding what to answer"""
+    return "\n".join(part for part in contents if isinstance(part, str))
+
+class FakeModels:
+    """`client.models` of FakeGeminiClient"""
+
+    def __init__(self, client: "FakeGeminiClient"):
+        self.client = client
+
+    def generate_content(self, model: str, contents: Sequence, config=None):
+        client = self.client
+        text = _text_of(contents)
+        client.latency.wait(text)
+
+        if config is not None and getattr(config, "tools", None):
+            # Tool selection: call the first declared tool with the user's message as the query
+            tool_name = config.tools[0].function_declarations[0].name
+            query = next((part for part in reversed(contents) if isinstance(part, str)), "")
+            call = None
+            if np.random.default_rng(stable_seed(query)).random() < client.tool_call_rate:
+                call = FunctionCall(name=tool_name, args={"user_query": query})
+            part = SimpleNamespace(function_call=call, text=None)
+            return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))], text=None)
+
+        context_items = len(contents) - 1
+        if text.startswith("You are an AI assistant. Based on the current information"):
+            # ReAct step: ask for retrieval until enough context has been gathered
+            if context_items < client.react_context_items:
+                query = text.split("User query:", 1)[-1].split("\n", 1)[0].strip()
+                return SimpleNamespace(text=f"TOOL: {query}", candidates=[])
+            return SimpleNamespace(text=f"ANSWER: based on {context_items} items", candidates=[])
+        return SimpleNamespace(text=f"Answer {stable_seed(text) % 10000} from {len(contents)} parts", candidates=[])
+
+class FakeGeminiClient:
+    """
+    Drop-in for `genai.Client` in the agents: deterministic replies with configurable latency
+
+    With a tools config it returns a function call for the first declared tool
+    (for `tool_call_rate` of queries, chosen by the query's seed); a ReAct prompt
+    gets `TOOL:` steps until `react_context_items` context parts are present,
+    then `ANSWER:`; other prompts get a short answer derived from their text.
+
+    Args:
+        latency_seconds: Latency per generate_content call
+        jitter_seconds: Extra seeded latency per call
+        tool_call_rate: Fraction of queries for which a tool is called
+        react_context_items: Context parts after which the ReAct step answers
+    """
+
+    def __init__(self, latency_seconds: float = 0.0, jitter_seconds: float = 0.0, tool_call_rate: float = 1.0,
+                 react_context_items: int = 1):
+        self.latency = LatencyModel(latency_seconds, jitter_seconds)
+        self.tool_call_rate = tool_call_rate
+        self.react_context_items = react_context_items
+        self.models = FakeModels(self)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Generate Tile Embeddings for Multi-Vector Search
+
+This script splits every rendered page listed in data/embeddings.json into a grid
+of tiles, embeds each tile with Voyage AI and writes the result to
+data/tile_embeddings.json. Set MULTI_VECTOR_SEARCH=true to have the agent score
+pages with MaxSim over these tiles instead of a single page embedding.
+"""
+
+import json
+import os
+from typing import Callable, List
+
+from PIL import Image
+from tqdm import tqdm
+
+from pdf_pages import resolve_image_path
+from snowflake_config import get_config
+from vector_index import parse_page_key
+
+def split_page_into_tiles(image: Image.Image, grid: int = 2, overlap: float = 0.1) -> List[Image.Image]:
+    """
+    Split a page image into a grid of slightly overlapping tiles
+
+    Args:
+        image: Page image
+        grid: Number of rows and columns
+        overlap: Fraction of a tile's size shared with its neighbours, so figures on tile borders stay whole
+
+    Returns:
+        List[Image.Image]: Row-major tiles
+    """
+    width, height = image.size
+    tile_width, tile_height = width / grid, height / grid
+    pad_x, pad_y = tile_width * overlap, tile_height * overlap
+
+    tiles = []
+    for row in range(grid):
+        for col in range(grid):
+            box = (
+                int(max(0, col * tile_width - pad_x)),
+                int(max(0, row * tile_height - pad_y)),
+                int(min(width, (col + 1) * tile_width + pad_x)),
+                int(min(height, (row + 1) * tile_height + pad_y)),
+            )
+            tiles.append(image.crop(box))
+    return tiles
+
+def create_voyage_embedder(model: str) -> Callable[[List[Image.Image]], List[List[float]]]:
+    """Create a function embedding a batch of images with Voyage AI"""
+    from voyageai import Client
+
+    voyageai_client = Client()
+
+    def embed(images: List[Image.Image]) -> List[List[float]]:
+        return voyageai_client.multimodal_embed(
+            inputs=[[image] for image in images], model=model, input_type="document"
+        ).embeddings
+
+    return embed
+
+def generate_tile_embeddings(documents: List[dict], embed: Callable[[List[Image.Image]], List[List[float]]],
+                             grid: int = 2, profile: str = "embedding") -> List[dict]:
+    """
+    Embed the whole page plus each of its tiles
+
+    The whole-page embedding is kept as the first vector so coarse page-level
+    matches are still possible.
+
+    Args:
+        documents: Documents with an image `key`
+        embed: Function embedding a batch of images
+        grid: Number of tile rows and columns
+        profile: Render profile of the page images to embed
+
+    Returns:
+        List[dict]: Documents with `key`, `width`, `height` and `embeddings`
+    """
+    tile_docs = []
+    for doc in tqdm(documents):
+        is_page_key = parse_page_key(doc["key"]) is not None
+        if not is_page_key and not os.path.exists(doc["key"]):
+            print(f"Skipping missing page image: {doc['key']}")
+            continue
+        with Image.open(resolve_image_path(doc["key"], profile)) as page:
+            page = page.convert("RGB")
+            embeddings = embed([page] + split_page_into_tiles(page, grid))
+        tile_docs.append({
+            "key": doc["key"],
+            "width": doc.get("width", 0),
+            "height": doc.get("height", 0),
+            "embeddings": embeddings,
+        })
+    return tile_docs
+
+def main():
+    """Generate tile embeddings for the pages in the embeddings file"""
+    config = get_config()
+    config.setup_environment()
+
+    with open(config.embeddings_file, "r") as data_file:
+        documents = json.load(data_file)
+
+    tile_docs = generate_tile_embeddings(documents, create_voyage_embedder(config.embedding_model), config.tile_grid)
+
+    with open(config.tile_embeddings_file, "w") as f:
+        json.dump(tile_docs, f)
+    print(f"Wrote tile embeddings for {len(tile_docs)} pages to {config.tile_embeddings_file}")
+
+if __name__ == "__main__":
+    main()
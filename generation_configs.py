@@ -0,0 +1,68 @@
+"""
+Shared Gemini generation configs for Snowflake Multimodal Agents Lab
+
+The solution scripts pass the same generation configs on every LLM call. Building
+a GenerateContentConfig validates a pydantic model, so each config is built once,
+on first use, and the same instance is handed to every caller. The instances are
+mutable: callers must treat them as read-only and build their own config (as
+SnowflakeAgent does) when they need different settings.
+
+google.genai is imported when a config is first built, since it is slow to import.
+"""
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+@lru_cache(maxsize=None)
+def get_tools_config(create_declaration: Callable[[], dict]) -> "types.GenerateContentConfig":
+    """
+    Get the shared generation config declaring a tool
+
+    Args:
+        create_declaration: Function returning the tool's function declaration;
+            the config is built once per function
+
+    Returns:
+        types.GenerateContentConfig: Shared config; do not modify it
+    """
+    from google.genai import types
+    return types.GenerateContentConfig(
+        tools=[types.Tool(function_declarations=[create_declaration()])],
+        temperature=0.0,
+    )
+
+@lru_cache(maxsize=None)
+def get_answer_config() -> "types.GenerateContentConfig":
+    """
+    Get the shared generation config for answers
+
+    Returns:
+        types.GenerateContentConfig: Shared config; do not modify it
+    """
+    from google.genai import types
+    return types.GenerateContentConfig(temperature=0.0)
+
+def config_constants(module_name: str, tools_config: Callable[[], "types.GenerateContentConfig"]):
+    """
+    Build a module `__getattr__` serving TOOLS_CONFIG and ANSWER_CONFIG
+
+    The solution scripts used to build these constants at import time; they stay
+    importable, but are only built when first accessed.
+
+    Args:
+        module_name: Name of the module, for the AttributeError message
+        tools_config: Function returning the module's tools config
+
+    Returns:
+        Callable[[str], Any]: Function to assign to the module's `__getattr__`
+    """
+    def __getattr__(name: str):
+        if name == "TOOLS_CONFIG":
+            return tools_config()
+        if name == "ANSWER_CONFIG":
+            return get_answer_config()
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+    return __getattr__
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Chat history retention for Snowflake Multimodal Agents Lab
+
+Deleting every expired message with one DELETE rewrites large parts of
+chat_history in a single transaction while agents keep appending to it. The
+retention job works through the expired messages oldest first instead, one
+bounded batch at a time:
+
+    1. select the next batch_size messages older than the cutoff, ordered by (timestamp, id)
+    2. write them to a gzipped JSON lines archive file, replaced atomically
+    3. delete exactly those ids, restricted to the batch's timestamp range so that
+       Snowflake can prune micro-partitions, and commit
+    4. record progress in the run's state file, pause, and repeat
+
+Each run keeps its cutoff and counters in `{archive_dir}/{run}/state.json`. An
+interrupted run resumes with the same cutoff: the rows it already deleted are
+gone, and archive numbering continues after the last file written. If the job
+stops between writing an archive and committing its delete, that batch is
+archived twice but never lost.
+
+Usage:
+    python history_retention.py                 # Archive and delete messages older than HISTORY_RETENTION_DAYS
+    python history_retention.py --days 90 --batch-size 5000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from metrics import get_metrics
+from snowflake_config import get_config
+
+STATE_FILE = "state.json"
+_COLUMNS = ("id", "session_id", "role", "message_type", "content", "timestamp")
+
+def _timestamp(value: Any) -> str:
+    return value.isoformat(sep=" ") if isinstance(value, datetime) else str(value)
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary_path, path)
+
+def read_archive(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the messages of an archive file written by the retention job
+
+    Args:
+        path: `.jsonl.gz` archive file
+
+    Returns:
+        Iterator[Dict[str, Any]]: Messages with id, session_id, role, message_type, content and timestamp
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+class RetentionJob:
+    """
+    Archives and deletes chat history older than a cutoff in bounded batches
+
+    Args:
+        conn: Snowflake connection object
+        days_old: Keep messages newer than this many days. Defaults to `history_retention_days`.
+        batch_size: Messages archived and deleted per transaction. Defaults to `history_retention_batch_size`.
+        archive_dir: Directory for archive runs. Defaults to `history_archive_dir`.
+        pause_seconds: Pause between batches. Defaults to `history_retention_pause_ms`.
+        cutoff: Delete messages older than this instead of `days_old` before now
+    """
+
+    def __init__(self, conn, days_old: Optional[int] = None, batch_size: Optional[int] = None,
+                 archive_dir: Optional[str] = None, pause_seconds: Optional[float] = None,
+                 cutoff: Optional[datetime] = None):
+        config = get_config()
+        self.conn = conn
+        self.days_old = config.history_retention_days if days_old is None else days_old
+        self.batch_size = batch_size or config.history_retention_batch_size
+        self.archive_dir = archive_dir or config.history_archive_dir
+        self.pause_seconds = config.history_retention_pause_ms / 1000 if pause_seconds is None else pause_seconds
+        self.cutoff = cutoff
+        self.state: Dict[str, Any] = {}
+        self.run_dir: Optional[str] = None
+
+    def _open_run(self) -> None:
+        """Resume the unfinished run in the archive directory, or start a new one"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for name in sorted(os.listdir(self.archive_dir), reverse=True):
+            state_path = os.path.join(self.archive_dir, name, STATE_FILE)
+            if os.path.exists(state_path):
+                with open(state_path, "r") as f:
+                    state = json.load(f)
+                if not state["completed"]:
+                    self.run_dir, self.state = os.path.dirname(state_path), state
+                    print(f"Resuming retention run {name}: {state['rows_deleted']} messages already deleted")
+                    return
+                break
+
+        cutoff = self.cutoff or datetime.now() - timedelta(days=self.days_old)
+        started = datetime.now()
+        name = run_name = started.strftime("%Y%m%dT%H%M%S")
+        suffix = 0
+        while os.path.exists(os.path.join(self.archive_dir, name)):
+            suffix += 1
+            name = f"{run_name}-{suffix}"
+        self.run_dir = os.path.join(self.archive_dir, name)
+        os.makedirs(self.run_dir)
+        self.state = {
+            "cutoff": _timestamp(cutoff),
+            "started_at": _timestamp(started),
+            "batches": 0,
+            "rows_deleted": 0,
+            "expired_at_start": self._count_expired(_timestamp(cutoff)),
+            "completed": False,
+        }
+        self._save_state()
+
+    def _save_state(self) -> None:
+        _write_json(os.path.join(self.run_dir, STATE_FILE), self.state)
+
+    def _count_expired(self, cutoff: str) -> int:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM chat_history WHERE timestamp < %s", (cutoff,))
+        count = cursor.fetchone()[0]
+        cursor.close()
+        return count
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM chat_history WHERE timestamp < %s "
+            f"ORDER BY timestamp, id LIMIT {int(self.batch_size)}",
+            (self.state["cutoff"],),
+        )
+        rows = [dict(zip(_COLUMNS, row)) for row in cursor.fetchall()]
+        cursor.close()
+        return rows
+
+    def _archive_path(self) -> str:
+        # Numbered after the files already written, so a resumed run never overwrites an archive
+        written = [name for name in os.listdir(self.run_dir) if name.endswith(".jsonl.gz")]
+        return os.path.join(self.run_dir, f"chat_history-{len(written):06d}.jsonl.gz")
+
+    def _archive(self, rows: List[Dict[str, Any]]) -> str:
+        path = self._archive_path()
+        temporary_path = f"{path}.tmp"
+        with gzip.open(temporary_path, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(row, timestamp=_timestamp(row["timestamp"]))) + "\n")
+        os.replace(temporary_path, path)
+        return path
+
+    def _delete(self, rows: List[Dict[str, Any]]) -> None:
+        cursor = self.conn.cursor()
+        # The timestamp range lets Snowflake skip micro-partitions outside the batch
+        cursor.execute(
+            f"DELETE FROM chat_history WHERE timestamp >= %s AND timestamp <= %s "
+            f"AND id IN ({', '.join(['%s'] * len(rows))})",
+            [rows[0]["timestamp"], rows[-1]["timestamp"]] + [row["id"] for row in rows],
+        )
+        cursor.close()
+        self.conn.commit()
+
+    def run(self, max_batches: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Archive and delete expired messages until none are left
+
+        Args:
+            max_batches: Stop after this many batches (the run stays resumable)
+
+        Returns:
+            Dict[str, Any]: The run state: `cutoff`, `batches`, `rows_deleted`,
+                `expired_at_start` and `completed`
+        """
+        self._open_run()
+        metrics = get_metrics()
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            started = time.perf_counter()
+            rows = self._next_batch()
+            if not rows:
+                self.state["completed"] = True
+                self.state["completed_at"] = _timestamp(datetime.now())
+                self._save_state()
+                break
+
+            path = self._archive(rows)
+            self._delete(rows)
+            batches += 1
+            self.state["batches"] += 1
+            self.state["rows_deleted"] += len(rows)
+            self._save_state()
+            metrics.counter("history_rows_archived_total", "Chat history messages archived and deleted").inc(len(rows))
+            metrics.histogram("history_retention_batch_seconds", "Time per retention batch").observe(
+                time.perf_counter() - started)
+
+            expired = max(self.state["expired_at_start"], self.state["rows_deleted"])
+            print(f"Batch {self.state['batches']}: {len(rows)} messages through {_timestamp(rows[-1]['timestamp'])} "
+                  f"-> {os.path.basename(path)} ({self.state['rows_deleted']}/{expired}, "
+                  f"{self.state['rows_deleted'] / expired:.0%})")
+
+            if len(rows) == self.batch_size:
+                # Leave room for the agents writing to the table
+                time.sleep(self.pause_seconds)
+        return dict(self.state)
+
+def run_retention(conn, days_old: Optional[int] = None, **options) -> Dict[str, Any]:
+    """
+    Archive and delete chat history older than `days_old` days (resuming an interrupted run)
+
+    Args:
+        conn: Snowflake connection object
+        days_old: Number of days to keep. Defaults to `history_retention_days`.
+        **options: Further RetentionJob arguments (`batch_size`, `archive_dir`, `pause_seconds`, `cutoff`)
+
+    Returns:
+        Dict[str, Any]: The run state, see `RetentionJob.run`
+    """
+    return RetentionJob(conn, days_old, **options).run()
+
+def main():
+    """Run the retention job against the configured Snowflake account"""
+    parser = argparse.ArgumentParser(description="Archive and delete expired chat history in batches")
+    parser.add_argument("--days", type=int, default=None, help="Days of history to keep")
+    parser.add_argument("--batch-size", type=int, default=None, help="Messages per batch")
+    parser.add_argument("--archive-dir", default=None, help="Directory for the archive files")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
+    args = parser.parse_args()
+
+    from snowflake_solution_working_final import setup_snowflake_connection
+    conn = setup_snowflake_connection()
+    try:
+        job = RetentionJob(conn, args.days, batch_size=args.batch_size, archive_dir=args.archive_dir)
+        state = job.run(max_batches=args.max_batches)
+    finally:
+        conn.close()
+    status = "completed" if state["completed"] else "paused (run again to resume)"
+    print(f"Retention {status}: {state['rows_deleted']} messages older than {state['cutoff']} "
+          f"archived to {job.run_dir}")
+
+if __name__ == "__main__":
+    main()
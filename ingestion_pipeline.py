@@ -0,0 +1,272 @@
+"""
+Staged ingestion pipeline for Snowflake Multimodal Agents Lab
+
+Ingestion used to run as strict phases: walk the directory, extract every file,
+then load everything at the end. This pipeline runs the stages concurrently,
+connected by bounded queues:
+
+    discover -> extract (process pool) -> embed (batches) -> write (batches)
+
+A full queue blocks the stage feeding it, so a slow database or embedding endpoint
+throttles file extraction instead of letting extracted documents pile up in
+memory. Every stage records how many items it handled and how long it was busy.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from metrics import get_metrics
+
+# Marks the end of a stage's output
+_DONE = object()
+
+class StageStats:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Wall time from the stage's first item to its end"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def items_per_second(self) -> float:
+        """Items handled per second of wall time"""
+        elapsed = self.elapsed_seconds
+        return self.items / elapsed if elapsed > 0 else 0.0
+
+    def record(self, items: int, busy_seconds: float) -> None:
+        if self.started_at is None:
+            self.started_at = time.perf_counter() - busy_seconds
+        self.items += items
+        self.batches += 1
+        self.busy_seconds += busy_seconds
+        metrics = get_metrics()
+        metrics.counter("ingest_stage_items_total", "Items handled per ingestion stage", stage=self.name).inc(items)
+        metrics.histogram("ingest_stage_batch_seconds", "Busy time per ingestion batch", stage=self.name).observe(busy_seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "items_per_second": round(self.items_per_second, 2),
+        }
+
+    def __repr__(self) -> str:
+        return f"StageStats({self.name}, {self.as_dict()})"
+
+class IngestionPipeline:
+    """
+    Producer/consumer pipeline from file paths to stored documents
+
+    Args:
+        extract: Called in the worker pool with a file path; returns a list of documents.
+            Must be picklable (a module-level function) when a process pool is used.
+        embed: Called with a batch of documents; returns one embedding per document
+        write: Called with a batch of documents that have an `embedding`
+        workers: Number of extraction worker processes
+        queue_size: Capacity of each queue between stages, and the number of files in flight
+        embed_batch_size: Maximum documents per embed call
+        write_batch_size: Maximum documents per write call
+        executor_factory: Creates the extraction pool from `workers`. Defaults to ProcessPoolExecutor.
+    """
+
+    def __init__(self, extract: Callable[[str], List[Dict]], embed: Callable[[List[Dict]], List[Any]],
+                 write: Callable[[List[Dict]], Any], workers: int = 4, queue_size: int = 64,
+                 embed_batch_size: int = 32, write_batch_size: int = 500,
+                 executor_factory: Callable[[int], Executor] = None):
+        self.extract = extract
+        self.embed = embed
+        self.write = write
+        self.workers = workers
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.executor_factory = executor_factory or (lambda n: ProcessPoolExecutor(max_workers=n))
+        self.stats: Dict[str, StageStats] = {}
+        self._error: Optional[BaseException] = None
+        self._stopped = threading.Event()
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        """Put with backpressure; gives up if another stage failed"""
+        while not self._stopped.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        """Get the next item, or _DONE if another stage failed"""
+        while not self._stopped.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._stopped.set()
+
+    def _next_batch(self, source: queue.Queue, size: int) -> tuple:
+        """Block for one item, then take whatever else is ready up to `size`"""
+        first = self._get(source)
+        if first is _DONE:
+            return [], True
+        batch = [first]
+        while len(batch) < size:
+            try:
+                item = source.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _discover(self, paths: Iterable[str], path_queue: queue.Queue) -> None:
+        stats = self.stats["discover"]
+        try:
+            for path in paths:
+                started = time.perf_counter()
+                if not self._put(path_queue, path):
+                    return
+                stats.record(1, time.perf_counter() - started)
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            stats.finished_at = time.perf_counter()
+            self._put(path_queue, _DONE)
+
+    def _extract(self, path_queue: queue.Queue, document_queue: queue.Queue) -> None:
+        stats = self.stats["extract"]
+        # Bounds the number of files submitted to the pool but not yet handed on; a slot is
+        # only freed once the file's documents are in the queue
+        in_flight = threading.BoundedSemaphore(self.queue_size)
+        lock = threading.Lock()
+
+        def on_done(future, submitted):
+            try:
+                try:
+                    documents = future.result()
+                except BaseException as error:
+                    self._fail(error)
+                    return
+                with lock:
+                    stats.record(len(documents), time.perf_counter() - submitted)
+                for document in documents:
+                    if not self._put(document_queue, document):
+                        return
+            finally:
+                in_flight.release()
+
+        try:
+            with self.executor_factory(self.workers) as executor:
+                while True:
+                    path = self._get(path_queue)
+                    if path is _DONE:
+                        break
+                    while not in_flight.acquire(timeout=0.1):
+                        if self._stopped.is_set():
+                            break
+                    if self._stopped.is_set():
+                        break
+                    submitted = time.perf_counter()
+                    future = executor.submit(self.extract, path)
+                    future.add_done_callback(lambda f, s=submitted: on_done(f, s))
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            stats.finished_at = time.perf_counter()
+            self._put(document_queue, _DONE)
+
+    def _embed(self, document_queue: queue.Queue, write_queue: queue.Queue) -> None:
+        stats = self.stats["embed"]
+        try:
+            done = False
+            while not done:
+                batch, done = self._next_batch(document_queue, self.embed_batch_size)
+                if not batch:
+                    continue
+                started = time.perf_counter()
+                embeddings = self.embed(batch)
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Embedding returned {len(embeddings)} embeddings for {len(batch)} documents")
+                stats.record(len(batch), time.perf_counter() - started)
+                for document, embedding in zip(batch, embeddings):
+                    if not self._put(write_queue, dict(document, embedding=embedding)):
+                        return
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            stats.finished_at = time.perf_counter()
+            self._put(write_queue, _DONE)
+
+    def _write(self, write_queue: queue.Queue) -> None:
+        stats = self.stats["write"]
+        try:
+            done = False
+            while not done:
+                batch, done = self._next_batch(write_queue, self.write_batch_size)
+                if not batch:
+                    continue
+                started = time.perf_counter()
+                self.write(batch)
+                stats.record(len(batch), time.perf_counter() - started)
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            stats.finished_at = time.perf_counter()
+
+    def run(self, paths: Iterable[str]) -> Dict[str, StageStats]:
+        """
+        Ingest the given files, returning once every document is written
+
+        Args:
+            paths: File paths; consumed lazily, so a directory walk can be passed directly
+
+        Returns:
+            Dict[str, StageStats]: Throughput of the discover, extract, embed and write stages
+
+        Raises:
+            The first exception raised by any stage, after all stages have stopped
+        """
+        self.stats = {name: StageStats(name) for name in ("discover", "extract", "embed", "write")}
+        self._error = None
+        self._stopped.clear()
+
+        path_queue = queue.Queue(maxsize=self.queue_size)
+        document_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+
+        threads = [
+            threading.Thread(target=self._discover, args=(paths, path_queue), name="ingest-discover"),
+            threading.Thread(target=self._extract, args=(path_queue, document_queue), name="ingest-extract"),
+            threading.Thread(target=self._embed, args=(document_queue, write_queue), name="ingest-embed"),
+            threading.Thread(target=self._write, args=(write_queue,), name="ingest-write"),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
@@ -0,0 +1,336 @@
+"""
+In-process metrics for Snowflake Multimodal Agents Lab
+
+Traces explain a single slow request; capacity planning needs rates and
+percentiles over all of them. Call sites update named, labelled metrics:
+
+    get_metrics().counter("llm_calls_total", "LLM calls", call="answer").inc()
+    get_metrics().histogram("search_rows_scanned", "Rows scored per query", strategy="client").observe(n)
+
+    with get_metrics().time("llm_call_seconds", "LLM call latency", call="answer"):
+        ...
+
+Histograms keep log-linear buckets in the style of HdrHistogram: every value is
+counted in a bucket no more than 1/64 (about 1.6%) wider than the value itself, so
+percentiles are accurate over any range (microseconds to minutes, one row to
+millions) without choosing bucket boundaries up front, and memory grows with the
+number of distinct buckets rather than the number of observations.
+
+`render` produces the Prometheus text exposition format; histograms are exported as
+summaries with p50/p90/p99/p99.9, `_sum` and `_count`. With METRICS_PORT set, the
+registry serves it on `/metrics`; with METRICS_FILE set, it is written at exit
+(e.g. for node_exporter's textfile collector).
+"""
+
+import atexit
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from snowflake_config import get_config
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Quantiles exported for every histogram
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _key(name: str, labels: Dict[str, object]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    """A value that only goes up, e.g. calls or rows read"""
+
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+class Gauge:
+    """A value that can go up and down, e.g. documents in the index"""
+
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+class Histogram:
+    """
+    Distribution of observed values with bounded relative error
+
+    Args:
+        precision_bits: Each power of two is split into 2**precision_bits buckets;
+            6 bounds the relative error of a reported percentile by 1/64
+    """
+
+    kind = "summary"
+
+    def __init__(self, precision_bits: int = 6):
+        self._sub_buckets = 1 << precision_bits
+        self._buckets: Dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._lock = threading.Lock()
+
+    def _bucket(self, value: float) -> int:
+        # value = mantissa * 2**exponent with 0.5 <= mantissa < 1
+        mantissa, exponent = math.frexp(value)
+        return exponent * self._sub_buckets + int((mantissa - 0.5) * 2 * self._sub_buckets)
+
+    def _upper_bound(self, bucket: int) -> float:
+        exponent, sub_bucket = divmod(bucket, self._sub_buckets)
+        return math.ldexp(0.5 + (sub_bucket + 1) / (2 * self._sub_buckets), exponent)
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            if value > 0:
+                bucket = self._bucket(value)
+                self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+            else:
+                self._zeros += 1
+            self.count += 1
+            self.sum += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Value at or below which a fraction `q` of the observations fall
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            float: Upper bound of the bucket holding the quantile, clamped to the observed
+                minimum and maximum (NaN if nothing was observed)
+        """
+        with self._lock:
+            if self.count == 0:
+                return math.nan
+            rank = max(1, math.ceil(q * self.count))
+            seen = self._zeros
+            value = self.max
+            if seen >= rank:
+                value = 0.0
+            else:
+                for bucket in sorted(self._buckets):
+                    seen += self._buckets[bucket]
+                    if seen >= rank:
+                        value = self._upper_bound(bucket)
+                        break
+            return min(max(value, self.min), self.max)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the wall time of the enclosed block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class _NullMetric:
+    """Stands in for every metric when metrics are disabled"""
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        yield
+
+_NULL_METRIC = _NullMetric()
+
+class MetricsRegistry:
+    """
+    Named, labelled counters, gauges and histograms
+
+    A metric is created on first use and shared by every later call with the same
+    name and labels, so call sites do not need to keep references.
+
+    Args:
+        enabled: If False, every metric is a no-op
+        quantiles: Quantiles exported for each histogram
+    """
+
+    def __init__(self, enabled: bool = True, quantiles: Tuple[float, ...] = DEFAULT_QUANTILES):
+        self.enabled = enabled
+        self.quantiles = quantiles
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], object] = {}
+        self._families: Dict[str, Tuple[type, str]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, metric_class: type, name: str, help: str, labels: Dict[str, object]):
+        if not self.enabled:
+            return _NULL_METRIC
+        key = _key(name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                family_class, _ = self._families.setdefault(name, (metric_class, help))
+                if family_class is not metric_class:
+                    raise ValueError(f"Metric {name} is a {family_class.kind}, not a {metric_class.kind}")
+                metric = self._metrics.setdefault(key, metric_class())
+        return metric
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str = "", **labels) -> Histogram:
+        return self._get(Histogram, name, help, labels)
+
+    def time(self, name: str, help: str = "", **labels):
+        """Observe the wall time of a block in seconds in the histogram `name`"""
+        return self.histogram(name, help, **labels).time()
+
+    def value(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge (0 if it was never updated)"""
+        metric = self._metrics.get(_key(name, labels))
+        return metric.value if metric is not None else 0.0
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            families = dict(self._families)
+            metrics = sorted(self._metrics.items())
+
+        lines: List[str] = []
+        for name, (metric_class, help) in sorted(families.items()):
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {metric_class.kind}")
+            for (metric_name, labels), metric in metrics:
+                if metric_name != name:
+                    continue
+                if isinstance(metric, Histogram):
+                    if metric.count:
+                        for q in self.quantiles:
+                            quantile = f'quantile="{q}"'
+                            lines.append(f"{name}{_format_labels(labels, quantile)} {_format_value(metric.quantile(q))}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(metric.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+        return "".join(line + "\n" for line in lines)
+
+    def write(self, path: str) -> None:
+        """Write the metrics to a file, replacing it atomically so scrapers never see a partial file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write(self.render())
+        os.replace(temporary_path, path)
+
+    def serve(self, port: int, host: str = "") -> "ThreadingHTTPServer":
+        """
+        Serve the metrics on `http://host:port/metrics` from a daemon thread
+
+        Args:
+            port: Port to listen on (0 picks a free port)
+            host: Interface to bind; all interfaces by default
+
+        Returns:
+            ThreadingHTTPServer: The running server; call `shutdown()` to stop it
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+    def clear(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+            self._families.clear()
+
+_default_metrics: Optional[MetricsRegistry] = None
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Get the process-wide registry configured by `metrics_enabled`, `metrics_port` and `metrics_file`
+
+    The first call starts the `/metrics` endpoint when METRICS_PORT is set and
+    registers writing METRICS_FILE at exit.
+    """
+    global _default_metrics
+    if _default_metrics is None:
+        config = get_config()
+        _default_metrics = MetricsRegistry(config.metrics_enabled)
+        if config.metrics_enabled and config.metrics_port:
+            try:
+                _default_metrics.serve(config.metrics_port)
+            except OSError as e:
+                print(f"Warning: Could not serve metrics on port {config.metrics_port}: {e}")
+        if config.metrics_enabled and config.metrics_file:
+            atexit.register(_default_metrics.write, config.metrics_file)
+    return _default_metrics
@@ -0,0 +1,59 @@
+"""
+Snowflake Multimodal Agents Lab
+
+The single import for applications: the agent, its configuration, the retrieval
+strategies and the setup and ingestion helpers.
+
+    from multimodal_agents import SnowflakeAgent, setup_snowflake_connection
+
+    agent = SnowflakeAgent(setup_snowflake_connection())
+    agent.execute_agent("What are the main topics in the documents?")
+
+Retrieval is chosen with SEARCH_MODE (`client` by default, `server` or
+`multi_vector`), or per agent with `SnowflakeAgent(conn, retriever=...)`; see
+retrieval.py. The snowflake_solution_*.py scripts are earlier experiments with
+other storage formats (VECTOR cast, VARIANT, STRING with per-row Python cosine) and
+are kept for reference only; new code should import from here.
+"""
+
+from retrieval import (
+    RETRIEVERS,
+    ClientRetriever,
+    MultiVectorRetriever,
+    Retriever,
+    ServerRetriever,
+    get_retriever,
+    register_retriever,
+)
+from snowflake_agent import SnowflakeAgent, ToolRegistry, create_default_tool_registry, get_gemini_client
+from snowflake_config import SnowflakeConfig, get_config
+from snowflake_solution_working_final import (
+    embed_queries,
+    get_information_for_question_answering,
+    load_embeddings_to_snowflake,
+    search_many,
+    setup_gemini,
+    setup_snowflake_connection,
+)
+
+__all__ = [
+    "RETRIEVERS",
+    "ClientRetriever",
+    "MultiVectorRetriever",
+    "Retriever",
+    "ServerRetriever",
+    "SnowflakeAgent",
+    "SnowflakeConfig",
+    "ToolRegistry",
+    "create_default_tool_registry",
+    "embed_queries",
+    "get_config",
+    "get_gemini_client",
+    "get_information_for_question_answering",
+    "get_retriever",
+    "load_embeddings_to_snowflake",
+    "register_retriever",
+    "search_many",
+    "setup_gemini",
+    "setup_snowflake_connection",
+]
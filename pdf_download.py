@@ -0,0 +1,245 @@
+"""
+Streaming PDF downloader for Snowflake Multimodal Agents Lab
+
+Source PDFs are streamed to disk in chunks instead of being buffered in memory,
+and stored in a content-addressed cache (`objects/<sha256>.pdf`) with an index from
+URL to content hash, so a PDF that was already downloaded is opened straight from
+disk. Interrupted downloads keep their partial file and resume with an HTTP Range
+request; `If-Range` makes the server send the whole file again if it has changed.
+A download is only cached once its size has been verified against the response.
+
+The content hash is only the cache's lookup key. Documents ingested from a PDF are
+keyed by a readable path such as `data/pdfs/<name>.pdf`, which
+`download_pdf_to` links (or copies) from the cache.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Optional, Tuple
+
+import requests
+
+from snowflake_config import get_config
+
+def _sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def parse_content_range(header: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Read the first byte and the total size from a `Content-Range` header
+
+    Args:
+        header: Header value, e.g. `bytes 100-199/1000` or `bytes */1000`
+
+    Returns:
+        Tuple[Optional[int], Optional[int]]: (start, total); None where the header does not say
+    """
+    if not header or not header.startswith("bytes "):
+        return None, None
+    byte_range, _, total = header[len("bytes "):].partition("/")
+    start = byte_range.split("-")[0]
+    return (int(start) if start.isdigit() else None), (int(total) if total.isdigit() else None)
+
+class PdfCache:
+    """
+    Content-addressed cache of downloaded PDFs
+
+    Args:
+        cache_dir: Directory holding `objects/`, `partial/` and the `urls.json` index
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.partial_dir = os.path.join(cache_dir, "partial")
+        self.index_path = os.path.join(cache_dir, "urls.json")
+        self._lock = threading.Lock()
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict) -> None:
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(temp_path, self.index_path)
+
+    def object_path(self, content_hash: str) -> str:
+        return os.path.join(self.objects_dir, f"{content_hash}.pdf")
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Path of the cached PDF for a URL, or None if it has not been downloaded"""
+        content_hash = self._read_index().get(url)
+        if content_hash and os.path.exists(self.object_path(content_hash)):
+            return self.object_path(content_hash)
+        return None
+
+    def _partial_paths(self, url: str) -> tuple:
+        name = hashlib.md5(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.partial_dir, f"{name}.part"), os.path.join(self.partial_dir, f"{name}.json")
+
+    def _discard_partial(self, url: str) -> None:
+        for path in self._partial_paths(url):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def download(self, url: str, chunk_size: int = 1 << 20, timeout: float = 60.0,
+                 session: Optional[requests.Session] = None) -> str:
+        """
+        Get a local path for a PDF URL, downloading (or resuming) it if needed
+
+        Args:
+            url: PDF URL
+            chunk_size: Bytes read from the response per write
+            timeout: Connect/read timeout in seconds
+            session: HTTP session to use. Defaults to a plain requests call.
+
+        Returns:
+            str: Path to the complete PDF in the cache
+
+        Raises:
+            ValueError: If the server responds with an error status, the body is cut short
+                or the size of a resumed download cannot be verified (no `Content-Length` or
+                `Content-Range` total)
+        """
+        cached = self.lookup(url)
+        if cached:
+            return cached
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        part_path, meta_path = self._partial_paths(url)
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = None
+        if offset and os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                validator = json.load(f).get("validator")
+
+        # Ranges and lengths refer to the stored bytes, so ask for them unencoded
+        headers = {"Accept-Encoding": "identity"}
+        if offset and validator:
+            headers.update({"Range": f"bytes={offset}-", "If-Range": validator})
+
+        http = session or requests
+        restart = False
+        with http.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 416 and offset:
+                # The partial file may already hold the whole body, if the server's total agrees
+                _, total = parse_content_range(response.headers.get("Content-Range"))
+                if total != offset:
+                    self._discard_partial(url)
+                    raise ValueError(f"Cannot resume PDF download from {url}: "
+                                     f"server reports {total} bytes, {offset} downloaded")
+            elif response.status_code not in (200, 206):
+                raise ValueError(f"Failed to download PDF. Status code: {response.status_code}")
+            else:
+                resumed = response.status_code == 206
+                expected_size = None
+                if resumed:
+                    start, expected_size = parse_content_range(response.headers.get("Content-Range"))
+                    # A range that does not continue the partial file cannot be appended to it
+                    restart = start != offset
+                else:
+                    offset = 0
+                if not restart:
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                    with open(meta_path, "w") as f:
+                        json.dump({"url": url, "validator": validator}, f)
+                    with open(part_path, "ab" if resumed else "wb") as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+
+                    length = response.headers.get("Content-Length")
+                    if length is not None:
+                        expected_size = offset + int(length)
+                    # A full response without a length (chunked transfer encoding) is complete once
+                    # the stream ends cleanly; appended bytes can only be checked against a known size.
+                    # Keep the partial file in both cases so the next call resumes from here
+                    if expected_size is None and resumed:
+                        raise ValueError(f"Cannot verify the size of the PDF resumed from {url}: "
+                                         f"the response has no Content-Length or Content-Range total")
+                    if expected_size is not None and os.path.getsize(part_path) != expected_size:
+                        raise ValueError(f"Incomplete PDF download from {url}: "
+                                         f"{os.path.getsize(part_path)} of {expected_size} bytes")
+
+        if restart:
+            self._discard_partial(url)
+            return self.download(url, chunk_size, timeout, session)
+
+        # Hash the completed file and move it into the content-addressed store
+        content_hash = _sha256(part_path, chunk_size)
+        os.replace(part_path, self.object_path(content_hash))
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        with self._lock:
+            index = self._read_index()
+            index[url] = content_hash
+            self._write_index(index)
+        return self.object_path(content_hash)
+
+def download_pdf(url: str, cache_dir: Optional[str] = None, **kwargs) -> str:
+    """
+    Download a PDF into the local cache and return its path
+
+    Args:
+        url: PDF URL
+        cache_dir: Cache directory. Defaults to `SnowflakeConfig.pdf_cache_dir`.
+        **kwargs: Passed to `PdfCache.download`
+
+    Returns:
+        str: Path to the cached PDF
+    """
+    return PdfCache(cache_dir or get_config().pdf_cache_dir).download(url, **kwargs)
+
+def local_pdf_path(url: str, directory: str) -> str:
+    """Readable path for a downloaded PDF: the URL's file name in `directory`, with a .pdf extension"""
+    name = os.path.basename(url.rstrip("/"))
+    return os.path.join(directory, name if name.lower().endswith(".pdf") else f"{name}.pdf")
+
+def download_pdf_to(url: str, path: str, cache_dir: Optional[str] = None, **kwargs) -> str:
+    """
+    Download a PDF through the local cache and place it at a readable path
+
+    The file is hard-linked from the cache where possible and copied otherwise; an
+    existing file at `path` is only replaced if it differs from the download.
+
+    Args:
+        url: PDF URL
+        path: Where the PDF should live, e.g. `data/pdfs/<name>.pdf`
+        cache_dir: Cache directory. Defaults to `SnowflakeConfig.pdf_cache_dir`.
+        **kwargs: Passed to `PdfCache.download`
+
+    Returns:
+        str: `path`
+    """
+    cached = download_pdf(url, cache_dir, **kwargs)
+    if os.path.exists(path):
+        # Cached objects are named by their SHA-256
+        content_hash = os.path.splitext(os.path.basename(cached))[0]
+        if os.path.samefile(path, cached) or (os.path.getsize(path) == os.path.getsize(cached)
+                                              and _sha256(path) == content_hash):
+            return path
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(cached, temp_path)
+    except OSError:
+        shutil.copyfile(cached, temp_path)
+    os.replace(temp_path, path)
+    return path
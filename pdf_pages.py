@@ -0,0 +1,322 @@
+"""
+On-demand PDF page rendering for Snowflake Multimodal Agents Lab
+
+With lazy rendering, ingestion stores one lightweight record per PDF page (a
+`{pdf_path}#page={n}` key and the page size) instead of writing a 3x PNG for every
+page. Pages are rendered when they are actually needed: at a low zoom to compute
+embeddings, and at the full context zoom when retrieval hands them to the LLM.
+Rendered pages are kept in a size-bounded on-disk LRU cache.
+
+Each use of a page image has a render profile (zoom, image format, quality and
+grayscale for text-only pages): `context` for the LLM, `embedding` for the
+embedding model and `thumbnail` for previews. When pages are rendered eagerly,
+each page is rasterized once at the largest zoom and the other profiles are
+downscaled from that image.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+from PIL import Image
+
+from snowflake_config import get_config
+from vector_index import make_page_key, parse_page_key
+
+# pymupdf is imported by the functions that open PDFs, so the agent can import
+# resolve_image_path without loading it
+if TYPE_CHECKING:
+    import pymupdf
+
+class RenderProfile(NamedTuple):
+    """How a page image is rendered and stored for one use"""
+    name: str
+    zoom: float
+    format: str = "png"  # png, jpeg or webp
+    quality: int = 85  # jpeg/webp quality
+    grayscale: bool = False  # store text-only pages in grayscale
+
+    @property
+    def extension(self) -> str:
+        return {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}[self.format]
+
+def get_render_profiles(config=None) -> Dict[str, RenderProfile]:
+    """
+    Build the `context`, `embedding` and `thumbnail` profiles from the configuration
+
+    Args:
+        config: Configuration. Defaults to the global configuration.
+
+    Returns:
+        Dict[str, RenderProfile]: Profiles by name
+    """
+    config = config or get_config()
+    return {
+        "context": RenderProfile("context", config.pdf_zoom, config.pdf_context_format,
+                                 config.pdf_image_quality, config.pdf_grayscale_text_pages),
+        "embedding": RenderProfile("embedding", config.pdf_embed_zoom, config.pdf_embed_format,
+                                   config.pdf_image_quality, config.pdf_grayscale_text_pages),
+        "thumbnail": RenderProfile("thumbnail", config.pdf_thumbnail_zoom, config.pdf_thumbnail_format,
+                                   config.pdf_image_quality, config.pdf_grayscale_text_pages),
+    }
+
+def is_text_only_page(page: "pymupdf.Page") -> bool:
+    """True if a page has no raster images and draws only in shades of gray"""
+    if page.get_images(full=False):
+        return False
+    for drawing in page.get_drawings():
+        for color in (drawing.get("color"), drawing.get("fill")):
+            if color and len(color) == 3 and max(color) - min(color) > 0.02:
+                return False
+    return True
+
+def rasterize_page(page: "pymupdf.Page", zoom: float, grayscale: bool = False) -> Image.Image:
+    """Render a page to a PIL image"""
+    import pymupdf
+    colorspace = pymupdf.csGRAY if grayscale else pymupdf.csRGB
+    pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+    return Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+
+def save_page_image(image: Image.Image, path: str, profile: RenderProfile) -> None:
+    """Save a page image in the profile's format, writing to a temporary file first"""
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    if profile.format == "png":
+        image.save(temp_path, format="PNG", optimize=False)
+    elif profile.format == "jpeg":
+        image.save(temp_path, format="JPEG", quality=profile.quality, optimize=True)
+    elif profile.format == "webp":
+        image.save(temp_path, format="WEBP", quality=profile.quality, method=4)
+    else:
+        raise ValueError(f"Unsupported page image format: {profile.format}")
+    os.replace(temp_path, path)
+
+def render_page_profiles(page: "pymupdf.Page", profiles: List[RenderProfile]) -> Dict[str, Image.Image]:
+    """
+    Render a page once and derive an image for every profile
+
+    The page is rasterized at the largest zoom; smaller profiles are downscaled from
+    that image. Text-only pages are rasterized in grayscale if every profile allows it.
+
+    Args:
+        page: PDF page
+        profiles: Profiles to produce
+
+    Returns:
+        Dict[str, Image.Image]: Image per profile name
+    """
+    text_only = any(p.grayscale for p in profiles) and is_text_only_page(page)
+    largest = max(profiles, key=lambda p: p.zoom)
+    base = rasterize_page(page, largest.zoom, grayscale=text_only and all(p.grayscale for p in profiles))
+
+    images = {}
+    for profile in profiles:
+        image = base
+        if profile.zoom != largest.zoom:
+            scale = profile.zoom / largest.zoom
+            size = (max(1, round(base.width * scale)), max(1, round(base.height * scale)))
+            image = base.resize(size, Image.LANCZOS)
+        if text_only and profile.grayscale:
+            image = image.convert("L")
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        images[profile.name] = image
+    return images
+
+def derived_image_path(key: str, profile: RenderProfile, renders_dir: Optional[str] = None) -> str:
+    """Path of the image derived from a rendered page for a non-context profile"""
+    base_name = os.path.splitext(os.path.basename(key))[0]
+    return os.path.join(renders_dir or get_config().renders_dir, profile.name, base_name + profile.extension)
+
+def render_pdf_pages(pdf_path: str, output_dir: str = "data/images", base_name: Optional[str] = None,
+                     profiles: Optional[Dict[str, RenderProfile]] = None,
+                     renders_dir: Optional[str] = None) -> List[Dict]:
+    """
+    Render every page of a PDF for all profiles
+
+    The context image is the document key, stored as `{base_name}_page_{n}` (or
+    `{n}` without a base name) in `output_dir`; the other profiles are written to
+    `{renders_dir}/{profile}/` under the same name.
+
+    Args:
+        pdf_path: Path to the PDF file
+        output_dir: Directory for the context images
+        base_name: Prefix of the page file names
+        profiles: Render profiles. Defaults to `get_render_profiles()`.
+        renders_dir: Directory for derived images. Defaults to `SnowflakeConfig.renders_dir`.
+
+    Returns:
+        List[Dict]: Documents with `key`, `width`, `height` and a `renders` path per derived profile
+    """
+    profiles = profiles or get_render_profiles()
+    context = profiles["context"]
+    os.makedirs(output_dir, exist_ok=True)
+    for profile in profiles.values():
+        if profile.name != "context":
+            os.makedirs(os.path.dirname(derived_image_path("x", profile, renders_dir)), exist_ok=True)
+
+    import pymupdf
+    docs = []
+    with pymupdf.Document(pdf_path) as pdf:
+        for n, page in enumerate(pdf):
+            stem = f"{base_name}_page_{n + 1}" if base_name else f"{n + 1}"
+            key = os.path.join(output_dir, stem + context.extension)
+            images = render_page_profiles(page, list(profiles.values()))
+
+            renders = {}
+            for name, image in images.items():
+                path = key if name == "context" else derived_image_path(key, profiles[name], renders_dir)
+                save_page_image(image, path, profiles[name])
+                if name != "context":
+                    renders[name] = path
+
+            docs.append({
+                "key": key,
+                "width": images["context"].width,
+                "height": images["context"].height,
+                "renders": renders,
+            })
+    return docs
+
+def create_page_records(pdf_path: str, zoom: float = 3.0) -> List[Dict]:
+    """
+    Create a record for every page of a PDF without rendering it
+
+    Args:
+        pdf_path: Path to the PDF file
+        zoom: Zoom the pages will be rendered at for the LLM, used for the reported size
+
+    Returns:
+        List[Dict]: Documents with `key`, `width` and `height`
+    """
+    import pymupdf
+    with pymupdf.Document(pdf_path) as pdf:
+        return [
+            {
+                "key": make_page_key(pdf_path, n + 1),
+                "width": int(page.rect.width * zoom),
+                "height": int(page.rect.height * zoom),
+            }
+            for n, page in enumerate(pdf)
+        ]
+
+class PageRenderCache:
+    """
+    Size-bounded on-disk LRU cache of rendered PDF pages
+
+    Entries are keyed by the PDF's path, size and modification time together with
+    the page number and render profile, so a changed PDF never serves stale pages.
+
+    Args:
+        cache_dir: Directory for rendered pages
+        max_bytes: Total size of cached pages above which the least recently used are deleted
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Optional["OrderedDict[str, int]"] = None  # path -> size, least recent first
+        self._total_bytes = 0
+
+    def _load_entries(self) -> None:
+        """Index the pages already on disk, oldest modification time first"""
+        if self._entries is not None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        with os.scandir(self.cache_dir) as iterator:
+            for entry in iterator:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.path, stat.st_size))
+        self._entries = OrderedDict((path, size) for _, path, size in sorted(files))
+        self._total_bytes = sum(self._entries.values())
+
+    def entry_path(self, pdf_path: str, page_number: int, profile: RenderProfile) -> str:
+        stat = os.stat(pdf_path)
+        identity = f"{os.path.abspath(pdf_path)}|{stat.st_size}|{stat.st_mtime_ns}|{page_number}|{tuple(profile)[1:]}"
+        return os.path.join(self.cache_dir, hashlib.md5(identity.encode("utf-8")).hexdigest() + profile.extension)
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def render(self, pdf_path: str, page_number: int, profile: RenderProfile) -> str:
+        """
+        Get the path of a rendered page, rendering it if it is not cached
+
+        Args:
+            pdf_path: Path to the PDF file
+            page_number: Page number, starting at 1
+            profile: Render profile (zoom 1.0 = 72 dpi)
+
+        Returns:
+            str: Path to the image file
+        """
+        path = self.entry_path(pdf_path, page_number, profile)
+        with self._lock:
+            self._load_entries()
+            if path in self._entries and os.path.exists(path):
+                self._entries.move_to_end(path)
+                os.utime(path)  # keeps the LRU order across processes and restarts
+                return path
+
+        import pymupdf
+        with pymupdf.Document(pdf_path) as pdf:
+            image = render_page_profiles(pdf[page_number - 1], [profile])[profile.name]
+        save_page_image(image, path, profile)
+
+        with self._lock:
+            size = os.path.getsize(path)
+            self._total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict()
+        return path
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._load_entries()
+            return self._total_bytes
+
+_default_cache: Optional[PageRenderCache] = None
+
+def get_page_cache() -> PageRenderCache:
+    """Get the process-wide page cache configured by `page_cache_dir` and `page_cache_max_mb`"""
+    global _default_cache
+    if _default_cache is None:
+        config = get_config()
+        _default_cache = PageRenderCache(config.page_cache_dir, int(config.page_cache_max_mb * 1024 * 1024))
+    return _default_cache
+
+def resolve_image_path(key: str, profile: str = "context") -> str:
+    """
+    Get a local image file for a document key and render profile
+
+    Page keys are rendered through the page cache. Other keys are already files; for
+    non-context profiles the image derived at ingest is used when it exists.
+
+    Args:
+        key: Document key
+        profile: Render profile name (`context`, `embedding` or `thumbnail`)
+
+    Returns:
+        str: Path to an image file
+    """
+    render_profile = get_render_profiles()[profile]
+    page = parse_page_key(key)
+    if page is None:
+        if profile != "context":
+            derived = derived_image_path(key, render_profile)
+            if os.path.exists(derived):
+                return derived
+        return key
+    pdf_path, page_number = page
+    return get_page_cache().render(pdf_path, page_number, render_profile)
@@ -8,16 +8,17 @@ and integrate them into your Snowflake multimodal agents system.
 
 import os
 import json
-import pymupdf
-import requests
-from tqdm import tqdm
 from PIL import Image
-import snowflake.connector
-from snowflake.connector import DictCursor
 from dotenv import load_dotenv
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from docx import Document
+from docx_extraction import get_docx_text
+from snowflake_config import get_config
+from snowflake_utils import collapse_near_duplicates, ensure_content_hash_column, upsert_documents
+from ingestion_pipeline import IngestionPipeline
+from file_scanner import DEFAULT_EXTENSION_KINDS, scan_files
+from pdf_pages import create_page_records, render_pdf_pages
+from profiling import get_profiler
+from retrieval import get_retriever
+from embedding_codec import parse_embedding_from_string
 
 # Load environment variables
 load_dotenv()
@@ -35,6 +36,8 @@ def setup_snowflake_connection():
     if SNOWFLAKE_ACCOUNT and SNOWFLAKE_ACCOUNT.endswith('.snowflakecomputing.com'):
         SNOWFLAKE_ACCOUNT = SNOWFLAKE_ACCOUNT.replace('.snowflakecomputing.com', '')
     
+    # Imported here: the connector is slow to import and only needed to connect
+    import snowflake.connector
     conn = snowflake.connector.connect(
         account=SNOWFLAKE_ACCOUNT,
         user=SNOWFLAKE_USER,
@@ -45,50 +48,20 @@ def setup_snowflake_connection():
     )
     return conn
 
-def format_embedding_for_snowflake(embedding):
-    """Format embedding to avoid scientific notation issues"""
-    formatted_values = []
-    for val in embedding:
-        if abs(val) < 1e-10:
-            formatted_val = f"{val:.15g}"
-        else:
-            formatted_val = f"{val:.15f}".rstrip('0').rstrip('.')
-        formatted_values.append(formatted_val)
-    return ','.join(formatted_values)
-
-def process_pdf_file(pdf_path, output_dir="data/images"):
-    """Process a PDF file and extract images"""
+def process_pdf_file(pdf_path, output_dir="data/images", lazy=None):
+    """Process a PDF file and extract images, or only page records if lazy rendering is enabled"""
     print(f"Processing PDF: {pdf_path}")
     
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Open PDF
-    pdf = pymupdf.Document(pdf_path)
-    print(f"PDF loaded with {pdf.page_count} pages")
+    config = get_config()
+    if config.lazy_pdf_rendering if lazy is None else lazy:
+        # Pages are rendered on demand when they are embedded or retrieved
+        docs = create_page_records(pdf_path, config.pdf_zoom)
+        print(f"Recorded {len(docs)} pages from {pdf_path} for on-demand rendering")
+        return docs
     
-    docs = []
-    zoom = 3.0
-    mat = pymupdf.Matrix(zoom, zoom)
-    
-    # Get base filename for naming
+    # Render each page once and derive the context, embedding and thumbnail images
     base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    
-    # Process each page
-    for n in tqdm(range(pdf.page_count)):
-        temp = {}
-        # Render the PDF page as a matrix of pixels
-        pix = pdf[n].get_pixmap(matrix=mat)
-        
-        # Store image locally
-        key = f"{output_dir}/{base_name}_page_{n+1}.png"
-        pix.save(key)
-        
-        # Extract image metadata
-        temp["key"] = key
-        temp["width"] = pix.width
-        temp["height"] = pix.height
-        docs.append(temp)
+    docs = render_pdf_pages(pdf_path, output_dir, base_name)
     
     print(f"Processed {len(docs)} pages from {pdf_path}")
     return docs
@@ -123,20 +96,8 @@ def process_text_file(text_path):
     try:
         # Check if it's a DOCX file
         if text_path.lower().endswith('.docx'):
-            # Process DOCX file
-            doc = Document(text_path)
-            content = ""
-            
-            # Extract text from paragraphs
-            for paragraph in doc.paragraphs:
-                content += paragraph.text + "\n"
-            
-            # Extract text from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        content += cell.text + " "
-                    content += "\n"
+            # Process DOCX file (cached by content hash, shared with the agent and analysis scripts)
+            content = get_docx_text(text_path)
             
             print(f"Extracted {len(content)} characters from DOCX file")
             
@@ -189,7 +150,7 @@ def process_text_file(text_path):
         return []
 
 def load_embeddings_to_snowflake(conn, documents, embeddings_data=None):
-    """Load documents and embeddings to Snowflake"""
+    """Load documents and embeddings to Snowflake, inserting new and updating changed documents"""
     cursor = conn.cursor()
     
     # If no embeddings provided, use demo embeddings
@@ -199,76 +160,115 @@ def load_embeddings_to_snowflake(conn, documents, embeddings_data=None):
         cursor.execute("SELECT EMBEDDING FROM multimodal_documents LIMIT 1")
         result = cursor.fetchone()
         if result:
-            demo_embedding = [float(x) for x in result[0].split(',')]
+            demo_embedding = parse_embedding_from_string(result[0])
         else:
             # Create a dummy embedding if no data exists
             demo_embedding = [0.1] * 1024
+    cursor.close()
     
-    for i, doc in enumerate(tqdm(documents)):
-        # Use provided embedding or demo embedding
-        if embeddings_data and i < len(embeddings_data):
-            embedding = embeddings_data[i]
-        else:
-            embedding = demo_embedding
-        
-        # Format embedding for Snowflake
-        embedding_str = format_embedding_for_snowflake(embedding)
-        
-        # Insert document
-        insert_query = """
-        INSERT INTO multimodal_documents (key, width, height, embedding)
-        VALUES (%s, %s, %s, %s)
-        """
-        
-        cursor.execute(insert_query, (
-            doc['key'],
-            doc.get('width', 0),
-            doc.get('height', 0),
-            embedding_str
-        ))
+    # Attach provided embeddings, then skip duplicate files and near-identical embeddings
+    documents = [
+        dict(doc, embedding=embeddings_data[i]) if embeddings_data and i < len(embeddings_data) else doc
+        for i, doc in enumerate(documents)
+    ]
+    documents, duplicates = collapse_near_duplicates(documents)
+    for duplicate_key, kept_key in duplicates.items():
+        print(f"Skipping {duplicate_key}: duplicate of {kept_key}")
     
-    cursor.close()
-    conn.commit()
-    print(f"Loaded {len(documents)} documents to Snowflake")
+    # Use provided embedding or demo embedding
+    documents = [doc if 'embedding' in doc else dict(doc, embedding=demo_embedding) for doc in documents]
+    
+    # Upsert by key so re-processing the same files does not create duplicate rows
+    retriever = get_retriever(conn, mode=get_config().search_mode)
+    ensure_content_hash_column(conn)
+    retriever.prepare()
+    counts = upsert_documents(conn, documents, clear_vectors=retriever.stores_vectors)
+    print(f"Loaded {len(documents)} documents to Snowflake: {counts['inserted']} inserted, "
+          f"{counts['updated']} updated, {counts['unchanged']} unchanged")
+    if counts['inserted'] or counts['updated']:
+        retriever.documents_changed()
+    return counts
 
-def process_directory(directory_path, file_type="auto"):
-    """Process all files in a directory"""
+# Dispatch table from the scanner's file kind to the function extracting its documents
+FILE_HANDLERS = {
+    "pdf": process_pdf_file,
+    "image": process_image_file,
+    "text": process_text_file,
+}
+
+def process_directory(directory_path, file_type="auto", include=None, exclude=None):
+    """Process all files under a directory, optionally only those of one type ("pdf", "image" or "text")"""
     if not os.path.exists(directory_path):
         print(f"Directory not found: {directory_path}")
         return []
     
     all_docs = []
-    
-    for filename in os.listdir(directory_path):
-        file_path = os.path.join(directory_path, filename)
-        
-        if os.path.isfile(file_path):
-            if file_type == "auto":
-                # Auto-detect file type
-                if filename.lower().endswith('.pdf'):
-                    docs = process_pdf_file(file_path)
-                elif filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                    docs = process_image_file(file_path)
-                elif filename.lower().endswith(('.txt', '.md', '.csv', '.docx', '.json')):
-                    docs = process_text_file(file_path)
-                else:
-                    print(f"Skipping unsupported file: {filename}")
-                    continue
-            else:
-                # Process based on specified type
-                if file_type == "pdf" and filename.lower().endswith('.pdf'):
-                    docs = process_pdf_file(file_path)
-                elif file_type == "image" and filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                    docs = process_image_file(file_path)
-                elif file_type == "text" and filename.lower().endswith(('.txt', '.md', '.csv', '.docx', '.json')):
-                    docs = process_text_file(file_path)
-                else:
-                    continue
-            
-            all_docs.extend(docs)
+    for record in scan_files([directory_path], include=include, exclude=exclude):
+        if file_type == "auto" or record.kind == file_type:
+            all_docs.extend(FILE_HANDLERS[record.kind](record.path))
     
     return all_docs
 
+def extract_file(file_path):
+    """Extract documents from a single file based on its extension (runs in a worker process)"""
+    kind = DEFAULT_EXTENSION_KINDS.get(os.path.splitext(file_path)[1].lower())
+    return FILE_HANDLERS[kind](file_path) if kind else []
+
+def get_demo_embedding(conn):
+    """Use the first stored embedding as a placeholder embedding for new documents"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT EMBEDDING FROM multimodal_documents LIMIT 1")
+    result = cursor.fetchone()
+    cursor.close()
+    return parse_embedding_from_string(result[0]) if result else [0.1] * 1024
+
+def ingest_directories(conn, directories, embed=None, config=None, include=None, exclude=None):
+    """
+    Ingest every file in the given directories through the staged pipeline
+
+    Files are extracted in a process pool while earlier documents are embedded
+    and written to Snowflake in batches.
+
+    Args:
+        conn: Snowflake connection object
+        directories: Directories to ingest
+        embed: Function returning one embedding per document in a batch. Defaults to the demo embedding.
+        config: Configuration. Defaults to the global configuration.
+        include: Globs a file's path relative to its directory must match
+        exclude: Globs for files or directories to skip
+
+    Returns:
+        tuple: (upsert counts, per-stage StageStats)
+    """
+    config = config or get_config()
+    if embed is None:
+        demo_embedding = get_demo_embedding(conn)
+        embed = lambda batch: [doc.get('embedding', demo_embedding) for doc in batch]
+
+    retriever = get_retriever(conn, config, mode=config.search_mode)
+    ensure_content_hash_column(conn)
+    retriever.prepare()
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+
+    def write(batch):
+        batch_counts = upsert_documents(conn, batch, batch_size=config.write_batch_size,
+                                        clear_vectors=retriever.stores_vectors)
+        for name, value in batch_counts.items():
+            counts[name] += value
+
+    paths = (record.path for record in scan_files(directories, include=include, exclude=exclude))
+    pipeline = IngestionPipeline(
+        extract_file, embed, write,
+        workers=config.ingest_workers,
+        queue_size=config.ingest_queue_size,
+        embed_batch_size=config.embed_batch_size,
+        write_batch_size=config.write_batch_size,
+    )
+    stats = pipeline.run(paths)
+    if counts['inserted'] or counts['updated']:
+        retriever.documents_changed()
+    return counts, stats
+
 def main():
     """Main processing function"""
     print("🚀 Multimodal Data Processing Tool")
@@ -282,39 +282,22 @@ def main():
         print(f"❌ Failed to connect to Snowflake: {e}")
         return
     
-    # Process different types of files
-    all_documents = []
-    
-    # Process PDFs
-    pdf_dir = "data/pdfs"
-    if os.path.exists(pdf_dir):
-        print(f"\n📄 Processing PDFs in {pdf_dir}")
-        pdf_docs = process_directory(pdf_dir, "pdf")
-        all_documents.extend(pdf_docs)
-    
-    # Process Images
-    image_dir = "data/images"
-    if os.path.exists(image_dir):
-        print(f"\n🖼️ Processing Images in {image_dir}")
-        image_docs = process_directory(image_dir, "image")
-        all_documents.extend(image_docs)
-        
-        # Also process JSON files in images directory
-        print(f"\n📄 Processing JSON files in {image_dir}")
-        json_docs = process_directory(image_dir, "text")
-        all_documents.extend(json_docs)
-    
-    # Process Text files
-    text_dir = "data/text"
-    if os.path.exists(text_dir):
-        print(f"\n📝 Processing Text files in {text_dir}")
-        text_docs = process_directory(text_dir, "text")
-        all_documents.extend(text_docs)
+    # Extraction, embedding and loading overlap instead of running one after the other
+    directories = ["data/pdfs", "data/images", "data/text"]
+    print(f"\n📂 Processing {', '.join(d for d in directories if os.path.exists(d))}")
+    config = get_config()
+    with get_profiler().profile("ingest") as profile_path:
+        counts, stats = ingest_directories(conn, directories, config=config,
+                                           include=config.ingest_include, exclude=config.ingest_exclude)
+    if profile_path:
+        print(f"⏱️ Profile written to {profile_path}")
     
-    if all_documents:
-        print(f"\n💾 Loading {len(all_documents)} documents to Snowflake...")
-        load_embeddings_to_snowflake(conn, all_documents)
-        print("✅ All documents processed and loaded to Snowflake!")
+    for stage in stats.values():
+        print(f"   {stage.name:<8} {stage.items:>6} items  {stage.items_per_second:>8.1f}/s  "
+              f"busy {stage.busy_seconds:.1f}s")
+    if counts['inserted'] or counts['updated'] or counts['unchanged']:
+        print(f"✅ Loaded to Snowflake: {counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged")
     else:
         print("ℹ️ No documents found to process")
     
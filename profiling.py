@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Opt-in CPU profiling of agent turns and ingestion runs
+
+Tracing shows which stage of a request is slow; this module shows which Python
+functions the CPU time goes to. Entry points wrap their work in a profile:
+
+    with get_profiler().profile("execute_agent", request_id) as path:
+        ...
+
+With PROFILE_MODE=cprofile every PROFILE_EVERY-th request of an entry point is
+run under cProfile and its stats are dumped to `{PROFILE_DIR}/{name}/{request_id}.prof`
+(open with `python -m pstats` or snakeviz). With PROFILE_MODE=sampling a
+background thread samples the request thread's stack every PROFILE_INTERVAL_MS
+and writes collapsed stacks (`frame;frame;frame count`, one line per stack) to
+`{request_id}.collapsed`, the input format of flamegraph.pl and speedscope. The
+sampler only adds a stack walk per interval, so it can stay on under real traffic.
+
+Only the thread that entered the profile is profiled: worker threads and the
+ingestion pipeline's extraction processes are not included.
+
+Usage:
+    python profiling.py data/profiles/execute_agent/<request_id>.collapsed
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from snowflake_config import get_config
+
+PROFILE_MODES = ("off", "cprofile", "sampling")
+# Request IDs become file names, so they may not contain path separators or dots
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+def _check_request_id(request_id: str) -> None:
+    if not REQUEST_ID_PATTERN.fullmatch(request_id):
+        raise ValueError(f"Invalid request ID: {request_id!r}. Use letters, digits, '_' and '-' only")
+
+def frame_label(frame) -> str:
+    """Function-level label of a stack frame, e.g. `search_many (retrieval.py:12)`"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack at a fixed interval and counts the collapsed stacks
+
+    Args:
+        interval_seconds: Time between samples
+        thread_id: Thread to sample. Defaults to the thread calling `start`.
+    """
+
+    def __init__(self, interval_seconds: float = 0.005, thread_id: Optional[int] = None):
+        self.interval_seconds = interval_seconds
+        self.thread_id = thread_id
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self) -> List[str]:
+        """Collapsed stacks, root frame first, most frequent first"""
+        return [f"{stack} {count}" for stack, count in self.counts.most_common()]
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.writelines(line + "\n" for line in self.collapsed())
+
+class Profiler:
+    """
+    Profiles selected requests of each entry point
+
+    Args:
+        mode: `off`, `cprofile` or `sampling`
+        every: Profile every Nth request of an entry point (1 profiles all of them)
+        output_dir: Directory for the profiles, one subdirectory per entry point
+        interval_seconds: Sampling interval in `sampling` mode
+    """
+
+    def __init__(self, mode: str = "off", every: int = 1, output_dir: str = "data/profiles",
+                 interval_seconds: float = 0.005):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}. Use one of {', '.join(PROFILE_MODES)}")
+        self.mode = mode
+        self.every = max(1, every)
+        self.output_dir = output_dir
+        self.interval_seconds = interval_seconds
+        self._requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _selected(self, name: str) -> bool:
+        with self._lock:
+            seen = self._requests.get(name, 0)
+            self._requests[name] = seen + 1
+        return seen % self.every == 0
+
+    def profile_path(self, name: str, request_id: str) -> str:
+        _check_request_id(request_id)
+        extension = ".prof" if self.mode == "cprofile" else ".collapsed"
+        return os.path.join(self.output_dir, name, f"{request_id}{extension}")
+
+    @contextmanager
+    def profile(self, name: str, request_id: Optional[str] = None) -> Iterator[Optional[str]]:
+        """
+        Profile the enclosed block if this request is selected
+
+        Args:
+            name: Entry point, e.g. `execute_agent` or `ingest`
+            request_id: Request ID used as the file name (letters, digits, `_` and `-`).
+                Defaults to a new random ID.
+
+        Yields:
+            str: Path the profile is written to when the block ends (None if not profiled)
+
+        Raises:
+            ValueError: If `request_id` could escape the profile directory
+        """
+        if request_id is not None:
+            # Checked for every request, not only the profiled ones, so a bad ID fails consistently
+            _check_request_id(request_id)
+        if self.mode == "off" or not self._selected(name):
+            yield None
+            return
+
+        path = self.profile_path(name, request_id or uuid.uuid4().hex[:16])
+        if self.mode == "sampling":
+            sampler = SamplingProfiler(self.interval_seconds)
+            sampler.start()
+            try:
+                yield path
+            finally:
+                sampler.stop()
+                sampler.write(path)
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler is already active in this thread
+            print(f"Warning: Not profiling {name}: {e}")
+            yield None
+            return
+        try:
+            yield path
+        finally:
+            profile.disable()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profile.dump_stats(path)
+
+def top_frames(path: str, limit: int = 15) -> List[Tuple[str, float, float]]:
+    """
+    Hottest functions of a profile written by Profiler
+
+    Args:
+        path: `.prof` (cProfile) or `.collapsed` (sampling) file
+        limit: Number of functions
+
+    Returns:
+        List[Tuple[str, float, float]]: (function, self, total) ordered by self time; seconds
+            for cProfile, fractions of the samples for sampling profiles
+    """
+    if path.endswith(".prof"):
+        stats = pstats.Stats(path).stats
+        rows = [(f"{function} ({os.path.basename(filename)}:{line})", tottime, cumtime)
+                for (filename, line, function), (_, _, tottime, cumtime, _) in stats.items()]
+    else:
+        self_samples: Counter = Counter()
+        total_samples: Counter = Counter()
+        samples = 0
+        with open(path, "r") as f:
+            for line in f:
+                stack, count = line.rstrip("\n").rsplit(" ", 1)
+                frames = stack.split(";")
+                samples += int(count)
+                self_samples[frames[-1]] += int(count)
+                for frame in set(frames):
+                    total_samples[frame] += int(count)
+        rows = [(frame, self_samples[frame] / samples, total / samples) for frame, total in total_samples.items()]
+    rows.sort(key=lambda row: -row[1])
+    return rows[:limit]
+
+_default_profiler: Optional[Profiler] = None
+
+def get_profiler() -> Profiler:
+    """Get the process-wide profiler configured by `profile_mode`, `profile_every`, `profile_dir` and `profile_interval_ms`"""
+    global _default_profiler
+    if _default_profiler is None:
+        config = get_config()
+        _default_profiler = Profiler(config.profile_mode, config.profile_every, config.profile_dir,
+                                     config.profile_interval_ms / 1000)
+    return _default_profiler
+
+def main():
+    """Print the hottest functions of a profile"""
+    parser = argparse.ArgumentParser(description="Show the hottest functions of a .prof or .collapsed profile")
+    parser.add_argument("path")
+    parser.add_argument("--limit", type=int, default=15)
+    args = parser.parse_args()
+
+    sampled = not args.path.endswith(".prof")
+    print(f"{'self':>8} {'total':>8}  function")
+    for function, self_time, total in top_frames(args.path, args.limit):
+        if sampled:
+            print(f"{self_time:>8.1%} {total:>8.1%}  {function}")
+        else:
+            print(f"{self_time:>7.3f}s {total:>7.3f}s  {function}")
+
+if __name__ == "__main__":
+    main()
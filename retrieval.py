@@ -0,0 +1,297 @@
+"""
+Retrieval strategies for Snowflake Multimodal Agents Lab
+
+The solution scripts each hard-code one way of searching the documents table
+(VECTOR cast in SQL, VARIANT, or parsing every STRING embedding in Python), so the
+script that happens to be imported decides how search scales. This module puts
+the strategies behind one interface, selected with SEARCH_MODE:
+
+    client        The table is parsed once per connection into an in-memory
+                  VectorIndex; every query is one matrix product. Fastest exact
+                  engine in benchmark_retrieval.py, and the default.
+    server        A typed VECTOR column is scored inside Snowflake and only the
+                  top-k keys are fetched. For tables too large to keep in memory.
+    multi_vector  Late interaction over the page tiles written by
+                  generate_tile_embeddings.py. MULTI_VECTOR_SEARCH=true selects it
+                  when the tile file exists.
+
+A strategy also owns its ingest-time work (e.g. materializing the VECTOR column),
+so loading and searching always agree. Further strategies can be plugged in with
+`register_retriever`.
+"""
+
+import inspect
+import json
+import os
+import time
+import weakref
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Type
+
+from embedding_codec import parse_embedding_from_string, parse_embeddings
+from metrics import get_metrics
+from server_search import ensure_search_columns, materialize_search_columns, search_top_k
+from snowflake_config import SnowflakeConfig, get_config
+from snowflake_utils import dict_cursor
+from tracing import get_tracer
+from vector_index import MultiVectorIndex, VectorIndex
+
+# Vector indexes built from the multimodal_documents table, cached per connection and
+# dropped with it (an id() key could be reused by a later connection)
+_vector_indexes = weakref.WeakKeyDictionary()
+
+def get_vector_index(conn, refresh: bool = False, dimensions: Optional[int] = None) -> VectorIndex:
+    """
+    Get the in-memory vector index for the documents stored in Snowflake
+
+    The table is read and parsed once per connection; pass refresh=True (or call
+    load_embeddings_to_snowflake) to pick up new documents.
+
+    Args:
+        conn: Snowflake connection object
+        refresh: Rebuild the index even if one is cached
+        dimensions: Embedding dimensions. Defaults to `SnowflakeConfig.embedding_dimensions`.
+
+    Returns:
+        VectorIndex: Index over all documents in multimodal_documents
+    """
+    metrics = get_metrics()
+    cached = not refresh and conn in _vector_indexes
+    metrics.counter("index_cache_requests_total", "Vector index lookups by result",
+                    result="hit" if cached else "miss").inc()
+    if not cached:
+        with get_tracer().span("sql.load_index", kind="sql") as span:
+            cursor = dict_cursor(conn)
+            cursor.execute("SELECT KEY, WIDTH, HEIGHT, EMBEDDING FROM multimodal_documents")
+            results = cursor.fetchall()
+            cursor.close()
+            if span:
+                span.set_attribute("rows", len(results))
+
+        # Parse every stored embedding with one bulk conversion
+        embeddings = parse_embeddings(result['EMBEDDING'] for result in results)
+        _vector_indexes[conn] = VectorIndex.from_documents(
+            (
+                {
+                    'key': result['KEY'],
+                    'width': result['WIDTH'],
+                    'height': result['HEIGHT'],
+                    'embedding': embedding
+                }
+                for result, embedding in zip(results, embeddings)
+            ),
+            dimensions=dimensions or get_config().embedding_dimensions,
+        )
+        metrics.counter("db_rows_read_total", "Rows fetched from Snowflake", table="multimodal_documents").inc(len(results))
+        metrics.gauge("index_documents", "Documents in the in-memory vector index").set(len(results))
+    return _vector_indexes[conn]
+
+# Multi-vector indexes built from tile embedding files, cached per file path
+_multi_vector_indexes = {}
+
+def get_multi_vector_index(tile_embeddings_file: str) -> MultiVectorIndex:
+    """
+    Get the late-interaction index for pre-generated tile embeddings
+
+    Args:
+        tile_embeddings_file: JSON file written by generate_tile_embeddings.py
+
+    Returns:
+        MultiVectorIndex: Index with one vector per page tile
+    """
+    if tile_embeddings_file not in _multi_vector_indexes:
+        with open(tile_embeddings_file, "r") as data_file:
+            tile_data = json.load(data_file)
+        config = get_config()
+        _multi_vector_indexes[tile_embeddings_file] = MultiVectorIndex.from_documents(
+            tile_data,
+            dimensions=config.embedding_dimensions,
+            max_vectors_per_page=config.max_vectors_per_page,
+        )
+    return _multi_vector_indexes[tile_embeddings_file]
+
+class Retriever(ABC):
+    """
+    A retrieval strategy over the multimodal_documents table
+
+    Subclasses implement `demo_embedding` and `search`.
+
+    Args:
+        conn: Snowflake connection object
+        config: Configuration. Defaults to the global configuration.
+    """
+    name = "retriever"
+    # Keeps a typed vector column that must be re-cast when a stored embedding changes
+    stores_vectors = False
+
+    def __init__(self, conn, config: Optional[SnowflakeConfig] = None):
+        self.conn = conn
+        self.config = config or get_config()
+
+    def prepare(self) -> None:
+        """Add whatever the strategy needs to the table before documents are loaded"""
+
+    def documents_changed(self) -> None:
+        """Bring the strategy's derived data up to date after documents were written"""
+
+    @abstractmethod
+    def demo_embedding(self) -> List[float]:
+        """An embedding of a stored document, used as the query when no endpoint is configured"""
+
+    @abstractmethod
+    def search(self, query_embeddings: Sequence[Sequence[float]], k: int, threshold: float,
+               filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        Find the best documents for each query embedding
+
+        Strategies record `search_queries_total`, `search_seconds` and, where the
+        number of candidates is known, `search_rows_scanned` with `record_search`.
+
+        Args:
+            query_embeddings: One embedding per query
+            k: Maximum number of results per query
+            threshold: Minimum similarity score
+            filters: Metadata filters (`document_type`, `source_file`, `modality`)
+
+        Returns:
+            List[List[Dict]]: For each query, results with `key` and `similarity_score`, best first
+        """
+
+    def record_search(self, results: List[List[Dict]], seconds: float, rows_scanned: Optional[int] = None) -> None:
+        """Count a batch of searches in the metrics registry"""
+        metrics = get_metrics()
+        metrics.counter("search_queries_total", "Queries searched", strategy=self.name).inc(len(results))
+        metrics.histogram("search_seconds", "Time to score a batch of queries", strategy=self.name).observe(seconds)
+        returned = metrics.histogram("search_results", "Results returned per query", strategy=self.name)
+        scanned = metrics.histogram("search_rows_scanned", "Rows scored per query", strategy=self.name)
+        for query_results in results:
+            returned.observe(len(query_results))
+            if rows_scanned is not None:
+                scanned.observe(rows_scanned)
+
+class ClientRetriever(Retriever):
+    """Scores an in-memory VectorIndex of the table, with optional MMR re-ranking"""
+    name = "client"
+
+    @property
+    def index(self) -> VectorIndex:
+        return get_vector_index(self.conn, dimensions=self.config.embedding_dimensions)
+
+    def documents_changed(self) -> None:
+        _vector_indexes.pop(self.conn, None)
+
+    def demo_embedding(self) -> List[float]:
+        index = self.index
+        if len(index) == 0:
+            raise ValueError("No documents found in database")
+        return index.embedding(0)
+
+    def search(self, query_embeddings, k, threshold, filters=None):
+        index = self.index
+        start = time.perf_counter()
+        # With MMR_LAMBDA set, near-duplicate pages do not take more than one of the k slots
+        with get_tracer().span("search.score", kind="search", queries=len(query_embeddings), documents=len(index)):
+            results = index.search_many(query_embeddings, k=k, threshold=threshold, filters=filters,
+                                        mmr_lambda=self.config.mmr_lambda,
+                                        candidate_pool=self.config.mmr_candidates)
+        self.record_search(results, time.perf_counter() - start, rows_scanned=len(index))
+        return results
+
+class ServerRetriever(Retriever):
+    """Scores the typed VECTOR column inside Snowflake and fetches only the top k"""
+    name = "server"
+    stores_vectors = True
+    # Vector cast expression; None uses server_search.SNOWFLAKE_VECTOR_CAST
+    vector_cast: Optional[str] = None
+
+    def prepare(self) -> None:
+        ensure_search_columns(self.conn, self.config.embedding_dimensions)
+
+    def documents_changed(self) -> None:
+        # Cast the stored strings to the typed vector column once, at ingest
+        materialize_search_columns(self.conn, self.config.embedding_dimensions, vector_cast=self.vector_cast)
+        self.conn.commit()
+
+    def demo_embedding(self) -> List[float]:
+        with get_tracer().span("sql.demo_embedding", kind="sql"):
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT embedding FROM multimodal_documents LIMIT 1")
+            result = cursor.fetchone()
+            cursor.close()
+        if not result:
+            raise ValueError("No documents found in database")
+        return parse_embedding_from_string(result[0])
+
+    def search(self, query_embeddings, k, threshold, filters=None):
+        start = time.perf_counter()
+        with get_tracer().span("sql.search_top_k", kind="sql", queries=len(query_embeddings), k=k):
+            results = search_top_k(self.conn, query_embeddings, k=k, threshold=threshold, filters=filters,
+                                   dimensions=self.config.embedding_dimensions, vector_cast=self.vector_cast)
+        # Rows are scanned inside Snowflake; only the top k per query are fetched
+        self.record_search(results, time.perf_counter() - start)
+        get_metrics().counter("db_rows_read_total", "Rows fetched from Snowflake",
+                              table="multimodal_documents").inc(sum(len(r) for r in results))
+        return results
+
+class MultiVectorRetriever(ClientRetriever):
+    """Scores pages by their best matching tiles (MaxSim over the tile embeddings file)"""
+    name = "multi_vector"
+
+    def search(self, query_embeddings, k, threshold, filters=None):
+        tile_index = get_multi_vector_index(self.config.tile_embeddings_file)
+        start = time.perf_counter()
+        with get_tracer().span("search.multi_vector", kind="search", queries=len(query_embeddings)):
+            results = [
+                tile_index.search(query_embedding, k=k, threshold=threshold, filters=filters)
+                for query_embedding in query_embeddings
+            ]
+        self.record_search(results, time.perf_counter() - start, rows_scanned=len(tile_index))
+        return results
+
+# Retrieval strategies by SEARCH_MODE name
+RETRIEVERS: Dict[str, Type[Retriever]] = {}
+
+def register_retriever(name: str, retriever_class: Type[Retriever]) -> None:
+    """
+    Make a retrieval strategy selectable with SEARCH_MODE
+
+    Args:
+        name: Search mode name
+        retriever_class: Retriever subclass, constructed with (conn, config)
+
+    Raises:
+        TypeError: If the class leaves one of Retriever's abstract methods unimplemented
+    """
+    if inspect.isabstract(retriever_class):
+        missing = ", ".join(sorted(retriever_class.__abstractmethods__))
+        raise TypeError(f"Retriever {name!r} does not implement {missing}")
+    RETRIEVERS[name] = retriever_class
+
+register_retriever(ClientRetriever.name, ClientRetriever)
+register_retriever(ServerRetriever.name, ServerRetriever)
+register_retriever(MultiVectorRetriever.name, MultiVectorRetriever)
+
+def get_retriever(conn, config: Optional[SnowflakeConfig] = None, mode: Optional[str] = None) -> Retriever:
+    """
+    Get the configured retrieval strategy for a connection
+
+    Retrievers are cheap to create; the indexes they search are cached per
+    connection (or tile file) and shared.
+
+    Args:
+        conn: Snowflake connection object
+        config: Configuration. Defaults to the global configuration.
+        mode: Search mode. Defaults to `config.search_mode`, or `multi_vector` when
+            `config.multi_vector_search` is set and the tile embeddings file exists.
+
+    Returns:
+        Retriever: Strategy for `mode`
+    """
+    config = config or get_config()
+    if mode is None:
+        mode = config.search_mode
+        if config.multi_vector_search and os.path.exists(config.tile_embeddings_file):
+            mode = MultiVectorRetriever.name
+    if mode not in RETRIEVERS:
+        raise ValueError(f"Unknown search mode: {mode}. Use one of {', '.join(RETRIEVERS)}")
+    return RETRIEVERS[mode](conn, config)
@@ -0,0 +1,167 @@
+"""
+Server-side vector search for Snowflake Multimodal Agents Lab
+
+The working final solution reads every EMBEDDING string into Python and scores it
+locally. This module is the alternative for larger tables: a typed VECTOR column is
+materialized once at ingest, next to the derived metadata used by the search
+filters, and each query is scored inside Snowflake with `ORDER BY ... LIMIT k`, so
+only the winning keys and scores cross the network.
+
+The SQL only relies on VECTOR_COSINE_SIMILARITY and the vector cast expression,
+so it can be run against a local database with both registered as functions.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+from embedding_codec import format_embedding_for_snowflake
+from vector_index import build_document_metadata
+
+# Cast from a comma-separated embedding string to a typed vector
+SNOWFLAKE_VECTOR_CAST = "STRTOK_TO_ARRAY({value}, ',')::VECTOR(FLOAT, {dimensions})"
+
+# Metadata columns materialized at ingest and the filters that use them
+SEARCH_COLUMNS = ("document_type", "source_file", "modality")
+
+# Session-scoped table holding the derived metadata while it is applied
+SEARCH_METADATA_STAGE = "search_metadata_stage"
+
+def ensure_search_columns(conn, dimensions: int = 1024) -> None:
+    """
+    Add the typed vector and metadata columns to multimodal_documents if missing
+
+    Args:
+        conn: Snowflake connection object
+        dimensions: Embedding dimensions of the VECTOR column
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    ALTER TABLE multimodal_documents ADD COLUMN IF NOT EXISTS
+        embedding_vector VECTOR(FLOAT, {dimensions}),
+        document_type STRING,
+        source_file STRING,
+        modality STRING
+    """)
+    cursor.close()
+
+def materialize_search_columns(conn, dimensions: int = 1024, vector_cast: Optional[str] = None) -> None:
+    """
+    Fill the search columns for newly inserted or updated documents
+
+    Only rows without a vector are touched. Their metadata is derived from the key
+    (and any local sidecar file) in Python, staged in a temporary table with one
+    bulk insert and applied with a single UPDATE join; the vector column is cast
+    from the stored string in one set-based UPDATE. Neither issues a statement per row.
+
+    Args:
+        conn: Snowflake connection object
+        dimensions: Embedding dimensions of the VECTOR column
+        vector_cast: Cast expression with `{value}` and `{dimensions}` placeholders.
+            Defaults to SNOWFLAKE_VECTOR_CAST.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT key FROM multimodal_documents WHERE embedding_vector IS NULL")
+    rows = []
+    for (key,) in cursor.fetchall():
+        metadata = build_document_metadata(key)
+        rows.append((key,) + tuple(metadata.get(column) for column in SEARCH_COLUMNS))
+
+    if rows:
+        columns = ", ".join(SEARCH_COLUMNS)
+        cursor.execute(f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {SEARCH_METADATA_STAGE} (
+            key STRING, {", ".join(f"{column} STRING" for column in SEARCH_COLUMNS)}
+        )
+        """)
+        cursor.execute(f"DELETE FROM {SEARCH_METADATA_STAGE}")
+        # The connector sends an executemany INSERT as one multi-row INSERT
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_METADATA_STAGE} (key, {columns}) "
+            f"VALUES ({', '.join(['%s'] * (len(SEARCH_COLUMNS) + 1))})",
+            rows,
+        )
+        assignments = ", ".join(f"{column} = stage.{column}" for column in SEARCH_COLUMNS)
+        cursor.execute(f"""
+        UPDATE multimodal_documents SET {assignments}
+        FROM {SEARCH_METADATA_STAGE} stage
+        WHERE multimodal_documents.key = stage.key
+        """)
+        cursor.execute(f"DELETE FROM {SEARCH_METADATA_STAGE}")
+
+    cast = (vector_cast or SNOWFLAKE_VECTOR_CAST).format(value="embedding", dimensions=dimensions)
+    cursor.execute(f"UPDATE multimodal_documents SET embedding_vector = {cast} WHERE embedding_vector IS NULL")
+    cursor.close()
+
+def build_search_query(filters: Optional[Dict] = None, dimensions: int = 1024,
+                       vector_cast: Optional[str] = None) -> tuple:
+    """
+    Build the top-k query and the parameters for its filters
+
+    The query takes the embedding string, the filter values, the threshold and k as
+    parameters, in that order.
+
+    Args:
+        filters: Mapping of search column to a value or list of accepted values; None values are ignored
+        dimensions: Embedding dimensions of the VECTOR column
+        vector_cast: Cast expression with `{value}` and `{dimensions}` placeholders.
+            Defaults to SNOWFLAKE_VECTOR_CAST.
+
+    Returns:
+        tuple: (SQL string, list of filter parameters)
+    """
+    conditions = ["embedding_vector IS NOT NULL"]
+    params = []
+    for field, value in (filters or {}).items():
+        if value is None:
+            continue
+        if field not in SEARCH_COLUMNS:
+            raise ValueError(f"Unsupported server-side filter field: {field}")
+        values = [value] if isinstance(value, str) else list(value)
+        conditions.append(f"{field} IN ({', '.join(['%s'] * len(values))})")
+        params.extend(values)
+
+    query_vector = (vector_cast or SNOWFLAKE_VECTOR_CAST).format(value="%s", dimensions=dimensions)
+    sql = f"""
+    SELECT key, similarity_score
+    FROM (
+        SELECT key, VECTOR_COSINE_SIMILARITY(embedding_vector, {query_vector}) AS similarity_score
+        FROM multimodal_documents
+        WHERE {' AND '.join(conditions)}
+    ) scored
+    WHERE similarity_score >= %s
+    ORDER BY similarity_score DESC
+    LIMIT %s
+    """
+    return sql, params
+
+def search_top_k(conn, query_embeddings: Sequence[Sequence[float]], k: int = 2, threshold: float = 0.0,
+                 filters: Optional[Dict] = None, dimensions: int = 1024,
+                 vector_cast: Optional[str] = None) -> List[List[Dict]]:
+    """
+    Score documents inside the database and return only the top k per query
+
+    Args:
+        conn: Snowflake connection object
+        query_embeddings: One embedding per query
+        k: Maximum number of results per query
+        threshold: Minimum similarity score
+        filters: Mapping of search column to a value or list of accepted values
+        dimensions: Embedding dimensions of the VECTOR column
+        vector_cast: Cast expression with `{value}` and `{dimensions}` placeholders.
+            Defaults to SNOWFLAKE_VECTOR_CAST.
+
+    Returns:
+        List[List[Dict]]: For each query, results with `key` and `similarity_score`, best first
+    """
+    sql, filter_params = build_search_query(filters, dimensions, vector_cast)
+
+    cursor = conn.cursor()
+    results = []
+    for query_embedding in query_embeddings:
+        params = [format_embedding_for_snowflake(query_embedding)] + filter_params + [threshold, k]
+        cursor.execute(sql, params)
+        results.append([
+            {"key": key, "similarity_score": float(score)}
+            for key, score in cursor.fetchall()
+        ])
+    cursor.close()
+    return results
@@ -0,0 +1,368 @@
+"""
+Long-lived agent for Snowflake Multimodal Agents Lab
+
+The function-style agents in the solution scripts take the connection, client and
+model name on every call. This module keeps them on a single object together with
+a tool registry and generation configs that are built once, so a process serving
+many turns does not rebuild pydantic configs or Gemini clients per request.
+"""
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from metrics import get_metrics
+from profiling import get_profiler
+from retrieval import Retriever, get_retriever
+from snowflake_config import SnowflakeConfig, get_config
+from snowflake_solution_working_final import (
+    create_function_declaration,
+    get_information_for_question_answering,
+    load_file_for_context,
+    retrieve_session_history,
+    search_many,
+    store_chat_message,
+)
+from snowflake_utils import parse_tool_questions
+from tracing import get_tracer
+
+# google.genai is imported when a client or config is first built, so importing
+# this module stays cheap for workers that never reach the LLM
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+    from google.genai.types import FunctionCall
+
+SELECT_TOOL_PROMPT = (
+    "You're an AI assistant. Based on the given information, decide which tool to use."
+    "If the user is asking to explain an image, don't call any tools unless that would help you better explain the image."
+    "Here is the provided information:\n"
+)
+
+ANSWER_PROMPT = (
+    "Answer the questions based on the provided context only. If the context is not sufficient, say I DON'T KNOW. "
+    "DO NOT use any other information to answer the question."
+)
+
+REACT_PROMPT = (
+    "You are an AI assistant. Based on the current information, decide if you have enough to answer the user query, or if you need more information."
+    "If you have enough information, respond with 'ANSWER: <your answer>'."
+    "If you need more information, respond with 'TOOL: <question for the tool>'. Keep the question concise."
+    "If you need several independent pieces of information, put each 'TOOL: <question>' on its own line."
+    "User query: {user_query}\n"
+    "Current information:\n"
+)
+
+@lru_cache(maxsize=None)
+def get_gemini_client(api_key: str) -> "genai.Client":
+    """
+    Get a shared Gemini client for an API key
+
+    Args:
+        api_key (str): Google API key
+
+    Returns:
+        genai.Client: Client reused by every agent in this process
+    """
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+class ToolRegistry:
+    """Dispatch table of tools the agent can call, keyed by tool name"""
+
+    def __init__(self):
+        self._declarations: Dict[str, dict] = {}
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._batch_handlers: Dict[str, Callable[..., List[Any]]] = {}
+
+    def register(self, declaration: dict, handler: Callable[..., Any],
+                 batch_handler: Optional[Callable[..., List[Any]]] = None) -> None:
+        """
+        Register a tool
+
+        Args:
+            declaration (dict): Gemini function declaration; its `name` is the dispatch key
+            handler (Callable): Called with the agent's context and the LLM-provided arguments
+            batch_handler (Callable): Optional. Called with the agent's context and `queries`
+                to answer several queries at once, returning one result per query
+        """
+        name = declaration["name"]
+        self._declarations[name] = declaration
+        self._handlers[name] = handler
+        if batch_handler is not None:
+            self._batch_handlers[name] = batch_handler
+        else:
+            self._batch_handlers.pop(name, None)
+
+    def get_batch_handler(self, name: str) -> Optional[Callable[..., List[Any]]]:
+        """Get the batch handler registered for a tool, if any"""
+        return self._batch_handlers.get(name)
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the registered tools, in registration order"""
+        return list(self._declarations)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._handlers
+
+    def build_tool(self) -> "types.Tool":
+        """Build the Gemini tool object declaring every registered function"""
+        from google.genai import types
+        return types.Tool(function_declarations=list(self._declarations.values()))
+
+    def dispatch(self, tool_call: "FunctionCall", **context) -> Any:
+        """
+        Call the handler for a function call returned by the LLM
+
+        Args:
+            tool_call (FunctionCall): Function call with the tool name and arguments
+            **context: Extra keyword arguments passed to the handler, e.g. the connection
+
+        Returns:
+            Any: Handler result, or None if the tool is not registered
+        """
+        handler = self._handlers.get(tool_call.name)
+        if handler is None:
+            print(f"Warning: LLM requested unknown tool: {tool_call.name}")
+            return None
+        return handler(**context, **(tool_call.args or {}))
+
+def search_keys_many(conn, queries: List[str], serverless_url: str = None,
+                     retriever: Optional[Retriever] = None) -> List[List[str]]:
+    """Batch handler for vector search returning the matching keys for each query"""
+    results = search_many(conn, queries, serverless_url=serverless_url, retriever=retriever)
+    return [[result["key"] for result in query_results] for query_results in results]
+
+def create_default_tool_registry(retriever: Optional[Retriever] = None) -> ToolRegistry:
+    """Create a registry with the vector search tool registered, searching with `retriever`"""
+    registry = ToolRegistry()
+    registry.register(
+        create_function_declaration(),
+        partial(get_information_for_question_answering, retriever=retriever),
+        partial(search_keys_many, retriever=retriever),
+    )
+    return registry
+
+class SnowflakeAgent:
+    """
+    Multimodal agent that owns its Gemini client, tools and generation configs
+
+    Args:
+        conn: Snowflake connection object
+        gemini_client: Gemini client object. Defaults to a shared client for the configured API key.
+        LLM (str): LLM model name. Defaults to `config.llm_model`.
+        serverless_url (str): Serverless embedding endpoint URL. Defaults to `config.serverless_url`.
+        tools (ToolRegistry): Tools the agent may call. Defaults to the vector search tool.
+        config (SnowflakeConfig): Configuration. Defaults to the global configuration.
+        retriever (Retriever): Retrieval strategy of the default search tool. Defaults to the
+            strategy selected by `config.search_mode`.
+    """
+
+    def __init__(self, conn, gemini_client=None, LLM: Optional[str] = None, serverless_url: Optional[str] = None,
+                 tools: Optional[ToolRegistry] = None, config: Optional[SnowflakeConfig] = None,
+                 retriever: Optional[Retriever] = None):
+        self.config = config or get_config()
+        self.conn = conn
+        self.gemini_client = gemini_client or get_gemini_client(
+            os.getenv("GOOGLE_API_KEY", self.config.google_api_key)
+        )
+        self.LLM = LLM or self.config.llm_model
+        self.serverless_url = self.config.serverless_url if serverless_url is None else serverless_url
+        self.retriever = retriever or get_retriever(conn, self.config)
+        self.tools = tools or create_default_tool_registry(self.retriever)
+        if not self.tools.names:
+            raise ValueError("The tool registry is empty; register a retrieval tool for the ReAct loop")
+        # The ReAct loop retrieves with the vector search tool, or the first registered tool without it
+        default_tool = create_function_declaration()["name"]
+        self.retrieval_tool = default_tool if default_tool in self.tools else self.tools.names[0]
+
+        from google.genai import types
+        self.answer_config = types.GenerateContentConfig(temperature=self.config.temperature)
+        self._build_tools_config()
+
+    def _build_tools_config(self) -> None:
+        """(Re)build the tool-calling config from the registry"""
+        from google.genai import types
+        self.tools_config = types.GenerateContentConfig(
+            tools=[self.tools.build_tool()], temperature=self.config.temperature
+        )
+
+    def register_tool(self, declaration: dict, handler: Callable[..., Any],
+                      batch_handler: Optional[Callable[..., List[Any]]] = None) -> None:
+        """Register an additional tool and refresh the tool-calling config"""
+        self.tools.register(declaration, handler, batch_handler)
+        self._build_tools_config()
+
+    def run_tool(self, tool_call: "FunctionCall") -> List[str]:
+        """Dispatch a tool call with this agent's connection and endpoint"""
+        print(f"Agent: Calling tool: {tool_call.name}")
+        result = self.tools.dispatch(tool_call, conn=self.conn, serverless_url=self.serverless_url)
+        return list(result or [])
+
+    def retrieve(self, questions: List[str]) -> List[str]:
+        """Run the retrieval tool for several questions and concatenate the keys"""
+        if not questions:
+            return []
+
+        # One batched search (single embedding request and GEMM) when the tool supports it
+        batch_handler = self.tools.get_batch_handler(self.retrieval_tool)
+        if batch_handler is not None and len(questions) > 1:
+            print(f"Agent: Calling tool: {self.retrieval_tool} for {len(questions)} queries")
+            results = batch_handler(conn=self.conn, serverless_url=self.serverless_url, queries=questions)
+            return [key for keys in results for key in keys]
+
+        # Otherwise fan the single-query calls out in parallel
+        from google.genai.types import FunctionCall
+        calls = [FunctionCall(name=self.retrieval_tool, args={"user_query": q}) for q in questions]
+        if len(calls) == 1:
+            return self.run_tool(calls[0])
+        # Each call runs in a copy of this context, so its spans stay children of the current turn
+        contexts = [contextvars.copy_context() for _ in calls]
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            results = executor.map(lambda ctx, call: ctx.run(self.run_tool, call), contexts, calls)
+            return [key for keys in results for key in keys]
+
+    def select_tool(self, messages: List) -> "FunctionCall | None":
+        """Use the LLM to decide which registered tool to call"""
+        with get_tracer().span("llm.select_tool", kind="llm", model=self.LLM), \
+                get_metrics().time("llm_call_seconds", "LLM call latency", call="select_tool", model=self.LLM):
+            response = self.gemini_client.models.generate_content(
+                model=self.LLM, contents=[SELECT_TOOL_PROMPT] + messages, config=self.tools_config
+            )
+        return response.candidates[0].content.parts[0].function_call
+
+    def _answer(self, contents: List) -> str:
+        with get_tracer().span("llm.generate", kind="llm", model=self.LLM, parts=len(contents)), \
+                get_metrics().time("llm_call_seconds", "LLM call latency", call="answer", model=self.LLM):
+            response = self.gemini_client.models.generate_content(
+                model=self.LLM, contents=contents, config=self.answer_config
+            )
+            return response.text
+
+    def _load_files(self, paths: List[str]) -> List:
+        contents = []
+        for path in paths:
+            item = load_file_for_context(path)
+            if item is not None:
+                contents.append(item)
+        return contents
+
+    def generate_answer(self, user_query: str, images: Optional[List[str]] = None) -> str:
+        """
+        Execute any tools and generate a response
+
+        Args:
+            user_query (str): User's query string
+            images (List[str]): List of filepaths. Defaults to None.
+
+        Returns:
+            str: LLM-generated response
+        """
+        with get_tracer().span("agent.turn", kind="agent", mode="basic"):
+            images = list(images or [])
+            tool_call = self.select_tool([user_query])
+            if tool_call is not None:
+                images.extend(self.run_tool(tool_call))
+
+            contents = [ANSWER_PROMPT, user_query] + self._load_files(images)
+            return self._answer(contents)
+
+    def generate_answer_with_memory(self, session_id: str, user_query: str, images: Optional[List[str]] = None) -> str:
+        """
+        Execute any tools and generate a response with memory
+
+        Args:
+            session_id (str): Session ID
+            user_query (str): User's query string
+            images (List[str]): List of filepaths. Defaults to None.
+
+        Returns:
+            str: LLM-generated response
+        """
+        with get_tracer().span("agent.turn", kind="agent", mode="memory"):
+            images = list(images or [])
+            history = retrieve_session_history(self.conn, session_id)
+
+            tool_call = self.select_tool(history + [user_query])
+            if tool_call is not None:
+                images.extend(self.run_tool(tool_call))
+
+            contents = [ANSWER_PROMPT] + history + [user_query] + self._load_files(images)
+            answer = self._answer(contents)
+
+            store_chat_message(self.conn, session_id, "user", "text", user_query)
+            for image in images:
+                store_chat_message(self.conn, session_id, "user", "image", image)
+            store_chat_message(self.conn, session_id, "agent", "text", answer)
+
+            return answer
+
+    def generate_answer_react(self, user_query: str, images: Optional[List[str]] = None) -> str:
+        """
+        Run the ReAct loop
+
+        Args:
+            user_query (str): User's query string
+            images (List[str]): List of filepaths. Defaults to None.
+
+        Returns:
+            str: LLM-generated response
+        """
+        with get_tracer().span("agent.turn", kind="agent", mode="react"):
+            system_prompt = [REACT_PROMPT.format(user_query=user_query)]
+            seen_images = set()
+            current_information = []
+
+            def add_images(paths: List[str]) -> int:
+                new_paths = [p for p in dict.fromkeys(paths) if p not in seen_images]
+                seen_images.update(new_paths)
+                current_information.extend(self._load_files(new_paths))
+                return len(new_paths)
+
+            add_images(images or [])
+
+            for iteration in range(1, self.config.max_iterations + 1):
+                print(f"Iteration {iteration}:")
+                answer = self._answer(system_prompt + current_information)
+                print(f"Agent: {answer}")
+
+                if "ANSWER" in answer:
+                    return answer
+
+                # Without a TOOL line there is nothing to retrieve; reason again
+                tool_questions = parse_tool_questions(answer)
+                if not tool_questions:
+                    continue
+
+                if add_images(self.retrieve(tool_questions)) == 0:
+                    print("Agent: No new information retrieved, stopping early")
+                    break
+
+            return "I was unable to find sufficient information to answer your question."
+
+    def _execute(self, name: str, request_id: Optional[str], generate: Callable[[], str]) -> None:
+        """Print an answer, profiling the turn under `request_id` when PROFILE_MODE is set"""
+        with get_profiler().profile(name, request_id) as profile_path:
+            answer = generate()
+        print("Agent:", answer)
+        if profile_path:
+            print("Profile:", profile_path)
+
+    def execute_agent(self, user_query: str, images: Optional[List[str]] = None,
+                      request_id: Optional[str] = None) -> None:
+        """Execute the agent."""
+        self._execute("execute_agent", request_id, lambda: self.generate_answer(user_query, images))
+
+    def execute_agent_with_memory(self, session_id: str, user_query: str, images: Optional[List[str]] = None,
+                                  request_id: Optional[str] = None) -> None:
+        """Execute the agent with memory."""
+        self._execute("execute_agent_with_memory", request_id,
+                      lambda: self.generate_answer_with_memory(session_id, user_query, images))
+
+    def execute_react_agent(self, user_query: str, images: Optional[List[str]] = None,
+                            request_id: Optional[str] = None) -> None:
+        """Execute the ReAct agent."""
+        self._execute("execute_react_agent", request_id, lambda: self.generate_answer_react(user_query, images))
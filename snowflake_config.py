@@ -27,6 +27,9 @@ class SnowflakeConfig:
         
         # Serverless Endpoint
         self.serverless_url = os.getenv("SERVERLESS_URL", "your-serverless-endpoint-url")
+        self.embedding_timeout = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+        # Send several queries as one list input; endpoints that only accept a string get one request each
+        self.batch_query_embeddings = os.getenv("BATCH_QUERY_EMBEDDINGS", "true").lower() == "true"
         
         # Model Settings
         self.llm_model = os.getenv("LLM_MODEL", "gemini-2.0-flash")
@@ -37,6 +40,22 @@ class SnowflakeConfig:
         self.similarity_metric = os.getenv("SIMILARITY_METRIC", "cosine")
         self.max_results = int(os.getenv("MAX_SEARCH_RESULTS", "2"))
         self.similarity_threshold = float(os.getenv("SIMILARITY_THRESHOLD", "0.0"))
+        # Retrieval strategy (see retrieval.py): "client" scores an in-memory copy of the table
+        # (fastest); "server" scores a typed VECTOR column inside Snowflake and only fetches the
+        # top-k keys; "multi_vector" scores page tiles
+        self.search_mode = os.getenv("SEARCH_MODE", "client").lower()
+        
+        # Result diversity: MMR re-ranking (off by default; e.g. 0.7 trades some relevance for
+        # diversity, 1.0 ranks by similarity only) and ingest-time duplicate collapsing
+        mmr_lambda = os.getenv("MMR_LAMBDA", "")
+        self.mmr_lambda = float(mmr_lambda) if mmr_lambda else None
+        self.mmr_candidates = int(os.getenv("MMR_CANDIDATES", "10"))
+        self.duplicate_threshold = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", "0.995"))
+        
+        # Multi-vector (late interaction) search over page tiles
+        self.multi_vector_search = os.getenv("MULTI_VECTOR_SEARCH", "false").lower() == "true"
+        self.tile_grid = int(os.getenv("TILE_GRID", "2"))
+        self.max_vectors_per_page = int(os.getenv("MAX_VECTORS_PER_PAGE", "16"))
         
         # Agent Settings
         self.max_iterations = int(os.getenv("MAX_ITERATIONS", "3"))
@@ -46,10 +65,61 @@ class SnowflakeConfig:
         self.data_dir = os.getenv("DATA_DIR", "data")
         self.images_dir = os.path.join(self.data_dir, "images")
         self.embeddings_file = os.path.join(self.data_dir, "embeddings.json")
+        self.tile_embeddings_file = os.path.join(self.data_dir, "tile_embeddings.json")
+        self.docx_cache_dir = os.getenv("DOCX_CACHE_DIR", os.path.join(self.data_dir, ".cache", "docx_text"))
+        
+        # Ingestion pipeline: extraction workers, queue capacity between stages and batch sizes
+        self.ingest_workers = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 4)))
+        self.ingest_queue_size = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+        self.embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+        self.write_batch_size = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+        # Comma-separated globs, relative to each ingestion directory (e.g. "*.png,reports/*.pdf")
+        self.ingest_include = [g for g in os.getenv("INGEST_INCLUDE", "").split(",") if g]
+        self.ingest_exclude = [g for g in os.getenv("INGEST_EXCLUDE", "").split(",") if g]
         
         # PDF Processing Settings
         self.pdf_zoom = float(os.getenv("PDF_ZOOM", "3.0"))
         self.pdf_url = os.getenv("PDF_URL", "https://arxiv.org/pdf/2501.12948")
+        self.pdf_cache_dir = os.getenv("PDF_CACHE_DIR", os.path.join(self.data_dir, ".cache", "pdfs"))
+        # Lazy rendering: ingest page records and render pages only when they are embedded or retrieved
+        self.lazy_pdf_rendering = os.getenv("LAZY_PDF_RENDERING", "false").lower() == "true"
+        self.pdf_embed_zoom = float(os.getenv("PDF_EMBED_ZOOM", "1.0"))
+        self.page_cache_dir = os.getenv("PAGE_CACHE_DIR", os.path.join(self.data_dir, ".cache", "pages"))
+        self.page_cache_max_mb = float(os.getenv("PAGE_CACHE_MAX_MB", "512"))
+        # Render profiles: page images for the LLM (context), the embedding model and previews
+        # (thumbnail). Formats are png, jpeg or webp; text-only pages can be stored in grayscale.
+        self.pdf_context_format = os.getenv("PDF_CONTEXT_FORMAT", "png").lower()
+        self.pdf_embed_format = os.getenv("PDF_EMBED_FORMAT", "jpeg").lower()
+        self.pdf_thumbnail_zoom = float(os.getenv("PDF_THUMBNAIL_ZOOM", "0.5"))
+        self.pdf_thumbnail_format = os.getenv("PDF_THUMBNAIL_FORMAT", "webp").lower()
+        self.pdf_image_quality = int(os.getenv("PDF_IMAGE_QUALITY", "85"))
+        self.pdf_grayscale_text_pages = os.getenv("PDF_GRAYSCALE_TEXT_PAGES", "true").lower() == "true"
+        self.renders_dir = os.getenv("RENDERS_DIR", os.path.join(self.data_dir, "renders"))
+
+        # Tracing: spans kept in memory, and an optional OTLP/JSON lines file for finished traces
+        self.tracing_enabled = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+        self.trace_buffer_size = int(os.getenv("TRACE_BUFFER_SIZE", "2048"))
+        self.trace_export_file = os.getenv("TRACE_EXPORT_FILE", "")
+
+        # Profiling (opt-in): "cprofile" or "sampling" (collapsed stacks) for every Nth request,
+        # written per request ID under the profile directory
+        self.profile_mode = os.getenv("PROFILE_MODE", "off").lower()
+        self.profile_every = int(os.getenv("PROFILE_EVERY", "1"))
+        self.profile_interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+        self.profile_dir = os.getenv("PROFILE_DIR", os.path.join(self.data_dir, "profiles"))
+
+        # Metrics: counters and histograms in Prometheus text format, served on a port
+        # (0 disables the endpoint) and/or written to a file at exit
+        self.metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        self.metrics_file = os.getenv("METRICS_FILE", "")
+
+        # Chat history retention: messages older than the retention period are archived to
+        # gzipped JSON lines and deleted in batches, pausing between batches
+        self.history_retention_days = int(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+        self.history_retention_batch_size = int(os.getenv("HISTORY_RETENTION_BATCH_SIZE", "1000"))
+        self.history_retention_pause_ms = float(os.getenv("HISTORY_RETENTION_PAUSE_MS", "100"))
+        self.history_archive_dir = os.getenv("HISTORY_ARCHIVE_DIR", os.path.join(self.data_dir, "history_archive"))
     
     def validate_config(self) -> bool:
         """Validate that required configuration is present"""
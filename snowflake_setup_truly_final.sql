@@ -20,6 +20,7 @@ CREATE OR REPLACE TABLE multimodal_documents (
     width INTEGER,
     height INTEGER,
     embedding STRING, -- Store as comma-separated string
+    content_hash STRING, -- MD5 of the stored fields, used to skip unchanged rows on reload
     created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
     updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
 );
@@ -14,19 +14,21 @@ Run the snowflake_setup.sql script in your Snowflake environment first.
 
 import os
 import json
-import snowflake.connector
-from snowflake.connector import DictCursor
-import pandas as pd
-import numpy as np
-import pymupdf
 import requests
 from tqdm import tqdm
 from PIL import Image
-from typing import List
+from typing import TYPE_CHECKING, List
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from google import genai
-from google.genai import types
-from google.genai.types import FunctionCall
+from snowflake_utils import ensure_content_hash_column, parse_tool_questions, upsert_documents
+from profiling import get_profiler
+import generation_configs
+from generation_configs import config_constants, get_answer_config
+
+# snowflake.connector, google.genai and pymupdf are imported where they are first
+# used, so importing this module stays fast
+if TYPE_CHECKING:
+    from google.genai.types import FunctionCall
 
 # Load environment variables from .env file if it exists
 try:
@@ -57,6 +59,7 @@ def setup_snowflake_connection():
     print(f"Schema: {SNOWFLAKE_SCHEMA}")
 
     # Initialize Snowflake connection
+    import snowflake.connector
     conn = snowflake.connector.connect(
         account=SNOWFLAKE_ACCOUNT,
         user=SNOWFLAKE_USER,
@@ -76,6 +79,8 @@ def setup_snowflake_connection():
 
 def setup_gemini():
     """Setup Gemini client"""
+    from google import genai
+
     os.environ["GOOGLE_API_KEY"] = "your-google-api-key"
     LLM = "gemini-2.0-flash"
     gemini_client = genai.Client()
@@ -84,6 +89,8 @@ def setup_gemini():
 # Step 2: PDF Processing
 def download_and_process_pdf(pdf_url="https://arxiv.org/pdf/2501.12948"):
     """Download PDF and extract images"""
+    import pymupdf
+
     # Download the PDF
     response = requests.get(pdf_url)
     if response.status_code != 200:
@@ -128,41 +135,13 @@ def load_embeddings_to_snowflake(conn):
     
     print(f"Loaded {len(embeddings_data)} documents with embeddings")
     
-    # Prepare data for Snowflake insertion
-    cursor = conn.cursor()
-    
-    # Clear existing data
-    cursor.execute("DELETE FROM multimodal_documents")
-    print("Cleared existing documents from multimodal_documents table.")
-    
-    # Insert documents with embeddings
-    insert_query = """
-    INSERT INTO multimodal_documents (key, width, height, embedding)
-    VALUES (%s, %s, %s, %s)
-    """
-    
-    for doc in tqdm(embeddings_data):
-        # Convert embedding list to proper VECTOR format for Snowflake
-        # Use ARRAY constructor to ensure proper VECTOR type handling
-        embedding_array = doc['embedding']  # This should already be a list of floats
-        
-        # Use a different approach - insert as ARRAY first, then update to VECTOR
-        # First, try direct array insertion
-        insert_query = """
-        INSERT INTO multimodal_documents (key, width, height, embedding)
-        VALUES (%s, %s, %s, %s)
-        """
-        
-        # Try passing the array directly as a list
-        cursor.execute(insert_query, (
-            doc['key'],
-            doc['width'],
-            doc['height'],
-            embedding_array
-        ))
-    
-    cursor.close()
-    conn.commit()
+    # Upsert by key: unchanged rows are not rewritten, search keeps working during the
+    # load and the corpus statistics stay current
+    ensure_content_hash_column(conn)
+    # snowflake_setup.sql declares `embedding VECTOR(FLOAT, 1024)`, so the MERGE casts the staged strings
+    counts = upsert_documents(conn, embeddings_data, delete_missing=True, vector_dimensions=1024)
+    print(f"Inserted {counts['inserted']}, updated {counts['updated']}, unchanged {counts['unchanged']}, "
+          f"deleted {counts['deleted']} documents.")
     
     # Verify insertion
     cursor = conn.cursor()
@@ -197,6 +176,7 @@ def get_information_for_question_answering(conn, user_query: str, serverless_url
     query_embedding = response.json()["embedding"]
     
     # Perform vector search using Snowflake's VECTOR_COSINE_SIMILARITY function
+    from snowflake.connector import DictCursor
     cursor = conn.cursor(DictCursor)
     
     search_query = """
@@ -234,7 +214,13 @@ def create_function_declaration():
         },
     }
 
-def select_tool(gemini_client, LLM, tools_config, messages: List) -> FunctionCall | None:
+def get_tools_config():
+    """Shared generation config declaring the vector search tool (see generation_configs.py)"""
+    return generation_configs.get_tools_config(create_function_declaration)
+
+__getattr__ = config_constants(__name__, get_tools_config)
+
+def select_tool(gemini_client, LLM, tools_config, messages: List) -> "FunctionCall | None":
     """
     Use an LLM to decide which tool to call
 
@@ -277,13 +263,8 @@ def generate_answer(conn, gemini_client, LLM, user_query: str, images: List = []
     Returns:
         str: LLM-generated response
     """
-    # Create tools config
-    function_declaration = create_function_declaration()
-    tools = types.Tool(function_declarations=[function_declaration])
-    tools_config = types.GenerateContentConfig(tools=[tools], temperature=0.0)
-    
     # Use the select_tool function to get the tool config
-    tool_call = select_tool(gemini_client, LLM, tools_config, [user_query])
+    tool_call = select_tool(gemini_client, LLM, get_tools_config(), [user_query])
     
     # If a tool call is found and the name matches
     if (
@@ -305,12 +286,13 @@ def generate_answer(conn, gemini_client, LLM, user_query: str, images: List = []
     response = gemini_client.models.generate_content(
         model=LLM,
         contents=contents,
-        config=types.GenerateContentConfig(temperature=0.0),
+        config=get_answer_config(),
     )
     answer = response.text
     return answer
 
-def execute_agent(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "") -> None:
+def execute_agent(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "",
+                  request_id: str = None) -> None:
     """
     Execute the agent.
 
@@ -321,9 +303,14 @@ def execute_agent(conn, gemini_client, LLM, user_query: str, images: List = [],
         user_query (str): User query
         images (List, optional): List of filepaths. Defaults to [].
         serverless_url (str): Serverless endpoint URL
+        request_id (str, optional): Request ID the turn is profiled under when PROFILE_MODE is set.
+            Defaults to a new random ID.
     """
-    response = generate_answer(conn, gemini_client, LLM, user_query, images, serverless_url)
+    with get_profiler().profile("execute_agent", request_id) as profile_path:
+        response = generate_answer(conn, gemini_client, LLM, user_query, images, serverless_url)
     print("Agent:", response)
+    if profile_path:
+        print("Profile:", profile_path)
 
 # Step 6: Memory Functions
 def store_chat_message(conn, session_id: str, role: str, message_type: str, content: str) -> None:
@@ -359,6 +346,7 @@ def retrieve_session_history(conn, session_id: str) -> List:
     Returns:
         List: List of messages. Can be a combination of text and images.
     """
+    from snowflake.connector import DictCursor
     cursor = conn.cursor(DictCursor)
     
     query = """
@@ -402,13 +390,8 @@ def generate_answer_with_memory(conn, gemini_client, LLM, session_id: str, user_
     # Retrieve past conversation history
     history = retrieve_session_history(conn, session_id)
     
-    # Create tools config
-    function_declaration = create_function_declaration()
-    tools = types.Tool(function_declarations=[function_declaration])
-    tools_config = types.GenerateContentConfig(tools=[tools], temperature=0.0)
-    
     # Determine if any additional tools need to be called
-    tool_call = select_tool(gemini_client, LLM, tools_config, history + [user_query])
+    tool_call = select_tool(gemini_client, LLM, get_tools_config(), history + [user_query])
     
     if (
         tool_call is not None
@@ -433,7 +416,7 @@ def generate_answer_with_memory(conn, gemini_client, LLM, session_id: str, user_
     response = gemini_client.models.generate_content(
         model=LLM,
         contents=contents,
-        config=types.GenerateContentConfig(temperature=0.0),
+        config=get_answer_config(),
     )
     answer = response.text
     
@@ -449,7 +432,8 @@ def generate_answer_with_memory(conn, gemini_client, LLM, session_id: str, user_
     
     return answer
 
-def execute_agent_with_memory(conn, gemini_client, LLM, session_id: str, user_query: str, images: List = [], serverless_url: str = "") -> None:
+def execute_agent_with_memory(conn, gemini_client, LLM, session_id: str, user_query: str, images: List = [], serverless_url: str = "",
+                              request_id: str = None) -> None:
     """
     Execute the agent with memory.
 
@@ -461,15 +445,24 @@ def execute_agent_with_memory(conn, gemini_client, LLM, session_id: str, user_qu
         user_query (str): User query
         images (List, optional): List of filepaths. Defaults to [].
         serverless_url (str): Serverless endpoint URL
+        request_id (str, optional): Request ID the turn is profiled under when PROFILE_MODE is set.
+            Defaults to a new random ID.
     """
-    response = generate_answer_with_memory(conn, gemini_client, LLM, session_id, user_query, images, serverless_url)
+    with get_profiler().profile("execute_agent_with_memory", request_id) as profile_path:
+        response = generate_answer_with_memory(conn, gemini_client, LLM, session_id, user_query, images, serverless_url)
     print("Agent:", response)
+    if profile_path:
+        print("Profile:", profile_path)
 
 # Step 7: ReAct Agent Implementation
 def generate_answer_react(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "") -> str:
     """
     Implement a ReAct agent
 
+    Tool questions are parsed directly from the reasoning output, so each iteration
+    costs a single LLM round trip. When the model asks several questions at once,
+    the retrievals run in parallel, and only images not already in the context are added.
+
     Args:
         conn: Snowflake connection object
         gemini_client: Gemini client object
@@ -487,6 +480,7 @@ def generate_answer_react(conn, gemini_client, LLM, user_query: str, images: Lis
             "You are an AI assistant. Based on the current information, decide if you have enough to answer the user query, or if you need more information."
             "If you have enough information, respond with 'ANSWER: <your answer>'."
             "If you need more information, respond with 'TOOL: <question for the tool>'. Keep the question concise."
+            "If you need several independent pieces of information, put each 'TOOL: <question>' on its own line."
             f"User query: {user_query}\n"
             "Current information:\n"
         )
@@ -496,10 +490,13 @@ def generate_answer_react(conn, gemini_client, LLM, user_query: str, images: Lis
     max_iterations = 3
     current_iteration = 0
     current_information = []
+    seen_images = set()
 
     # If the user input has images, add them to current_information
-    if len(images) != 0:
-        current_information.extend([Image.open(image) for image in images])
+    for image in images:
+        if image not in seen_images:
+            seen_images.add(image)
+            current_information.append(Image.open(image))
 
     # Run the reasoning -> action taking loop
     while current_iteration < max_iterations:
@@ -510,7 +507,7 @@ def generate_answer_react(conn, gemini_client, LLM, user_query: str, images: Lis
         response = gemini_client.models.generate_content(
             model=LLM,
             contents=system_prompt + current_information,
-            config=types.GenerateContentConfig(temperature=0.0),
+            config=get_answer_config(),
         )
         answer = response.text
         print(f"Agent: {answer}")
@@ -518,29 +515,39 @@ def generate_answer_react(conn, gemini_client, LLM, user_query: str, images: Lis
         # If the agent has the final answer, return it
         if "ANSWER" in answer:
             return answer
-        # If the agent decides to call a tool
-        else:
-            # Create tools config
-            function_declaration = create_function_declaration()
-            tools = types.Tool(function_declarations=[function_declaration])
-            tools_config = types.GenerateContentConfig(tools=[tools], temperature=0.0)
-            
-            # Determine which tool to call
-            tool_call = select_tool(gemini_client, LLM, tools_config, [answer])
-            if (
-                tool_call is not None
-                and tool_call.name == "get_information_for_question_answering"
-            ):
-                print(f"Agent: Calling tool: {tool_call.name}")
-                # Call the tool with the arguments extracted by the LLM
-                tool_images = get_information_for_question_answering(conn, **tool_call.args, serverless_url=serverless_url)
-                # Add images returned by the tool
-                current_information.extend([Image.open(image) for image in tool_images])
-                continue
+
+        # Without a TOOL line there is nothing to retrieve; reason again
+        tool_questions = parse_tool_questions(answer)
+        if not tool_questions:
+            continue
+
+        # Run every requested retrieval in parallel
+        print(f"Agent: Calling tool: get_information_for_question_answering x{len(tool_questions)}")
+        with ThreadPoolExecutor(max_workers=len(tool_questions)) as executor:
+            results = executor.map(
+                lambda question: get_information_for_question_answering(conn, question, serverless_url),
+                tool_questions,
+            )
+            tool_images = [image for keys in results for image in keys]
+
+        # Only add images that are not already part of the context
+        new_images = []
+        for image in tool_images:
+            if image not in seen_images:
+                seen_images.add(image)
+                new_images.append(image)
+
+        # Nothing new was retrieved, so another iteration would see the same information
+        if not new_images:
+            print("Agent: No new information retrieved, stopping early")
+            break
+
+        current_information.extend([Image.open(image) for image in new_images])
     
     return "I was unable to find sufficient information to answer your question."
 
-def execute_react_agent(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "") -> None:
+def execute_react_agent(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "",
+                        request_id: str = None) -> None:
     """
     Execute the ReAct agent.
 
@@ -551,9 +558,14 @@ def execute_react_agent(conn, gemini_client, LLM, user_query: str, images: List
         user_query (str): User query
         images (List, optional): List of filepaths. Defaults to [].
         serverless_url (str): Serverless endpoint URL
+        request_id (str, optional): Request ID the turn is profiled under when PROFILE_MODE is set.
+            Defaults to a new random ID.
     """
-    response = generate_answer_react(conn, gemini_client, LLM, user_query, images, serverless_url)
+    with get_profiler().profile("execute_react_agent", request_id) as profile_path:
+        response = generate_answer_react(conn, gemini_client, LLM, user_query, images, serverless_url)
     print("Agent:", response)
+    if profile_path:
+        print("Profile:", profile_path)
 
 # Main execution function
 def main():
@@ -29,6 +29,7 @@ from datetime import datetime
 from google import genai
 from google.genai import types
 from google.genai.types import FunctionCall
+from corpus_stats import invalidate_stats
 
 # Load environment variables from .env file if it exists
 try:
@@ -162,6 +163,8 @@ def load_embeddings_to_snowflake(conn):
     
     cursor.close()
     conn.commit()
+    # The running corpus statistics (see corpus_stats.py) no longer match the table
+    invalidate_stats(conn)
     
     # Verify insertion
     cursor = conn.cursor()
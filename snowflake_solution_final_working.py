@@ -21,6 +21,7 @@ from datetime import datetime
 from google import genai
 from google.genai import types
 from google.genai.types import FunctionCall
+from corpus_stats import invalidate_stats
 
 # Load environment variables from .env file if it exists
 try:
@@ -150,6 +151,8 @@ def load_embeddings_to_snowflake(conn):
     
     cursor.close()
     conn.commit()
+    # The running corpus statistics (see corpus_stats.py) no longer match the table
+    invalidate_stats(conn)
     
     # Verify insertion
     cursor = conn.cursor()
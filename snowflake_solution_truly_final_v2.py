@@ -21,6 +21,8 @@ from datetime import datetime
 from google import genai
 from google.genai import types
 from google.genai.types import FunctionCall
+from embedding_codec import format_embedding_for_snowflake, parse_embedding_from_string
+from corpus_stats import invalidate_stats
 
 # Load environment variables from .env file if it exists
 try:
@@ -117,21 +119,6 @@ def download_and_process_pdf(pdf_url="https://arxiv.org/pdf/2501.12948"):
     print(f"Processed {len(docs)} pages")
     return docs
 
-def format_embedding_for_snowflake(embedding):
-    """Format embedding to avoid scientific notation issues"""
-    # Format each number to avoid scientific notation
-    formatted_values = []
-    for val in embedding:
-        # Use format to avoid scientific notation for small numbers
-        if abs(val) < 1e-10:
-            # For very small numbers, use scientific notation but ensure it's parseable
-            formatted_val = f"{val:.15g}"
-        else:
-            # For normal numbers, use fixed decimal format
-            formatted_val = f"{val:.15f}".rstrip('0').rstrip('.')
-        formatted_values.append(formatted_val)
-    return ','.join(formatted_values)
-
 # Step 3: Load embeddings and store in Snowflake (STRING approach with proper formatting)
 def load_embeddings_to_snowflake(conn):
     """Load pre-generated embeddings and store in Snowflake using STRING approach with proper formatting"""
@@ -168,6 +155,8 @@ def load_embeddings_to_snowflake(conn):
     
     cursor.close()
     conn.commit()
+    # The running corpus statistics (see corpus_stats.py) no longer match the table
+    invalidate_stats(conn)
     
     # Verify insertion
     cursor = conn.cursor()
@@ -212,7 +201,7 @@ def get_information_for_question_answering(conn, user_query: str, serverless_url
         result = cursor.fetchone()
         if result:
             # Convert the stored string back to a list
-            query_embedding = [float(x) for x in result[0].split(',')]
+            query_embedding = parse_embedding_from_string(result[0])
         else:
             raise ValueError("No documents found in database")
         cursor.close()
@@ -8,20 +8,28 @@ Uses STRING storage and performs vector operations in Python, avoiding all Snowf
 
 import os
 import json
-import snowflake.connector
-from snowflake.connector import DictCursor
-import pandas as pd
-import numpy as np
-import pymupdf
 import requests
-from tqdm import tqdm
 from PIL import Image
-from typing import List
+from typing import TYPE_CHECKING, Dict, List
 from datetime import datetime
-from google import genai
-from google.genai import types
-from google.genai.types import FunctionCall
-from sklearn.metrics.pairwise import cosine_similarity
+from snowflake_config import get_config
+from snowflake_utils import collapse_near_duplicates, dict_cursor, ensure_content_hash_column, upsert_documents
+from pdf_download import download_pdf, download_pdf_to, local_pdf_path
+from pdf_pages import create_page_records, render_pdf_pages, resolve_image_path
+from vector_index import IMAGE_EXTENSIONS, parse_page_key
+from docx_extraction import get_docx_text
+# The index accessors moved to retrieval.py; they stay importable from here
+from retrieval import Retriever, get_multi_vector_index, get_retriever, get_vector_index
+from tracing import format_breakdown, get_tracer, latency_breakdown
+from metrics import get_metrics
+from profiling import get_profiler
+import generation_configs
+from generation_configs import config_constants, get_answer_config
+
+# snowflake.connector and google.genai take well over a second to import, so they
+# are imported where they are first used instead of here
+if TYPE_CHECKING:
+    from google.genai.types import FunctionCall
 
 # Load environment variables from .env file if it exists
 try:
@@ -52,6 +60,7 @@ def setup_snowflake_connection():
     print(f"Schema: {SNOWFLAKE_SCHEMA}")
 
     # Initialize Snowflake connection
+    import snowflake.connector
     conn = snowflake.connector.connect(
         account=SNOWFLAKE_ACCOUNT,
         user=SNOWFLAKE_USER,
@@ -76,6 +85,8 @@ def setup_gemini():
     if not google_api_key:
         raise ValueError("GOOGLE_API_KEY environment variable not set. Please set it in your .env file or environment.")
     
+    from google import genai
+
     LLM = "gemini-2.0-flash"
     gemini_client = genai.Client(api_key=google_api_key)
     return gemini_client, LLM
@@ -83,96 +94,51 @@ def setup_gemini():
 # Step 2: PDF Processing
 def download_and_process_pdf(pdf_url="https://arxiv.org/pdf/2501.12948"):
     """Download PDF and extract images"""
-    # Download the PDF
-    response = requests.get(pdf_url)
-    if response.status_code != 200:
-        raise ValueError(f"Failed to download PDF. Status code: {response.status_code}")
-
-    pdf_stream = response.content
-    pdf = pymupdf.Document(stream=pdf_stream, filetype="pdf")
-    print(f"PDF loaded with {pdf.page_count} pages")
-    
-    # Create images directory if it doesn't exist
-    os.makedirs("data/images", exist_ok=True)
-    
-    docs = []
-    zoom = 3.0
-    mat = pymupdf.Matrix(zoom, zoom)
-    
-    # Iterate through the pages of the PDF
-    for n in tqdm(range(pdf.page_count)):
-        temp = {}
-        # Render the PDF page as a matrix of pixels
-        pix = pdf[n].get_pixmap(matrix=mat)
-        
-        # Store image locally
-        key = f"data/images/{n+1}.png"
-        pix.save(key)
-        
-        # Extract image metadata
-        temp["key"] = key
-        temp["width"] = pix.width
-        temp["height"] = pix.height
-        docs.append(temp)
+    # PDFs are streamed into the local cache (reused across runs, resumed if interrupted)
+    config = get_config()
+    if config.lazy_pdf_rendering:
+        # Ingest page records; pages are rendered when embedded or retrieved. The records are
+        # keyed by data/pdfs/<name>.pdf, not by the cache's content-addressed object
+        pdf_path = download_pdf_to(pdf_url, local_pdf_path(pdf_url, os.path.join(config.data_dir, "pdfs")))
+        docs = create_page_records(pdf_path, config.pdf_zoom)
+        print(f"Recorded {len(docs)} pages for on-demand rendering")
+        return docs
+    
+    pdf_path = download_pdf(pdf_url)
+    # Render each page once and derive the context, embedding and thumbnail images
+    docs = render_pdf_pages(pdf_path, "data/images")
     
     print(f"Processed {len(docs)} pages")
     return docs
 
-def format_embedding_for_snowflake(embedding):
-    """Format embedding to avoid scientific notation issues"""
-    # Format each number to avoid scientific notation
-    formatted_values = []
-    for val in embedding:
-        # Use format to avoid scientific notation for small numbers
-        if abs(val) < 1e-10:
-            # For very small numbers, use scientific notation but ensure it's parseable
-            formatted_val = f"{val:.15g}"
-        else:
-            # For normal numbers, use fixed decimal format
-            formatted_val = f"{val:.15f}".rstrip('0').rstrip('.')
-        formatted_values.append(formatted_val)
-    return ','.join(formatted_values)
-
-def parse_embedding_from_string(embedding_str):
-    """Parse embedding from comma-separated string back to list"""
-    return [float(x) for x in embedding_str.split(',')]
-
 # Step 3: Load embeddings and store in Snowflake (STRING approach with proper formatting)
-def load_embeddings_to_snowflake(conn):
-    """Load pre-generated embeddings and store in Snowflake using STRING approach with proper formatting"""
+def load_embeddings_to_snowflake(conn) -> Dict[str, int]:
+    """Load pre-generated embeddings and upsert them into Snowflake using STRING approach with proper formatting"""
     # Read pre-generated embeddings from JSON file
     with open("data/embeddings.json", "r") as data_file:
         embeddings_data = json.load(data_file)
     
     print(f"Loaded {len(embeddings_data)} documents with embeddings")
     
-    # Prepare data for Snowflake insertion
-    cursor = conn.cursor()
+    config = get_config()
     
-    # Clear existing data
-    cursor.execute("DELETE FROM multimodal_documents")
-    print("Cleared existing documents from multimodal_documents table.")
+    # Skip duplicate files and near-identical embeddings
+    embeddings_data, duplicates = collapse_near_duplicates(embeddings_data, config.duplicate_threshold)
+    for duplicate_key, kept_key in duplicates.items():
+        print(f"Skipping {duplicate_key}: duplicate of {kept_key}")
     
-    # Insert documents with embeddings using STRING approach with proper formatting
-    for doc in tqdm(embeddings_data):
-        # Convert embedding to properly formatted comma-separated string
-        embedding_str = format_embedding_for_snowflake(doc['embedding'])
-        
-        # Insert using simple parameterized query with STRING
-        insert_query = """
-        INSERT INTO multimodal_documents (key, width, height, embedding)
-        VALUES (%s, %s, %s, %s)
-        """
-        
-        cursor.execute(insert_query, (
-            doc['key'],
-            doc['width'],
-            doc['height'],
-            embedding_str
-        ))
+    # The search strategy prepares the table and updates its derived data after the load
+    retriever = get_retriever(conn, config, mode=config.search_mode)
+    ensure_content_hash_column(conn)
+    retriever.prepare()
     
-    cursor.close()
-    conn.commit()
+    # Upsert by key: unchanged rows are not rewritten and search keeps working during the load
+    counts = upsert_documents(conn, embeddings_data, delete_missing=True, clear_vectors=retriever.stores_vectors)
+    print(f"Inserted {counts['inserted']}, updated {counts['updated']}, unchanged {counts['unchanged']}, "
+          f"deleted {counts['deleted']} documents.")
+    
+    if counts['inserted'] or counts['updated'] or counts['deleted']:
+        retriever.documents_changed()
     
     # Verify insertion
     cursor = conn.cursor()
@@ -180,76 +146,134 @@ def load_embeddings_to_snowflake(conn):
     count = cursor.fetchone()[0]
     print(f"{count} documents ingested into the multimodal_documents table.")
     cursor.close()
+    return counts
+
+# Step 4: Vector Search Function (strategies in retrieval.py, in-memory index by default)
+# Endpoints that answered a list input without `embeddings`; their queries are sent one at a time
+_unbatched_endpoints = set()
+
+def _post_embedding_request(serverless_url: str, data, timeout: float):
+    response = requests.post(
+        url=serverless_url,
+        json={"task": "get_embedding", "data": {"input": data, "input_type": "query"}},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()
 
-# Step 4: Vector Search Function (using Python for vector operations)
-def get_information_for_question_answering(conn, user_query: str, serverless_url: str = None) -> List[str]:
+def embed_queries(queries: List[str], serverless_url: str) -> List[List[float]]:
     """
-    Retrieve information using vector search.
-    Uses Python for vector operations to avoid Snowflake VECTOR issues.
+    Embed queries with the serverless endpoint, in a single request where possible
+
+    A single query is sent as a string and read from `embedding`; several queries
+    are sent as a list and read from `embeddings`, one embedding per query. If the
+    endpoint rejects the list or answers without `embeddings`, or
+    BATCH_QUERY_EMBEDDINGS is false, each query is sent in its own request.
+
+    Args:
+    queries (List[str]): Query strings
+    serverless_url (str): URL for the serverless embedding endpoint
+
+    Returns:
+    List[List[float]]: One embedding per query
+    """
+    config = get_config()
+    batched = len(queries) > 1 and config.batch_query_embeddings and serverless_url not in _unbatched_endpoints
+    with get_tracer().span("embedding.queries", kind="embedding", queries=len(queries)), \
+            get_metrics().time("embedding_request_seconds", "Query embedding request latency"):
+        if batched:
+            try:
+                embeddings = _post_embedding_request(serverless_url, queries, config.embedding_timeout).get("embeddings")
+            except requests.HTTPError as e:
+                if e.response is None or not 400 <= e.response.status_code < 500:
+                    raise
+                embeddings = None
+            if embeddings is not None and len(embeddings) == len(queries):
+                return embeddings
+            print(f"Embedding endpoint {serverless_url} does not batch queries; sending them one at a time")
+            _unbatched_endpoints.add(serverless_url)
+        return [_post_embedding_request(serverless_url, query, config.embedding_timeout)["embedding"]
+                for query in queries]
+
+def search_many(conn, queries: List[str], k: int = None, serverless_url: str = None,
+                document_type: str = None, source_file: str = None, modality: str = None,
+                threshold: float = None, retriever: Retriever = None) -> List[List[Dict]]:
+    """
+    Run vector search for several queries at once.
+
+    All queries are embedded in one request and scored by the retrieval strategy:
+    by default a single matrix-matrix product over the in-memory index; with
+    SEARCH_MODE=server the scoring and top-k selection run in Snowflake instead.
 
     Args:
     conn: Snowflake connection object
-    user_query (str): The user's query string.
+    queries (List[str]): The query strings.
+    k (int): Maximum number of results per query. Defaults to `SnowflakeConfig.max_results`.
     serverless_url (str): URL for the serverless embedding endpoint
+    document_type (str): Only search documents of this type (`image`, `text` or `metadata`)
+    source_file (str): Only search documents from this source file
+    modality (str): Only search imaging metadata of this modality, e.g. `MR`
+    threshold (float): Minimum similarity score. Defaults to `SnowflakeConfig.similarity_threshold`.
+    retriever (Retriever): Retrieval strategy. Defaults to `get_retriever(conn)`.
 
     Returns:
-    List[str]: List of image keys that match the query.
+    List[List[Dict]]: For each query, results with `key` and `similarity_score`, best first.
     """
+    if not queries:
+        return []
+
+    config = get_config()
+    k = config.max_results if k is None else k
+    threshold = config.similarity_threshold if threshold is None else threshold
+    filters = {
+        'document_type': document_type,
+        'source_file': source_file,
+        'modality': modality,
+    }
+
+    retriever = retriever or get_retriever(conn, config)
+
     # For demo purposes, use a simple query embedding (first document's embedding)
     # In production, you would use the serverless_url to get the actual embedding
     if serverless_url and serverless_url != "your-serverless-endpoint-url":
-        # Embed the user query using serverless endpoint
-        response = requests.post(
-            url=serverless_url,
-            json={
-                "task": "get_embedding",
-                "data": {"input": user_query, "input_type": "query"},
-            },
-        )
-        
-        # Extract the embedding from the response
-        query_embedding = response.json()["embedding"]
+        query_embeddings = embed_queries(queries, serverless_url)
     else:
         # Demo mode: use first document's embedding as query embedding
         print("Demo mode: Using first document's embedding as query embedding")
-        cursor = conn.cursor()
-        cursor.execute("SELECT EMBEDDING FROM multimodal_documents LIMIT 1")
-        result = cursor.fetchone()
-        if result:
-            # Convert the stored string back to a list
-            query_embedding = parse_embedding_from_string(result[0])
-        else:
-            raise ValueError("No documents found in database")
-        cursor.close()
-    
-    # Get all documents and their embeddings from Snowflake
-    cursor = conn.cursor(DictCursor)
-    cursor.execute("SELECT KEY, WIDTH, HEIGHT, EMBEDDING FROM multimodal_documents")
-    results = cursor.fetchall()
-    cursor.close()
+        query_embeddings = [retriever.demo_embedding()] * len(queries)
     
-    # Calculate similarities using Python
-    similarities = []
-    query_embedding_array = np.array(query_embedding).reshape(1, -1)
-    
-    for result in results:
-        # Parse embedding from string
-        doc_embedding = parse_embedding_from_string(result['EMBEDDING'])
-        doc_embedding_array = np.array(doc_embedding).reshape(1, -1)
-        
-        # Calculate cosine similarity
-        similarity = cosine_similarity(query_embedding_array, doc_embedding_array)[0][0]
-        
-        similarities.append({
-            'key': result['KEY'],
-            'width': result['WIDTH'],
-            'height': result['HEIGHT'],
-            'similarity_score': similarity
-        })
-    
-    # Sort by similarity and get top results
-    similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
-    top_results = similarities[:2]
+    # Metadata filters select the candidate rows before any similarity is computed
+    return retriever.search(query_embeddings, k=k, threshold=threshold, filters=filters)
+
+def get_information_for_question_answering(conn, user_query: str, serverless_url: str = None,
+                                           document_type: str = None, source_file: str = None,
+                                           modality: str = None, k: int = None,
+                                           threshold: float = None, retriever: Retriever = None) -> List[str]:
+    """
+    Retrieve information using vector search.
+    Uses the configured retrieval strategy (in-memory Python scoring by default).
+
+    Args:
+    conn: Snowflake connection object
+    user_query (str): The user's query string.
+    serverless_url (str): URL for the serverless embedding endpoint
+    document_type (str): Only search documents of this type (`image`, `text` or `metadata`)
+    source_file (str): Only search documents from this source file
+    modality (str): Only search imaging metadata of this modality, e.g. `MR`
+    k (int): Maximum number of results. Defaults to `SnowflakeConfig.max_results`.
+    threshold (float): Minimum similarity score. Defaults to `SnowflakeConfig.similarity_threshold`.
+    retriever (Retriever): Retrieval strategy. Defaults to `get_retriever(conn)`.
+
+    Returns:
+    List[str]: List of image keys that match the query.
+    """
+    with get_tracer().span("retrieval", kind="retrieval") as span:
+        top_results = search_many(
+            conn, [user_query], k=k, serverless_url=serverless_url, document_type=document_type,
+            source_file=source_file, modality=modality, threshold=threshold, retriever=retriever,
+        )[0]
+        if span:
+            span.set_attribute("results", len(top_results))
     
     # Extract keys
     keys = [result['key'] for result in top_results]
@@ -270,13 +294,28 @@ def create_function_declaration():
                 "user_query": {
                     "type": "string",
                     "description": "Query string to use for vector search",
-                }
+                },
+                "document_type": {
+                    "type": "string",
+                    "enum": ["image", "text", "metadata"],
+                    "description": "Optional. Only search documents of this type",
+                },
+                "modality": {
+                    "type": "string",
+                    "description": "Optional. Only search imaging metadata of this modality, e.g. MR",
+                },
             },
             "required": ["user_query"],
         },
     }
 
-def select_tool(gemini_client, LLM, tools_config, messages: List) -> FunctionCall | None:
+def get_tools_config():
+    """Shared generation config declaring the vector search tool (see generation_configs.py)"""
+    return generation_configs.get_tools_config(create_function_declaration)
+
+__getattr__ = config_constants(__name__, get_tools_config)
+
+def select_tool(gemini_client, LLM, tools_config, messages: List) -> "FunctionCall | None":
     """Use an LLM to decide which tool to call"""
     system_prompt = [
         (
@@ -287,109 +326,129 @@ def select_tool(gemini_client, LLM, tools_config, messages: List) -> FunctionCal
     ]
     
     contents = system_prompt + messages
-    response = gemini_client.models.generate_content(
-        model=LLM, contents=contents, config=tools_config
-    )
+    with get_tracer().span("llm.select_tool", kind="llm", model=LLM), \
+            get_metrics().time("llm_call_seconds", "LLM call latency", call="select_tool", model=LLM):
+        response = gemini_client.models.generate_content(
+            model=LLM, contents=contents, config=tools_config
+        )
     
     return response.candidates[0].content.parts[0].function_call
 
+def _open_image(path: str) -> Image.Image:
+    """Open and decode an image, timed as an `image` span"""
+    with get_tracer().span("image.decode", kind="image", path=path), \
+            get_metrics().time("image_decode_seconds", "Time to open and decode an image"):
+        image = Image.open(path)
+        image.load()
+    get_metrics().counter("images_loaded_total", "Images decoded for LLM context").inc()
+    return image
+
+def load_file_for_context(image_path: str):
+    """Load an image or text document so it can be passed to the LLM, or None if unreadable"""
+    try:
+        if parse_page_key(image_path) is not None:
+            # PDF page ingested without rendering: render it (or reuse the cached render) now
+            with get_tracer().span("image.render_page", kind="image", key=image_path):
+                return _open_image(resolve_image_path(image_path))
+        if os.path.exists(image_path):
+            # Check if it's an image file
+            if image_path.lower().endswith(IMAGE_EXTENSIONS):
+                return _open_image(image_path)
+            # For text files, read the content and add as text
+            try:
+                with get_tracer().span("document.read", kind="document", path=image_path):
+                    if image_path.lower().endswith('.docx'):
+                        # Handle DOCX files (text is cached, so repeated answers do not re-parse them)
+                        text_content = get_docx_text(image_path)
+                    else:
+                        # Handle regular text files
+                        with open(image_path, 'r', encoding='utf-8') as f:
+                            text_content = f.read()
+                
+                # Limit content length to avoid token limits
+                if len(text_content) > 8000:
+                    text_content = text_content[:8000] + "... [truncated]"
+                
+                return f"Document content from {image_path}:\n{text_content}"
+            except Exception as text_error:
+                print(f"Warning: Could not read text file {image_path}: {text_error}")
+        else:
+            print(f"Warning: File not found: {image_path}")
+    except Exception as e:
+        print(f"Warning: Could not load file {image_path}: {e}")
+    return None
+
 def generate_answer(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "") -> str:
-    """Execute any tools and generate a response"""
-    # Create tools config
-    function_declaration = create_function_declaration()
-    tools = types.Tool(function_declarations=[function_declaration])
-    tools_config = types.GenerateContentConfig(tools=[tools], temperature=0.0)
-    
-    # Use the select_tool function to get the tool config
-    tool_call = select_tool(gemini_client, LLM, tools_config, [user_query])
-    
-    # If a tool call is found and the name matches
-    if (
-        tool_call is not None
-        and tool_call.name == "get_information_for_question_answering"
-    ):
-        print(f"Agent: Calling tool: {tool_call.name}")
-        # Call the tool with the arguments extracted by the LLM
-        tool_images = get_information_for_question_answering(conn, **tool_call.args, serverless_url=serverless_url)
-        # Add images returned by the tool to the list of input images
-        images.extend(tool_images)
-
-    system_prompt = f"Answer the questions based on the provided context only. If the context is not sufficient, say I DON'T KNOW. DO NOT use any other information to answer the question."
-    
-    # Pass the system prompt, user query, and content retrieved using vector search
-    contents = [system_prompt] + [user_query]
-    
-    # Add images if they exist
-    for image_path in images:
-        try:
-            if os.path.exists(image_path):
-                # Check if it's an image file
-                if image_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                    contents.append(Image.open(image_path))
-                else:
-                    # For text files, read the content and add as text
-                    try:
-                        if image_path.lower().endswith('.docx'):
-                            # Handle DOCX files
-                            from docx import Document
-                            doc = Document(image_path)
-                            text_content = ""
-                            for paragraph in doc.paragraphs:
-                                text_content += paragraph.text + "\n"
-                            for table in doc.tables:
-                                for row in table.rows:
-                                    for cell in row.cells:
-                                        text_content += cell.text + " "
-                                    text_content += "\n"
-                        else:
-                            # Handle regular text files
-                            with open(image_path, 'r', encoding='utf-8') as f:
-                                text_content = f.read()
-                        
-                        # Limit content length to avoid token limits
-                        if len(text_content) > 8000:
-                            text_content = text_content[:8000] + "... [truncated]"
-                        
-                        contents.append(f"Document content from {image_path}:\n{text_content}")
-                    except Exception as text_error:
-                        print(f"Warning: Could not read text file {image_path}: {text_error}")
-            else:
-                print(f"Warning: File not found: {image_path}")
-        except Exception as e:
-            print(f"Warning: Could not load file {image_path}: {e}")
-
-    # Get the response from the LLM
-    response = gemini_client.models.generate_content(
-        model=LLM,
-        contents=contents,
-        config=types.GenerateContentConfig(temperature=0.0),
-    )
-    answer = response.text
+    """Execute any tools and generate a response
+
+    The turn is traced as an `agent.turn` span; `get_tracer().last_trace()` returns its spans.
+    """
+    with get_tracer().span("agent.turn", kind="agent"):
+        # Use the select_tool function to get the tool config
+        tool_call = select_tool(gemini_client, LLM, get_tools_config(), [user_query])
+        
+        # If a tool call is found and the name matches
+        if (
+            tool_call is not None
+            and tool_call.name == "get_information_for_question_answering"
+        ):
+            print(f"Agent: Calling tool: {tool_call.name}")
+            # Call the tool with the arguments extracted by the LLM
+            tool_images = get_information_for_question_answering(conn, **tool_call.args, serverless_url=serverless_url)
+            # Add images returned by the tool to the list of input images
+            images.extend(tool_images)
+
+        system_prompt = f"Answer the questions based on the provided context only. If the context is not sufficient, say I DON'T KNOW. DO NOT use any other information to answer the question."
+        
+        # Pass the system prompt, user query, and content retrieved using vector search
+        contents = [system_prompt] + [user_query]
+        
+        # Add images and documents if they exist
+        for image_path in images:
+            item = load_file_for_context(image_path)
+            if item is not None:
+                contents.append(item)
+
+        # Get the response from the LLM
+        with get_tracer().span("llm.generate_answer", kind="llm", model=LLM, parts=len(contents)), \
+                get_metrics().time("llm_call_seconds", "LLM call latency", call="answer", model=LLM):
+            response = gemini_client.models.generate_content(
+                model=LLM,
+                contents=contents,
+                config=get_answer_config(),
+            )
+            answer = response.text
     return answer
 
-def execute_agent(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "") -> None:
-    """Execute the agent."""
-    response = generate_answer(conn, gemini_client, LLM, user_query, images, serverless_url)
+def execute_agent(conn, gemini_client, LLM, user_query: str, images: List = [], serverless_url: str = "",
+                  request_id: str = None) -> None:
+    """Execute the agent. With PROFILE_MODE set, the turn is profiled under `request_id`."""
+    with get_profiler().profile("execute_agent", request_id) as profile_path:
+        response = generate_answer(conn, gemini_client, LLM, user_query, images, serverless_url)
     print("Agent:", response)
+    print("Latency:", format_breakdown(latency_breakdown(get_tracer().last_trace())))
+    if profile_path:
+        print("Profile:", profile_path)
 
 # Memory functions (simplified versions)
 def store_chat_message(conn, session_id: str, role: str, message_type: str, content: str) -> None:
     """Create chat history document and store it in Snowflake"""
-    cursor = conn.cursor()
-    
     insert_query = """
     INSERT INTO chat_history (session_id, role, message_type, content)
     VALUES (%s, %s, %s, %s)
     """
     
-    cursor.execute(insert_query, (session_id, role, message_type, content))
-    cursor.close()
-    conn.commit()
+    with get_tracer().span("history.store", kind="history", role=role, message_type=message_type):
+        cursor = conn.cursor()
+        cursor.execute(insert_query, (session_id, role, message_type, content))
+        cursor.close()
+        conn.commit()
+    metrics = get_metrics()
+    metrics.counter("history_messages_written_total", "Chat history messages stored", message_type=message_type).inc()
+    metrics.counter("db_commits_total", "Commits issued", operation="history").inc()
 
 def retrieve_session_history(conn, session_id: str) -> List:
     """Retrieve chat history for a particular session."""
-    cursor = conn.cursor(DictCursor)
-    
     query = """
     SELECT role, message_type, content, timestamp
     FROM chat_history
@@ -397,16 +456,23 @@ def retrieve_session_history(conn, session_id: str) -> List:
     ORDER BY timestamp ASC
     """
     
-    cursor.execute(query, (session_id,))
-    results = cursor.fetchall()
-    cursor.close()
+    with get_tracer().span("history.retrieve", kind="history") as span:
+        cursor = dict_cursor(conn)
+        cursor.execute(query, (session_id,))
+        results = cursor.fetchall()
+        cursor.close()
+        if span:
+            span.set_attribute("messages", len(results))
+    metrics = get_metrics()
+    metrics.histogram("history_rows_read", "Chat history rows read per session lookup").observe(len(results))
+    metrics.counter("db_rows_read_total", "Rows fetched from Snowflake", table="chat_history").inc(len(results))
     
     messages = []
     for msg in results:
         if msg['message_type'] == 'text':
             messages.append(msg['content'])
         elif msg['message_type'] == 'image':
-            messages.append(Image.open(msg['content']))
+            messages.append(_open_image(msg['content']))
     
     return messages
 
@@ -8,11 +8,30 @@ and common operations used throughout the Snowflake multimodal agent system.
 import json
 import os
 import hashlib
-from typing import List, Dict, Any, Optional
-import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
 from PIL import Image
-import snowflake.connector
-from snowflake.connector import DictCursor
+from corpus_stats import ensure_stats_table, get_stats, invalidate_stats, update_stats
+from embedding_codec import format_embedding_for_snowflake
+from history_retention import run_retention
+from metrics import get_metrics
+from server_search import SNOWFLAKE_VECTOR_CAST
+from vector_index import find_near_duplicates
+
+def dict_cursor(conn):
+    """
+    Open a cursor that returns rows as dicts
+
+    snowflake.connector is imported here rather than at module level, since it is
+    slow to import and only needed once a connection exists.
+
+    Args:
+        conn: Snowflake connection object
+
+    Returns:
+        DictCursor: Cursor returning each row as a dict keyed by column name
+    """
+    from snowflake.connector import DictCursor
+    return conn.cursor(DictCursor)
 
 def validate_embedding_format(embedding: List[float], expected_dimensions: int = 1024) -> bool:
     """
@@ -82,6 +101,47 @@ def create_image_hash(image_path: str) -> str:
             hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
+def collapse_near_duplicates(documents: List[Dict[str, Any]],
+                             similarity_threshold: float = 0.995) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Drop documents that duplicate an earlier document before ingestion
+    
+    Files with identical content (same `create_image_hash`) and documents whose
+    embeddings are nearly identical are collapsed onto the first occurrence.
+    
+    Args:
+        documents: Documents with a `key` and, optionally, an `embedding`
+        similarity_threshold: Cosine similarity at or above which embeddings are duplicates
+        
+    Returns:
+        Tuple of the unique documents and a mapping of duplicate key -> kept key
+    """
+    duplicates = {}
+    
+    # Exact duplicates: same file content
+    unique_docs = []
+    first_by_hash = {}
+    for doc in documents:
+        if os.path.isfile(doc['key']):
+            file_hash = create_image_hash(doc['key'])
+            if file_hash in first_by_hash:
+                duplicates[doc['key']] = first_by_hash[file_hash]
+                continue
+            first_by_hash[file_hash] = doc['key']
+        unique_docs.append(doc)
+    
+    # Near duplicates: nearly identical embeddings
+    embedded = [doc for doc in unique_docs if doc.get('embedding') is not None]
+    canonical = find_near_duplicates([doc['embedding'] for doc in embedded], similarity_threshold)
+    dropped = set()
+    for position, doc in enumerate(embedded):
+        if canonical[position] != position:
+            duplicates[doc['key']] = embedded[canonical[position]]['key']
+            dropped.add(id(doc))
+    
+    unique_docs = [doc for doc in unique_docs if id(doc) not in dropped]
+    return unique_docs, duplicates
+
 def validate_image_file(image_path: str) -> bool:
     """
     Validate that an image file exists and is readable
@@ -106,6 +166,9 @@ def batch_insert_documents(cursor, documents: List[Dict[str, Any]], batch_size:
     """
     Insert documents in batches for better performance
     
+    The corpus statistics do not see these rows; call corpus_stats.invalidate_stats
+    once the inserts are committed.
+    
     Args:
         cursor: Snowflake cursor object
         documents: List of document dictionaries
@@ -139,76 +202,227 @@ def batch_insert_documents(cursor, documents: List[Dict[str, Any]], batch_size:
     
     return total_inserted
 
-def get_document_statistics(conn) -> Dict[str, Any]:
+def ensure_content_hash_column(conn) -> None:
     """
-    Get statistics about documents in the database
+    Add the content_hash column used by upsert_documents if it is missing
     
     Args:
         conn: Snowflake connection object
+    """
+    cursor = conn.cursor()
+    cursor.execute("ALTER TABLE multimodal_documents ADD COLUMN IF NOT EXISTS content_hash STRING")
+    cursor.close()
+
+def compute_content_hash(width: Any, height: Any, embedding_str: str) -> str:
+    """
+    Hash the stored fields of a document to detect changed rows
+    
+    Args:
+        width: Image width
+        height: Image height
+        embedding_str: Embedding as formatted for Snowflake
         
     Returns:
-        Dict containing document statistics
+        str: MD5 hash of the row contents
     """
-    cursor = conn.cursor(DictCursor)
-    
-    # Get total count
-    cursor.execute("SELECT COUNT(*) as total_docs FROM multimodal_documents")
-    total_docs = cursor.fetchone()['total_docs']
-    
-    # Get average dimensions
-    cursor.execute("""
-        SELECT 
-            AVG(width) as avg_width,
-            AVG(height) as avg_height,
-            MIN(width) as min_width,
-            MIN(height) as min_height,
-            MAX(width) as max_width,
-            MAX(height) as max_height
-        FROM multimodal_documents
-    """)
-    dimension_stats = cursor.fetchone()
+    return hashlib.md5(f"{width}|{height}|{embedding_str}".encode("utf-8")).hexdigest()
+
+# Session-scoped table the rows of an upsert are staged in before the MERGE
+UPSERT_STAGE = "multimodal_documents_stage"
+
+def upsert_documents(conn, documents: List[Dict[str, Any]], batch_size: int = 500,
+                     delete_missing: bool = False, clear_vectors: bool = False,
+                     vector_dimensions: Optional[int] = None) -> Dict[str, int]:
+    """
+    Insert new documents and update changed ones, keyed by document key
     
-    # Get recent documents
-    cursor.execute("""
-        SELECT key, created_at
-        FROM multimodal_documents
-        ORDER BY created_at DESC
-        LIMIT 5
-    """)
-    recent_docs = cursor.fetchall()
+    Each row stores a hash of its contents, so re-loading the same data writes
+    nothing and a changed embedding rewrites only that row. The new, changed and
+    deleted rows are staged in a temporary table and applied with a single MERGE.
+    The MERGE and the matching update of the corpus statistics (see corpus_stats.py)
+    run in one explicit transaction, so readers see either the old or the new corpus.
     
-    cursor.close()
+    The local SQLite stand-in has no MERGE; it gets the same changes as batched
+    INSERT, UPDATE and DELETE statements in one transaction.
+    
+    Args:
+        conn: Snowflake connection object
+        documents: Documents with `key`, `embedding` and optionally `width` and `height`
+        batch_size: Number of rows per executemany call
+        delete_missing: Also delete stored documents whose key is not in `documents`
+        clear_vectors: Reset `embedding_vector` on updated rows so it is re-cast (server-side search)
+        vector_dimensions: Set when the `embedding` column is `VECTOR(FLOAT, n)` (as in snowflake_setup.sql)
+            rather than STRING; the MERGE then casts the staged strings to vectors of this size
+        
+    Returns:
+        Dict[str, int]: Counts of `inserted`, `updated`, `unchanged` and `deleted` documents
+    """
+    ensure_stats_table(conn)
+    use_merge = getattr(conn, "dialect", "snowflake") != "sqlite"
+    cursor = conn.cursor()
+    if use_merge:
+        # DDL commits implicitly in Snowflake, so the stage is created before the transaction starts
+        cursor.execute(f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {UPSERT_STAGE} (
+            key STRING, width INTEGER, height INTEGER, embedding STRING, content_hash STRING, deleted BOOLEAN
+        )
+        """)
+        cursor.execute("BEGIN")
+    try:
+        # Stored (content_hash, width, height) by key; the dimensions keep the statistics exact
+        if delete_missing:
+            cursor.execute("SELECT key, content_hash, width, height FROM multimodal_documents")
+            stored = {key: (content_hash, width, height) for key, content_hash, width, height in cursor.fetchall()}
+        else:
+            # Only look up the keys being loaded, so small batches do not scan the whole table
+            keys = list(dict.fromkeys(doc['key'] for doc in documents))
+            stored = {}
+            for i in range(0, len(keys), batch_size):
+                chunk = keys[i:i + batch_size]
+                cursor.execute(
+                    f"SELECT key, content_hash, width, height FROM multimodal_documents "
+                    f"WHERE key IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk,
+                )
+                stored.update((key, (content_hash, width, height)) for key, content_hash, width, height in cursor.fetchall())
+        
+        # (key, width, height, embedding, content_hash) of new and changed rows
+        inserts, updates = [], []
+        resized = []
+        seen_keys = set()
+        for doc in documents:
+            if doc['key'] in seen_keys:
+                continue
+            seen_keys.add(doc['key'])
+            width, height = doc.get('width', 0), doc.get('height', 0)
+            embedding_str = format_embedding_for_snowflake(doc['embedding'])
+            content_hash = compute_content_hash(width, height, embedding_str)
+            
+            if doc['key'] not in stored:
+                inserts.append((doc['key'], width, height, embedding_str, content_hash))
+            elif stored[doc['key']][0] != content_hash:
+                updates.append((doc['key'], width, height, embedding_str, content_hash))
+                _, old_width, old_height = stored[doc['key']]
+                if (old_width, old_height) != (width, height):
+                    resized.append((old_width, old_height, width, height))
+        
+        deletes = [key for key in stored if key not in seen_keys] if delete_missing else []
+        
+        if use_merge:
+            _merge_staged_rows(cursor, inserts + updates, deletes, batch_size, clear_vectors, vector_dimensions)
+        else:
+            _apply_rows(cursor, inserts, updates, deletes, batch_size, clear_vectors)
+        
+        if inserts or resized or deletes:
+            update_stats(conn,
+                         inserted=[(key, width, height) for key, width, height, _, _ in inserts],
+                         updated=resized,
+                         deleted=[(key, stored[key][1], stored[key][2]) for key in deletes])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
     
-    return {
-        'total_documents': total_docs,
-        'dimension_statistics': dimension_stats,
-        'recent_documents': recent_docs
+    counts = {
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'unchanged': len(seen_keys) - len(inserts) - len(updates),
+        'deleted': len(deletes),
     }
+    metrics = get_metrics()
+    metrics.counter("db_commits_total", "Commits issued", operation="upsert").inc()
+    for result, count in counts.items():
+        metrics.counter("ingest_documents_total", "Documents processed by ingestion", result=result).inc(count)
+    return counts
+
+def _merge_staged_rows(cursor, rows: List[Tuple], deletes: List[str], batch_size: int,
+                       clear_vectors: bool, vector_dimensions: Optional[int] = None) -> None:
+    """Stage new, changed and deleted rows and apply them to multimodal_documents with one MERGE"""
+    staged = [row + (False,) for row in rows] + [(key, None, None, None, None, True) for key in deletes]
+    if not staged:
+        return
+    cursor.execute(f"DELETE FROM {UPSERT_STAGE}")
+    # The connector sends an executemany INSERT as one multi-row INSERT
+    for i in range(0, len(staged), batch_size):
+        cursor.executemany(
+            f"INSERT INTO {UPSERT_STAGE} (key, width, height, embedding, content_hash, deleted) "
+            f"VALUES (%s, %s, %s, %s, %s, %s)",
+            staged[i:i + batch_size],
+        )
+    # The stage holds comma-separated strings; a VECTOR column needs them cast
+    embedding = "stage.embedding" if vector_dimensions is None else SNOWFLAKE_VECTOR_CAST.format(
+        value="stage.embedding", dimensions=vector_dimensions)
+    cursor.execute(f"""
+    MERGE INTO multimodal_documents target
+    USING {UPSERT_STAGE} stage
+    ON target.key = stage.key
+    WHEN MATCHED AND stage.deleted THEN DELETE
+    WHEN MATCHED THEN UPDATE SET
+        width = stage.width, height = stage.height, embedding = {embedding},
+        content_hash = stage.content_hash{', embedding_vector = NULL' if clear_vectors else ''}
+    WHEN NOT MATCHED AND NOT stage.deleted THEN
+        INSERT (key, width, height, embedding, content_hash)
+        VALUES (stage.key, stage.width, stage.height, {embedding}, stage.content_hash)
+    """)
 
-def cleanup_old_sessions(conn, days_old: int = 30) -> int:
+def _apply_rows(cursor, inserts: List[Tuple], updates: List[Tuple], deletes: List[str], batch_size: int,
+                clear_vectors: bool) -> None:
+    """Apply the same changes as `_merge_staged_rows` statement by statement (SQLite stand-in)"""
+    insert_query = """
+    INSERT INTO multimodal_documents (key, width, height, embedding, content_hash)
+    VALUES (%s, %s, %s, %s, %s)
     """
-    Clean up old chat history sessions
+    update_query = f"""
+    UPDATE multimodal_documents
+    SET width = %s, height = %s, embedding = %s, content_hash = %s{', embedding_vector = NULL' if clear_vectors else ''}
+    WHERE key = %s
+    """
+    delete_query = "DELETE FROM multimodal_documents WHERE key = %s"
+    
+    rows_by_query = (
+        (insert_query, inserts),
+        (update_query, [(width, height, embedding, content_hash, key)
+                        for key, width, height, embedding, content_hash in updates]),
+        (delete_query, [(key,) for key in deletes]),
+    )
+    for query, rows in rows_by_query:
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(query, rows[i:i + batch_size])
+
+def get_document_statistics(conn) -> Dict[str, Any]:
+    """
+    Get statistics about documents in the database
+    
+    Answered from the running aggregates kept by upsert_documents, so polling it
+    reads one row instead of aggregating the whole table (see corpus_stats.py).
     
     Args:
         conn: Snowflake connection object
-        days_old: Number of days to keep history
         
     Returns:
-        int: Number of records deleted
+        Dict containing document statistics
     """
-    cursor = conn.cursor()
-    
-    delete_query = """
-    DELETE FROM chat_history
-    WHERE timestamp < DATEADD(day, -%s, CURRENT_TIMESTAMP())
+    return get_stats(conn).as_statistics()
+
+def cleanup_old_sessions(conn, days_old: int = 30, **options) -> int:
     """
+    Clean up old chat history sessions
     
-    cursor.execute(delete_query, (days_old,))
-    deleted_count = cursor.rowcount
-    cursor.close()
-    conn.commit()
+    Expired messages are archived to gzipped JSON lines and deleted in bounded
+    batches by the retention job (see history_retention.py), resuming an
+    interrupted run.
     
-    return deleted_count
+    Args:
+        conn: Snowflake connection object
+        days_old: Number of days to keep history
+        **options: Further RetentionJob arguments (`batch_size`, `archive_dir`, `pause_seconds`)
+        
+    Returns:
+        int: Number of records deleted
+    """
+    return run_retention(conn, days_old, **options)['rows_deleted']
 
 def export_embeddings_to_json(conn, output_file: str) -> bool:
     """
@@ -222,7 +436,7 @@ def export_embeddings_to_json(conn, output_file: str) -> bool:
         bool: True if successful, False otherwise
     """
     try:
-        cursor = conn.cursor(DictCursor)
+        cursor = dict_cursor(conn)
         
         query = """
         SELECT key, width, height, embedding
@@ -354,8 +568,29 @@ def restore_from_backup(conn) -> bool:
         
         cursor.close()
         conn.commit()
+        invalidate_stats(conn)
         return True
         
     except Exception as e:
         print(f"Restore error: {e}")
         return False
+
+def parse_tool_questions(answer: str) -> List[str]:
+    """
+    Extract the tool questions from a ReAct reasoning step
+
+    Args:
+        answer (str): Text generated by the reasoning step
+
+    Returns:
+        List[str]: Questions following each `TOOL:` marker, in order and without duplicates
+    """
+    questions = []
+    for line in answer.splitlines():
+        line = line.strip()
+        if not line.upper().startswith("TOOL:"):
+            continue
+        question = line[len("TOOL:"):].strip()
+        if question and question not in questions:
+            questions.append(question)
+    return questions
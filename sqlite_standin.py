@@ -0,0 +1,97 @@
+"""
+Local SQLite stand-in for the multimodal_documents table
+
+Registers VECTOR_COSINE_SIMILARITY and a vector cast as SQL functions and accepts
+the connector's `%s` placeholders, so the same SQL that server_search runs in
+Snowflake can be executed (and timed) locally without credentials.
+"""
+
+import sqlite3
+
+import numpy as np
+
+from embedding_codec import parse_embedding_from_string
+
+# SQLite has no typed vectors; the cast just keeps the comma-separated string
+SQLITE_VECTOR_CAST = "TO_VECTOR({value})"
+
+def cosine(a, b):
+    a, b = parse_embedding_from_string(a), parse_embedding_from_string(b)
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+class SQLiteCursor:
+    """
+    Cursor translating the connector's %s placeholders and recording the rows fetched
+
+    With `dict_rows` (a DictCursor was requested) rows are dicts keyed by column
+    name in both lower and upper case, as unquoted Snowflake identifiers come back
+    upper case.
+    """
+
+    def __init__(self, connection, dict_rows=False):
+        self.connection = connection
+        self.cursor = connection.sqlite.cursor()
+        self.dict_rows = dict_rows
+
+    def _row(self, row):
+        if not self.dict_rows or row is None:
+            return row
+        names = [column[0] for column in self.cursor.description]
+        return {**dict(zip(names, row)), **{name.upper(): value for name, value in zip(names, row)}}
+
+    def execute(self, sql, params=()):
+        # The stand-in table already has every column; SQLite lacks ADD COLUMN IF NOT EXISTS
+        if sql.strip().startswith("ALTER TABLE"):
+            return
+        self.cursor.execute(sql.replace("%s", "?"), list(params))
+
+    def executemany(self, sql, rows):
+        self.cursor.executemany(sql.replace("%s", "?"), rows)
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.connection.rows_fetched += len(rows)
+        return [self._row(row) for row in rows]
+
+    def fetchone(self):
+        return self._row(self.cursor.fetchone())
+
+    def close(self):
+        self.cursor.close()
+
+class SQLiteConnection:
+    """In-memory database with the multimodal_documents (including the search columns) and chat_history tables"""
+
+    # Lets writers that use Snowflake-only statements such as MERGE fall back to plain SQL
+    dialect = "sqlite"
+
+    def __init__(self):
+        self.sqlite = sqlite3.connect(":memory:", check_same_thread=False)
+        self.sqlite.create_function("VECTOR_COSINE_SIMILARITY", 2, cosine, deterministic=True)
+        self.sqlite.create_function("TO_VECTOR", 1, lambda value: value, deterministic=True)
+        self.sqlite.execute("""
+            CREATE TABLE multimodal_documents (
+                key TEXT, width INTEGER, height INTEGER, embedding TEXT,
+                embedding_vector TEXT, document_type TEXT, source_file TEXT, modality TEXT, content_hash TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.sqlite.execute("""
+            CREATE TABLE chat_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, role TEXT, message_type TEXT,
+                content TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.rows_fetched = 0
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self, dict_rows=cursor_class is not None)
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def rollback(self):
+        self.sqlite.rollback()
+
+    def close(self):
+        self.sqlite.close()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test the fake Gemini/embedding backends and the agent load generator
+
+Everything runs locally: the embedding stand-in is a real HTTP server on
+127.0.0.1, so the same request code as in production is exercised.
+"""
+
+import time
+
+import pytest
+
+from benchmark_agent import run_load
+from fake_backends import FakeEmbeddingBackend, FakeEmbeddingServer, FakeGeminiClient
+from snowflake_agent import SnowflakeAgent
+from snowflake_solution_working_final import TOOLS_CONFIG, embed_queries
+
+def test_embeddings_are_deterministic_unit_vectors():
+    backend = FakeEmbeddingBackend(dimensions=16)
+    first, second = backend.embed(["a", "b"])
+    assert backend.embed("a") == [first]
+    assert first != second
+    assert sum(v * v for v in first) == pytest.approx(1.0)
+    assert backend.latency.calls == 2
+
+def test_embedding_server_speaks_the_serverless_protocol():
+    with FakeEmbeddingServer(dimensions=8) as server:
+        single = embed_queries(["query"], server.url)
+        batch = embed_queries(["query", "other"], server.url)
+    assert single == [server.backend.vector("query")]
+    assert batch == [server.backend.vector("query"), server.backend.vector("other")]
+
+def test_queries_are_sent_one_at_a_time_to_single_input_endpoints():
+    with FakeEmbeddingServer(dimensions=8, batching=False) as server:
+        batch = embed_queries(["query", "other"], server.url)
+        assert batch == [server.backend.vector("query"), server.backend.vector("other")]
+        assert server.requests == 3
+        # The endpoint is remembered, so the list is not sent again
+        embed_queries(["query", "other"], server.url)
+        assert server.requests == 5
+
+def test_fake_gemini_latency_and_tool_calls():
+    client = FakeGeminiClient(latency_seconds=0.02)
+    started = time.perf_counter()
+    response = client.models.generate_content(model="m", contents=["prompt", "what is x"], config=TOOLS_CONFIG)
+    assert time.perf_counter() - started >= 0.02
+
+    call = response.candidates[0].content.parts[0].function_call
+    assert (call.name, call.args) == ("get_information_for_question_answering", {"user_query": "what is x"})
+    assert client.models.generate_content(model="m", contents=["q"]).text == \
+        client.models.generate_content(model="m", contents=["q"]).text
+
+    no_tools = FakeGeminiClient(tool_call_rate=0.0)
+    response = no_tools.models.generate_content(model="m", contents=["q"], config=TOOLS_CONFIG)
+    assert response.candidates[0].content.parts[0].function_call is None
+
+def test_react_loop_with_fake_client():
+    """The ReAct prompt gets a TOOL step first, then an answer once context was retrieved"""
+    retrieved = []
+    agent = SnowflakeAgent(None, gemini_client=FakeGeminiClient(), LLM="fake", serverless_url="")
+    agent.retrieve = lambda questions: retrieved.extend(questions) or ["missing.png"]
+    agent._load_files = lambda paths: ["context"] * len(paths)
+
+    assert agent.generate_answer_react("what is x").startswith("ANSWER:")
+    assert retrieved == ["what is x"]
+
+@pytest.mark.parametrize("mode", ["basic", "memory", "react"])
+def test_load_generator_reports_overhead(mode, tmp_path):
+    report = run_load(mode, sessions=2, turns=2, corpus_size=10, dimensions=16,
+                      llm_latency=0.01, workdir=str(tmp_path))
+
+    assert report["turns"] == 4
+    assert report["turns_per_second"] > 0 and report["p99_ms"] >= report["p50_ms"]
+    assert report["llm_calls"] == 8  # tool selection + answer, or two ReAct steps
+    assert report["embedding_calls"] == 4
+    assert report["model_seconds"] == pytest.approx(0.08)
+    # Model time is excluded from the overhead
+    assert 0 < report["overhead_fraction"] < 1
+    # overhead_seconds is rounded to 0.1 ms, so allow for that
+    assert report["overhead_ms_per_turn"] == pytest.approx(report["overhead_seconds"] / 4 * 1000, abs=0.05)
+    assert "image" in report["overhead_breakdown"]
+    if mode == "memory":
+        assert "history" in report["overhead_breakdown"]
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        run_load("batch")
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
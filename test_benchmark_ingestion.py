@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test the ingestion benchmark on a handful of generated documents
+
+Runs every stage against the SQLite stand-in in a temporary directory and checks
+the regression check against a stored baseline.
+"""
+
+import os
+
+from benchmark_ingestion import compare_to_baseline, generate_docx_files, generate_pdfs, run_benchmark
+
+def test_generated_inputs(tmp_path):
+    pdfs = generate_pdfs(str(tmp_path / "pdfs"), count=2, pages=3)
+    docs = generate_docx_files(str(tmp_path / "text"), count=2, paragraphs=3)
+    assert [os.path.basename(p) for p in pdfs] == ["report_0.pdf", "report_1.pdf"]
+    assert all(os.path.getsize(p) > 0 for p in pdfs + docs)
+
+def test_all_stages_are_measured(tmp_path):
+    cwd = os.getcwd()
+    results = run_benchmark(str(tmp_path), pdfs=1, pages=2, docx_files=2, paragraphs=3,
+                            embeddings=20, dimensions=8, workers=1)
+
+    assert os.getcwd() == cwd
+    assert [(r["stage"], r["unit"], r["items"]) for r in results] == [
+        ("render", "pages", 2), ("extract", "files", 2), ("encode", "embeddings", 20),
+        ("load", "documents", 20), ("pipeline", "documents", 4),
+    ]
+    for record in results:
+        assert record["items_per_second"] > 0 and record["mb_per_second"] > 0 and record["peak_rss_mb"] > 0
+    # Rendered pages and caches stay inside the scratch directory
+    assert len(os.listdir(tmp_path / "data" / "images")) == 2
+
+def test_regressions_are_flagged():
+    baseline = {"results": [
+        {"stage": "render", "unit": "pages", "items_per_second": 10.0},
+        {"stage": "load", "unit": "documents", "items_per_second": 100.0},
+    ]}
+    results = [
+        {"stage": "render", "unit": "pages", "items_per_second": 9.0},
+        {"stage": "load", "unit": "documents", "items_per_second": 50.0},
+        {"stage": "encode", "unit": "embeddings", "items_per_second": 1.0},
+    ]
+
+    regressions = compare_to_baseline(results, baseline, tolerance=0.2)
+    assert regressions == ["load: 50.0 documents/s vs 100.0 in the baseline (-50%)"]
+    assert results[0]["change_vs_baseline"] == -0.1
+    assert "change_vs_baseline" not in results[2]
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
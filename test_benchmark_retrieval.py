@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test the offline retrieval benchmark on a tiny corpus
+
+Checks that the corpus is reproducible, that exact engines reach full recall and
+that every record has the fields the JSON report is read by.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from benchmark_retrieval import (IVFEngine, PythonLoopEngine, RetrieverEngine, SQLPushdownEngine, VectorIndexEngine,
+                                 exact_top_k, generate_corpus, generate_queries, run_benchmark)
+
+def test_corpus_is_reproducible():
+    first = generate_corpus(200, dimensions=16, seed=3, chunk_size=64)
+    second = generate_corpus(200, dimensions=16, seed=3)
+    assert first.keys == second.keys
+    assert first.vectors.dtype == np.float32 and first.vectors.shape == (200, 16)
+    assert any(key.endswith(".docx") for key in first.keys)
+
+def test_memmap_corpus(tmp_path):
+    corpus = generate_corpus(100, dimensions=8, memmap_dir=str(tmp_path))
+    assert isinstance(corpus.vectors, np.memmap)
+    assert np.array_equal(np.asarray(corpus.vectors), generate_corpus(100, dimensions=8).vectors)
+
+def test_ivf_keeps_a_memmap_corpus_on_disk(tmp_path):
+    """IVF over a memory-mapped corpus writes its reordered lists to disk and finds the same rows"""
+    in_memory = generate_corpus(500, dimensions=16)
+    mapped = generate_corpus(500, dimensions=16, memmap_dir=str(tmp_path))
+    queries = generate_queries(in_memory, 5)
+
+    engines = [IVFEngine(nprobe=4), IVFEngine(nprobe=4)]
+    engines[0].build(in_memory)
+    engines[1].build(mapped)
+    assert isinstance(engines[1].matrix, np.memmap) and not isinstance(engines[0].matrix, np.memmap)
+    for query in queries:
+        assert engines[0].search(query, 4) == engines[1].search(query, 4)
+
+    matrix_path = engines[1].matrix_path
+    engines[1].close()
+    assert matrix_path.startswith(str(tmp_path)) and not os.path.exists(matrix_path)
+
+def test_exact_top_k_matches_brute_force():
+    corpus = generate_corpus(300, dimensions=16)
+    queries = generate_queries(corpus, 5)
+    matrix = corpus.vectors / np.linalg.norm(corpus.vectors, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ matrix.T
+    expected = np.argsort(-scores, axis=1)[:, :4]
+    assert np.array_equal(exact_top_k(corpus, queries, 4, chunk_size=70), expected)
+
+def test_engines_report_recall_and_latency():
+    engines = [PythonLoopEngine(), VectorIndexEngine(), IVFEngine(nprobe=2), IVFEngine(nprobe=1000),
+               SQLPushdownEngine()]
+    records = list(run_benchmark([150], engines, dimensions=16, queries=8, k=5))
+
+    assert [(r["engine"], r["params"]) for r in records] == [
+        ("python-loop", {}), ("vector-index", {}), ("ivf", {"nprobe": 2}), ("ivf", {"nprobe": 1000}), ("sql", {}),
+    ]
+    for record in records:
+        assert {"qps", "p50_ms", "p99_ms", "recall_at_k", "build_seconds", "index_bytes"} <= set(record)
+        assert record["p99_ms"] >= record["p50_ms"] > 0
+    # Exact engines (and IVF probing every list) find the true top k
+    assert [r["recall_at_k"] for r in records if r["params"].get("nprobe") != 2] == [1.0] * 4
+    json.dumps(records)
+
+def test_retrieval_strategies_are_benchmarked():
+    """The retrieval.py strategies run end to end on the SQLite stand-in and find the exact top k"""
+    engines = [RetrieverEngine(mode="client", mmr_lambda=1.0), RetrieverEngine(mode="server")]
+    records = list(run_benchmark([100], engines, dimensions=16, queries=4, k=3))
+    assert [r["params"]["mode"] for r in records] == ["client", "server"]
+    assert [r["recall_at_k"] for r in records] == [1.0, 1.0]
+    assert records[1]["queries"] == 4
+
+def test_engines_above_their_size_limit_are_skipped():
+    class TinyEngine(PythonLoopEngine):
+        max_size = 10
+
+    (record,) = run_benchmark([50], [TinyEngine()], dimensions=8, queries=2, k=3)
+    assert record["skipped"] == "corpus larger than 10"
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
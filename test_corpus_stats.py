@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Test the running corpus statistics against the local SQLite stand-in
+
+After any sequence of upserts the statistics must match the full-table
+aggregates, and polling them must not touch multimodal_documents.
+"""
+
+import random
+
+import pytest
+
+import corpus_stats
+from snowflake_utils import get_document_statistics, upsert_documents
+from sqlite_standin import SQLiteConnection
+
+def documents(sizes):
+    return [{"key": key, "width": width, "height": height, "embedding": [0.1, 0.2]}
+            for key, (width, height) in sizes.items()]
+
+def full_aggregates(conn):
+    """What get_document_statistics used to compute with full-table queries"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*), AVG(width), AVG(height), MIN(width), MIN(height), MAX(width), MAX(height)
+        FROM multimodal_documents
+    """)
+    count, *dimensions = cursor.fetchone()
+    cursor.close()
+    names = ["AVG_WIDTH", "AVG_HEIGHT", "MIN_WIDTH", "MIN_HEIGHT", "MAX_WIDTH", "MAX_HEIGHT"]
+    return count, dict(zip(names, dimensions))
+
+def record_statements(conn):
+    statements = []
+    conn.sqlite.set_trace_callback(statements.append)
+    return statements
+
+def test_polling_reads_only_the_stats_row():
+    conn = SQLiteConnection()
+    upsert_documents(conn, documents({"a": (10, 20), "b": (30, 40)}))
+    get_document_statistics(conn)
+
+    statements = record_statements(conn)
+    stats = get_document_statistics(conn)
+    assert len(statements) == 1 and corpus_stats.STATS_TABLE in statements[0]
+    assert "multimodal_documents" not in statements[0]
+
+    assert stats["total_documents"] == 2
+    assert stats["dimension_statistics"] == {
+        "AVG_WIDTH": 20, "AVG_HEIGHT": 30, "MIN_WIDTH": 10, "MIN_HEIGHT": 20, "MAX_WIDTH": 30, "MAX_HEIGHT": 40,
+    }
+    conn.close()
+
+def test_upserts_keep_the_stats_current():
+    conn = SQLiteConnection()
+    assert get_document_statistics(conn)["total_documents"] == 0
+
+    upsert_documents(conn, documents({"a": (10, 20), "b": (30, 40)}))
+    upsert_documents(conn, documents({"c": (5, 50)}))
+    # Re-loading unchanged documents writes nothing
+    statements = record_statements(conn)
+    upsert_documents(conn, documents({"c": (5, 50)}))
+    assert not any(corpus_stats.STATS_TABLE in s for s in statements if s.startswith("INSERT"))
+    conn.sqlite.set_trace_callback(None)
+
+    stats = corpus_stats.read_stats(conn)
+    assert not stats.stale
+    assert [doc["KEY"] for doc in stats.recent_documents] == ["c", "b", "a"]
+    count, dimensions = full_aggregates(conn)
+    assert stats.as_statistics()["total_documents"] == count == 3
+    assert stats.as_statistics()["dimension_statistics"] == pytest.approx(dimensions)
+    conn.close()
+
+def test_removing_an_extreme_rebuilds_once():
+    conn = SQLiteConnection()
+    upsert_documents(conn, documents({"a": (10, 20), "b": (30, 40), "c": (20, 30)}))
+    get_document_statistics(conn)
+
+    # Deleting the widest document leaves the next maximum unknown
+    upsert_documents(conn, documents({"a": (10, 20), "c": (20, 30)}), delete_missing=True)
+    assert corpus_stats.read_stats(conn).stale
+
+    statements = record_statements(conn)
+    stats = get_document_statistics(conn)
+    assert any("FROM multimodal_documents" in s for s in statements)
+    assert stats["dimension_statistics"]["MAX_WIDTH"] == 20
+    assert {doc["KEY"] for doc in stats["recent_documents"]} == {"a", "c"}
+
+    statements.clear()
+    get_document_statistics(conn)
+    assert len(statements) == 1
+    conn.close()
+
+def test_random_writes_match_full_aggregates():
+    rng = random.Random(0)
+    conn = SQLiteConnection()
+    get_document_statistics(conn)
+    corpus = {}
+    for _ in range(40):
+        action = rng.random()
+        if action < 0.5 or not corpus:
+            for _ in range(rng.randint(1, 5)):
+                corpus[f"doc-{rng.randint(0, 200)}"] = (rng.randint(1, 100), rng.randint(1, 100))
+            upsert_documents(conn, documents(corpus))
+        elif action < 0.8:
+            key = rng.choice(sorted(corpus))
+            corpus[key] = (rng.randint(1, 100), rng.randint(1, 100))
+            upsert_documents(conn, documents({key: corpus[key]}))
+        else:
+            for key in rng.sample(sorted(corpus), min(len(corpus), rng.randint(1, 3))):
+                del corpus[key]
+            upsert_documents(conn, documents(corpus), delete_missing=True)
+
+        stats = get_document_statistics(conn)
+        count, dimensions = full_aggregates(conn)
+        assert stats["total_documents"] == count == len(corpus)
+        if count:
+            assert stats["dimension_statistics"] == pytest.approx(dimensions)
+        assert len(stats["recent_documents"]) == min(corpus_stats.RECENT_DOCUMENTS, count)
+    conn.close()
+
+def test_invalidate_forces_a_rebuild():
+    conn = SQLiteConnection()
+    upsert_documents(conn, documents({"a": (10, 20)}))
+    get_document_statistics(conn)
+
+    # A bulk load that bypasses upsert_documents
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO multimodal_documents (key, width, height) VALUES ('b', 50, 60)")
+    cursor.close()
+    conn.commit()
+    assert get_document_statistics(conn)["total_documents"] == 1
+
+    corpus_stats.invalidate_stats(conn)
+    assert get_document_statistics(conn)["total_documents"] == 2
+    conn.close()
+
+def stats_rows(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {corpus_stats.STATS_TABLE}")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+def test_racing_rebuilds_leave_one_row():
+    conn = SQLiteConnection()
+    upsert_documents(conn, documents({"a": (10, 20), "b": (30, 40)}))
+    # Two readers both found no statistics and rebuild them
+    assert corpus_stats.read_stats(conn) is None
+    corpus_stats.rebuild_stats(conn)
+    corpus_stats.rebuild_stats(conn)
+    assert stats_rows(conn) == 1
+
+    upsert_documents(conn, documents({"c": (5, 50)}))
+    corpus_stats.invalidate_stats(conn)
+    assert get_document_statistics(conn)["total_documents"] == 3
+    assert stats_rows(conn) == 1
+    conn.close()
+
+def test_writes_apply_deltas_with_one_update():
+    conn = SQLiteConnection()
+    upsert_documents(conn, documents({"a": (10, 20), "b": (30, 40)}))
+    get_document_statistics(conn)
+
+    statements = record_statements(conn)
+    upsert_documents(conn, documents({"a": (10, 20), "b": (30, 40), "c": (50, 60)}))
+    writes = [s for s in statements if corpus_stats.STATS_TABLE in s and not s.startswith("SELECT")]
+    assert len(writes) == 1 and writes[0].startswith("UPDATE")
+    assert "total_docs = total_docs + 1" in writes[0] and "sum_width = sum_width + 50" in writes[0]
+
+    stats = corpus_stats.read_stats(conn)
+    assert not stats.stale and stats.total_docs == 3 and stats.max_width == 50
+    assert [doc["KEY"] for doc in stats.recent_documents][0] == "c" and len(stats.recent_documents) == 3
+    conn.close()
+
+def test_recent_documents_changed_by_another_writer_are_rebuilt(monkeypatch):
+    conn = SQLiteConnection()
+    upsert_documents(conn, documents({"a": (10, 20)}))
+    get_document_statistics(conn)
+
+    # Another writer's list lands between this write's read and its UPDATE
+    read_stats = corpus_stats.read_stats
+    def read_then_race(conn):
+        stats = read_stats(conn)
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE {corpus_stats.STATS_TABLE} SET recent_documents = '[]'")
+        cursor.close()
+        return stats
+    monkeypatch.setattr(corpus_stats, "read_stats", read_then_race)
+    upsert_documents(conn, documents({"b": (30, 40)}))
+    monkeypatch.undo()
+
+    stats = corpus_stats.read_stats(conn)
+    assert stats.stale and stats.recent_documents == [] and stats.total_docs == 2
+    assert {doc["KEY"] for doc in get_document_statistics(conn)["recent_documents"]} == {"a", "b"}
+    conn.close()
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
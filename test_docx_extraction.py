@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the cached DOCX text extraction service
+
+Uses the DOCX files in data/text/ with a temporary cache directory.
+"""
+
+import shutil
+
+import pytest
+from docx import Document
+
+import docx_extraction
+from docx_extraction import DocxTextCache, extract_docx_text
+
+CAROTID = "data/text/Carotid_20.docx"
+COPY_OF_CAROTID = "data/text/Copy of Carotid_20.docx"
+TTE = "data/text/TTE_20.docx"
+
+def reference_text(path):
+    """The concatenation loop previously copied into each consumer"""
+    doc = Document(path)
+    content = ""
+    for paragraph in doc.paragraphs:
+        content += paragraph.text + "\n"
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                content += cell.text + " "
+            content += "\n"
+    return content
+
+def test_extraction_matches_previous_output():
+    for path in (CAROTID, TTE):
+        assert extract_docx_text(path) == reference_text(path)
+
+def test_cache_hits_skip_parsing(tmp_path, monkeypatch):
+    """Cached files are not parsed again, and identical copies share one entry"""
+    cache = DocxTextCache(str(tmp_path / "cache"))
+    texts = cache.extract_many([CAROTID, TTE, COPY_OF_CAROTID], workers=2)
+    assert texts[CAROTID] == reference_text(CAROTID)
+    assert texts[COPY_OF_CAROTID] == texts[CAROTID]
+    assert len(list((tmp_path / "cache").glob("*.txt"))) == 2
+
+    def fail(path):
+        raise AssertionError(f"{path} parsed again")
+
+    monkeypatch.setattr(docx_extraction, "extract_docx_text", fail)
+    fresh_cache = DocxTextCache(str(tmp_path / "cache"))
+    assert fresh_cache.extract(TTE) == texts[TTE]
+
+def test_changed_file_is_extracted_again(tmp_path):
+    """Replacing a file's contents invalidates its entry"""
+    path = tmp_path / "report.docx"
+    shutil.copy(CAROTID, path)
+    cache = DocxTextCache(str(tmp_path / "cache"))
+    assert cache.extract(str(path)) == reference_text(CAROTID)
+
+    shutil.copy(TTE, path)
+    assert cache.extract(str(path)) == reference_text(TTE)
+
+def test_corrupt_file_does_not_lose_the_others(tmp_path):
+    """A file that cannot be parsed is reported on its own, and the other files are cached"""
+    corrupt = tmp_path / "corrupt.docx"
+    corrupt.write_bytes(b"not a zip archive")
+    cache = DocxTextCache(str(tmp_path / "cache"))
+
+    errors = {}
+    texts = cache.extract_many([CAROTID, str(corrupt), TTE], workers=2, errors=errors)
+    assert set(texts) == {CAROTID, TTE} and list(errors) == [str(corrupt)]
+    assert cache.get(CAROTID) == texts[CAROTID] and cache.get(TTE) == texts[TTE]
+
+    # Without an errors dict the failure is raised, after the readable file is cached
+    with pytest.raises(Exception):
+        DocxTextCache(str(tmp_path / "other")).extract_many([str(corrupt), TTE], workers=2)
+    assert DocxTextCache(str(tmp_path / "other")).get(TTE) == texts[TTE]
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
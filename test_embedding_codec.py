@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test the shared embedding string codec
+
+Compares the formatter with the per-float loop it replaced, checks on randomized
+values from tiny to large that strings round-trip, and that older formats still parse.
+"""
+
+import numpy as np
+import pytest
+
+from embedding_codec import (
+    format_embedding_for_snowflake,
+    format_embeddings_for_snowflake,
+    parse_embedding_from_string,
+    parse_embeddings,
+)
+
+def reference_format(embedding):
+    """The formatting loop previously copied into each solution script"""
+    return ','.join(f"{val:.15f}".rstrip('0').rstrip('.') for val in embedding)
+
+def test_matches_reference_formatter():
+    """Output is byte-identical to the old loop for typical embedding values"""
+    rng = np.random.default_rng(0)
+    matrix = np.vstack([
+        rng.normal(scale=0.05, size=(20, 64)),
+        rng.uniform(-900, 900, size=(5, 64)),
+        np.round(rng.normal(size=(5, 64)), 4),
+    ])
+    assert format_embeddings_for_snowflake(matrix) == [reference_format(row) for row in matrix]
+
+def test_round_trip():
+    """Parsing a formatted embedding gives back the original values"""
+    rng = np.random.default_rng(1)
+    matrix = rng.normal(scale=0.05, size=(10, 32))
+    strings = format_embeddings_for_snowflake(matrix)
+
+    assert np.max(np.abs(parse_embeddings(strings) - matrix)) <= 1e-15
+    assert np.array_equal(parse_embedding_from_string(strings[0]), parse_embeddings(strings)[0])
+
+def random_values(rng, size):
+    """Values of both signs from 1e-20 to 1e8, with zeros and negative zeros mixed in"""
+    values = rng.choice([-1.0, 1.0], size=size) * 10.0 ** rng.uniform(-20, 8, size=size)
+    values[rng.random(size) < 0.05] = 0.0
+    values[rng.random(size) < 0.05] = -0.0
+    return values
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_values_round_trip(seed):
+    """Any value is written in fixed notation and parses back to within the 15 written decimals"""
+    rng = np.random.default_rng(seed)
+    matrix = random_values(rng, (4, 256))
+    strings = format_embeddings_for_snowflake(matrix)
+
+    assert all('e' not in s and "-0," not in s and not s.endswith(",-0") for s in strings)
+    # Same digits as the old loop, except that negative values rounding to zero are written as 0
+    assert strings == [','.join("0" if v == "-0" else v for v in reference_format(row).split(','))
+                       for row in matrix]
+    parsed = parse_embeddings(strings)
+    assert np.all(np.abs(parsed - matrix) <= 5e-16 + np.spacing(np.abs(matrix)))
+    # Values of 100 and more keep all their significant digits
+    large = np.abs(matrix) >= 100
+    assert np.array_equal(parsed[large], matrix[large])
+    assert [format_embedding_for_snowflake(row) for row in matrix] == strings
+
+def test_special_values():
+    """Tiny values stay in fixed notation, and integers and large values are written plainly"""
+    formatted = format_embedding_for_snowflake([1e-20, -0.0, 3.0, -0.5, 1e-12, 12345.25])
+    assert 'e' not in formatted
+    assert formatted == "0,0,3,-0.5,0.000000000001,12345.25"
+
+def test_parse_accepts_older_formats():
+    """Scientific notation, whitespace and brackets from VECTOR columns are accepted"""
+    assert parse_embedding_from_string(" [1e-05, -2.5,3] ").tolist() == [1e-05, -2.5, 3.0]
+    assert parse_embedding_from_string("").size == 0
+
+def test_parse_embeddings_checks_dimensions():
+    """All rows must have the same dimensions"""
+    assert parse_embeddings(["1,2", "3,4"]).shape == (2, 2)
+    with pytest.raises(ValueError):
+        parse_embeddings(["1,2", "3"])
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test the recursive file scanner
+
+Builds a small directory tree and checks recursion, extension dispatch,
+include/exclude globs and the stat fields captured during the walk.
+"""
+
+import os
+
+from file_scanner import scan_files
+
+def make_tree(root):
+    """data/ with nested images, a PDF, an MR sidecar, a cache directory and an unknown file"""
+    files = {
+        "report.pdf": b"%PDF",
+        "images/1.png": b"png",
+        "images/sub-01_T2TSE.json": b"{}",
+        "images/nested/Scan.JPG": b"jpg",
+        "text/Carotid_20.docx": b"docx",
+        "cache/old.png": b"png",
+        "notes.bin": b"",
+    }
+    for relative_path, content in files.items():
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+def test_scan_is_recursive_and_typed(tmp_path):
+    """Every known file is found once, with its kind, size and mtime"""
+    make_tree(tmp_path)
+    records = list(scan_files([str(tmp_path), str(tmp_path / "missing")]))
+
+    assert [r.relative_path for r in records] == [
+        "report.pdf",
+        "cache/old.png",
+        "images/1.png",
+        "images/sub-01_T2TSE.json",
+        "images/nested/Scan.JPG",
+        "text/Carotid_20.docx",
+    ]
+    by_path = {r.relative_path: r for r in records}
+    assert by_path["images/nested/Scan.JPG"].kind == "image"
+    assert by_path["images/nested/Scan.JPG"].extension == ".jpg"
+    assert by_path["images/sub-01_T2TSE.json"].kind == "text"
+    assert by_path["report.pdf"].size == 4
+    assert by_path["report.pdf"].mtime == os.stat(tmp_path / "report.pdf").st_mtime
+
+def test_include_and_exclude_globs(tmp_path):
+    """Excluded directories are pruned and includes restrict the files returned"""
+    make_tree(tmp_path)
+
+    images = scan_files([str(tmp_path)], include=["*.png", "*.jpg", "*.JPG"], exclude=["cache"])
+    assert [r.relative_path for r in images] == ["images/1.png", "images/nested/Scan.JPG"]
+
+    shallow = scan_files([str(tmp_path / "images")], recursive=False, exclude=["*.json"])
+    assert [r.relative_path for r in shallow] == ["1.png"]
+
+def test_custom_extension_table(tmp_path):
+    """The extension table decides which files are returned and their kind"""
+    make_tree(tmp_path)
+    records = scan_files([str(tmp_path)], extension_kinds={".bin": "binary"})
+    assert [(r.relative_path, r.kind) for r in records] == [("notes.bin", "binary")]
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test the batched chat history retention job against the local SQLite stand-in
+
+Expired messages must be archived before they are deleted, in batches bounded by
+the batch size, and an interrupted run must resume without losing messages.
+"""
+
+import glob
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from history_retention import STATE_FILE, RetentionJob, read_archive
+from snowflake_utils import cleanup_old_sessions
+from sqlite_standin import SQLiteConnection
+
+NOW = datetime(2026, 10, 1, 12, 0, 0)
+
+def history(expired=25, recent=10):
+    """A chat_history table with `expired` messages older than 30 days and `recent` newer ones"""
+    conn = SQLiteConnection()
+    rows = []
+    for n in range(expired):
+        rows.append((f"old-{n % 4}", "user", "text", f"old message {n}", NOW - timedelta(days=60, minutes=n)))
+    for n in range(recent):
+        rows.append((f"new-{n % 2}", "agent", "text", f"new message {n}", NOW - timedelta(days=1, minutes=n)))
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO chat_history (session_id, role, message_type, content, timestamp) VALUES (%s, %s, %s, %s, %s)",
+        [row[:4] + (row[4].isoformat(sep=" "),) for row in rows],
+    )
+    cursor.close()
+    conn.commit()
+    return conn
+
+def remaining(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT content FROM chat_history ORDER BY timestamp")
+    contents = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return contents
+
+def archived(archive_dir):
+    return [message for path in sorted(glob.glob(os.path.join(archive_dir, "*", "*.jsonl.gz")))
+            for message in read_archive(path)]
+
+def make_job(conn, archive_dir, **options):
+    return RetentionJob(conn, batch_size=10, archive_dir=str(archive_dir), pause_seconds=0,
+                        cutoff=NOW - timedelta(days=30), **options)
+
+def test_archives_then_deletes_in_batches(tmp_path, capsys):
+    conn = history()
+    statements = []
+    conn.sqlite.set_trace_callback(statements.append)
+    state = make_job(conn, tmp_path).run()
+
+    assert state["completed"] and state["batches"] == 3
+    assert state["rows_deleted"] == state["expired_at_start"] == 25
+    assert all(content.startswith("new") for content in remaining(conn)) and len(remaining(conn)) == 10
+
+    messages = archived(tmp_path)
+    assert len(messages) == 25 and len({m["id"] for m in messages}) == 25
+    # Oldest first, with everything needed to restore them
+    assert [m["timestamp"] for m in messages] == sorted(m["timestamp"] for m in messages)
+    assert set(messages[0]) == {"id", "session_id", "role", "message_type", "content", "timestamp"}
+
+    deletes = [s for s in statements if s.startswith("DELETE")]
+    assert len(deletes) == 3 and all("timestamp >=" in s for s in deletes)
+    assert deletes[0].count(",") == 9  # one bounded batch of 10 ids
+
+    output = capsys.readouterr().out
+    assert "Batch 1: 10 messages" in output and "(25/25, 100%)" in output
+    conn.close()
+
+def test_interrupted_run_resumes(tmp_path):
+    conn = history()
+    state = make_job(conn, tmp_path).run(max_batches=1)
+    assert not state["completed"] and state["rows_deleted"] == 10
+
+    # A later run keeps the first run's cutoff, whatever it is asked for
+    state = RetentionJob(conn, days_old=0, batch_size=10, archive_dir=str(tmp_path), pause_seconds=0).run()
+    assert state["completed"] and state["rows_deleted"] == 25 and state["batches"] == 3
+    assert len(remaining(conn)) == 10
+    assert len(os.listdir(tmp_path)) == 1
+    assert len(archived(tmp_path)) == 25
+
+    with open(os.path.join(glob.glob(str(tmp_path / "*"))[0], STATE_FILE)) as f:
+        assert json.load(f)["completed"]
+    conn.close()
+
+def test_failed_delete_loses_nothing(tmp_path, monkeypatch):
+    conn = history()
+    job = make_job(conn, tmp_path)
+
+    def fail(rows):
+        raise RuntimeError("connection lost")
+    monkeypatch.setattr(job, "_delete", fail)
+    with pytest.raises(RuntimeError):
+        job.run()
+    assert len(remaining(conn)) == 35
+
+    state = make_job(conn, tmp_path).run()
+    assert state["completed"] and len(remaining(conn)) == 10
+    # The first batch was archived twice, but every expired message is in an archive
+    messages = archived(tmp_path)
+    assert len(messages) == 35 and len({m["id"] for m in messages}) == 25
+    conn.close()
+
+def test_new_run_after_completion(tmp_path):
+    conn = history(expired=3)
+    make_job(conn, tmp_path).run()
+    state = make_job(conn, tmp_path).run()
+    assert state["completed"] and state["rows_deleted"] == 0 and state["expired_at_start"] == 0
+    assert len(os.listdir(tmp_path)) == 2
+    conn.close()
+
+def test_cleanup_old_sessions(tmp_path):
+    conn = history()
+    # Every message is dated before NOW, so keeping 0 days archives all of them
+    deleted = cleanup_old_sessions(conn, days_old=0, archive_dir=str(tmp_path), batch_size=8, pause_seconds=0)
+    assert deleted == 35 and remaining(conn) == []
+    conn.close()
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the agent and ingestion entry points
+
+The dependencies checked in test_imports_only.py are loaded on first use, not at
+import time. Each entry point is imported in a fresh interpreter with
+`-X importtime`; the test fails if it pulls in one of the heavy dependencies or
+takes longer than the budget (IMPORT_BUDGET_SECONDS, 1 second by default).
+
+Run directly to print the import time of every entry point.
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+import pytest
+
+ENTRY_POINTS = [
+    "multimodal_agents",
+    "snowflake_agent",
+    "snowflake_solution",
+    "snowflake_solution_working_final",
+    "process_new_data",
+    "example_usage",
+]
+
+# Loaded on first use only; sklearn and pandas are not used by the entry points at all
+HEAVY_MODULES = ["pandas", "sklearn", "pymupdf", "google.genai", "snowflake.connector", "docx"]
+
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.0"))
+
+def measure_import(module: str) -> Tuple[float, Dict[str, float]]:
+    """
+    Import a module in a fresh interpreter
+
+    Args:
+        module: Module name
+
+    Returns:
+        Tuple[float, Dict[str, float]]: Seconds to import the module, and the cumulative
+            seconds of every module it loaded
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    assert result.returncode == 0, result.stderr
+    loaded = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        loaded[name.strip()] = int(cumulative) / 1e6
+    return loaded[module], loaded
+
+def slowest(loaded: Dict[str, float], n: int = 5) -> List[str]:
+    return [f"{name} {seconds:.2f}s" for name, seconds in sorted(loaded.items(), key=lambda x: -x[1])[:n]]
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_import_budget(module):
+    seconds, loaded = measure_import(module)
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+    assert not heavy, f"{module} imports {', '.join(heavy)} at import time"
+    assert seconds <= IMPORT_BUDGET_SECONDS, (
+        f"{module} took {seconds:.2f}s to import (budget {IMPORT_BUDGET_SECONDS}s); "
+        f"slowest: {', '.join(slowest(loaded))}"
+    )
+
+def test_agent_loads_one_solution_script():
+    """SnowflakeAgent builds on the working final script only, not on snowflake_solution.py as well"""
+    _, loaded = measure_import("snowflake_agent")
+    assert "snowflake_solution_working_final" in loaded and "snowflake_solution" not in loaded
+
+def test_generation_configs_are_still_importable():
+    """The configs are built on first access instead of at import time"""
+    from snowflake_solution_working_final import TOOLS_CONFIG, get_tools_config
+
+    assert TOOLS_CONFIG is get_tools_config()
+    assert TOOLS_CONFIG.tools[0].function_declarations[0].name == "get_information_for_question_answering"
+
+def main():
+    """Print the import time of every entry point"""
+    print("⏱️ Import time per entry point")
+    print("=" * 60)
+    for module in ENTRY_POINTS:
+        seconds, loaded = measure_import(module)
+        status = "✅" if seconds <= IMPORT_BUDGET_SECONDS else "❌"
+        print(f"{status} {module}: {seconds:.2f}s ({', '.join(slowest(loaded, 3))})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test the staged ingestion pipeline without Snowflake
+
+Checks that every document reaches the writer in bounded batches, that the
+stages overlap, and that a failing stage stops the pipeline with its error.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ingestion_pipeline import IngestionPipeline
+
+def extract_pages(path):
+    """Pretend every file renders to two pages (module-level so it can run in a process pool)"""
+    return [{"key": f"{path}_page_{n}.png"} for n in (1, 2)]
+
+def embed_all(batch):
+    return [[float(len(doc["key"]))] for doc in batch]
+
+def test_all_documents_are_written_in_batches():
+    """Documents extracted in worker processes are embedded and written exactly once"""
+    batches = []
+    pipeline = IngestionPipeline(extract_pages, embed_all, batches.append, workers=2, queue_size=4,
+                                 embed_batch_size=3, write_batch_size=5)
+    stats = pipeline.run(f"file{n}" for n in range(10))
+
+    written = [doc for batch in batches for doc in batch]
+    assert sorted(doc["key"] for doc in written) == sorted(f"file{n}_page_{p}.png" for n in range(10) for p in (1, 2))
+    assert all(doc["embedding"] == [float(len(doc["key"]))] for doc in written)
+    assert max(len(batch) for batch in batches) <= 5
+    assert [stats[name].items for name in ("discover", "extract", "embed", "write")] == [10, 20, 20, 20]
+    assert stats["embed"].batches >= 7
+
+def test_stages_overlap():
+    """The first write happens before extraction of the last file finishes"""
+    events = []
+
+    def slow_extract(path):
+        time.sleep(0.02)
+        events.append(("extracted", time.perf_counter()))
+        return [{"key": path}]
+
+    def write(batch):
+        events.append(("written", time.perf_counter()))
+
+    pipeline = IngestionPipeline(slow_extract, embed_all, write, workers=1, queue_size=2,
+                                 embed_batch_size=1, write_batch_size=1,
+                                 executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    pipeline.run(f"file{n}" for n in range(10))
+
+    first_write = min(t for name, t in events if name == "written")
+    last_extract = max(t for name, t in events if name == "extracted")
+    assert first_write < last_extract
+
+def test_backpressure_limits_files_in_flight():
+    """A slow writer stops discovery from running far ahead"""
+    discovered = []
+
+    def paths():
+        for n in range(50):
+            discovered.append(n)
+            yield f"file{n}"
+
+    writes = []
+
+    def slow_write(batch):
+        writes.append(len(discovered))
+        time.sleep(0.01)
+
+    pipeline = IngestionPipeline(lambda path: [{"key": path}], embed_all, slow_write, workers=1, queue_size=2,
+                                 embed_batch_size=1, write_batch_size=1,
+                                 executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    pipeline.run(paths())
+
+    # Discovery can only be a few queues ahead of the first write
+    assert writes[0] < 15
+
+def test_extracted_documents_held_are_bounded():
+    """Files whose documents are still waiting for the queue count against queue_size"""
+    lock = threading.Lock()
+    extracted, embedded, held = [0], [0], []
+
+    def extract(path):
+        with lock:
+            extracted[0] += 10
+        return [{"key": f"{path}_{n}"} for n in range(10)]
+
+    def slow_embed(batch):
+        time.sleep(0.002)
+        with lock:
+            embedded[0] += len(batch)
+            held.append(extracted[0] - embedded[0])
+        return embed_all(batch)
+
+    pipeline = IngestionPipeline(extract, slow_embed, lambda batch: None, workers=8, queue_size=2,
+                                 embed_batch_size=1, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    pipeline.run(f"file{n}" for n in range(20))
+
+    # At most queue_size files being handed on, a full document queue and the document being embedded
+    assert max(held) <= 2 * 10 + 2 + 1
+
+def test_short_embedding_response_fails_the_stage():
+    """Documents are never dropped silently when the embedder returns too few embeddings"""
+    written = []
+    pipeline = IngestionPipeline(lambda path: [{"key": path}], lambda batch: embed_all(batch)[:-1], written.extend,
+                                 workers=1, queue_size=2, embed_batch_size=2,
+                                 executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    with pytest.raises(ValueError, match="embeddings for [12] documents"):
+        pipeline.run(f"file{n}" for n in range(4))
+    assert written == []
+
+def test_errors_stop_the_pipeline():
+    """An exception in any stage is raised from run"""
+    def failing_embed(batch):
+        raise RuntimeError("embedding endpoint unavailable")
+
+    pipeline = IngestionPipeline(lambda path: [{"key": path}], failing_embed, lambda batch: None, workers=1,
+                                 queue_size=2, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    with pytest.raises(RuntimeError, match="unavailable"):
+        pipeline.run(f"file{n}" for n in range(100))
+
+def test_ingest_directories_upserts_files(tmp_path):
+    """Files in the ingestion directories end up in the table once, even when ingested twice"""
+    from PIL import Image
+
+    from process_new_data import ingest_directories
+    from snowflake_config import SnowflakeConfig
+    from test_server_search import SQLiteConnection
+
+    Image.new("RGB", (4, 3)).save(tmp_path / "scan.png")
+    (tmp_path / "notes.txt").write_text("carotid ultrasound")
+    (tmp_path / "ignored.bin").write_bytes(b"")
+
+    config = SnowflakeConfig()
+    config.ingest_workers = 2
+    conn = SQLiteConnection()
+    embed = lambda batch: [[1.0, 0.0]] * len(batch)
+
+    counts, stats = ingest_directories(conn, [str(tmp_path), str(tmp_path / "missing")], embed=embed, config=config)
+    assert counts["inserted"] == 2
+    assert stats["discover"].items == 2
+    rows = conn.sqlite.execute("SELECT key, width, height FROM multimodal_documents ORDER BY key").fetchall()
+    assert rows == [(str(tmp_path / "notes.txt"), 0, 0), (str(tmp_path / "scan.png"), 4, 3)]
+
+    counts, _ = ingest_directories(conn, [str(tmp_path)], embed=embed, config=config)
+    assert counts == {"inserted": 0, "updated": 0, "unchanged": 2, "deleted": 0}
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
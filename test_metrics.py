@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test the metrics registry and its wiring into retrieval, chat history and ingestion
+
+Histogram percentiles must stay within the bucket precision of the exact values,
+the Prometheus text format must be well formed, and the instrumented call sites
+must count what they did against the local SQLite stand-in.
+"""
+
+import copy
+import random
+import urllib.request
+
+import numpy as np
+import pytest
+
+import metrics
+import process_new_data
+from metrics import Histogram, MetricsRegistry
+from retrieval import get_retriever
+from snowflake_config import get_config
+from snowflake_solution_working_final import retrieve_session_history, store_chat_message
+from sqlite_standin import SQLiteConnection
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "_default_metrics", registry)
+    return registry
+
+def test_histogram_percentiles_within_precision():
+    rng = random.Random(0)
+    # Latencies spread over six orders of magnitude
+    values = sorted(rng.lognormvariate(-5, 2.5) for _ in range(20000))
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = values[int(q * len(values)) - 1]
+        assert histogram.quantile(q) == pytest.approx(exact, rel=1 / 32)
+    assert histogram.quantile(1.0) == values[-1]
+    assert histogram.quantile(0.0) == pytest.approx(values[0], rel=1 / 64)
+    assert histogram.count == len(values) and histogram.sum == pytest.approx(sum(values))
+
+def test_histogram_zeros_and_empty():
+    histogram = Histogram()
+    assert np.isnan(histogram.quantile(0.5))
+    for value in (0, 0, 0, 5):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 0.0
+    assert histogram.quantile(0.99) == 5
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry(quantiles=(0.5,))
+    registry.counter("calls_total", "Calls", call='say "hi"').inc(2)
+    registry.counter("calls_total", "Calls", call="other").inc()
+    registry.gauge("documents", "Documents").set(12)
+    with registry.time("call_seconds", "Call latency", call="a"):
+        pass
+
+    text = registry.render()
+    assert '# HELP calls_total Calls\n# TYPE calls_total counter\n' in text
+    assert 'calls_total{call="say \\"hi\\""} 2\n' in text
+    assert 'calls_total{call="other"} 1\n' in text
+    assert 'documents 12\n' in text
+    assert '# TYPE call_seconds summary\ncall_seconds{call="a",quantile="0.5"} ' in text
+    assert 'call_seconds_count{call="a"} 1\n' in text
+    assert registry.value("calls_total", call="other") == 1
+
+    with pytest.raises(ValueError):
+        registry.gauge("calls_total")
+    with pytest.raises(ValueError):
+        registry.counter("calls_total", call="other").inc(-1)
+
+def test_disabled_registry_is_a_no_op():
+    registry = MetricsRegistry(enabled=False)
+    registry.counter("calls_total").inc()
+    with registry.time("call_seconds"):
+        pass
+    assert registry.render() == ""
+
+def test_write_and_serve(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "Calls").inc(3)
+
+    path = tmp_path / "metrics" / "agent.prom"
+    registry.write(str(path))
+    assert path.read_text() == registry.render()
+
+    server = registry.serve(0, host="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert b"calls_total 3\n" in response.read()
+    finally:
+        server.shutdown()
+
+def test_retrieval_and_ingestion_are_counted(registry):
+    config = copy.copy(get_config())
+    config.embedding_dimensions = 8
+    config.search_mode = "client"
+    conn = SQLiteConnection()
+    embeddings = np.random.default_rng(0).normal(size=(5, 8))
+    documents = [{"key": f"data/images/{n}.png", "width": 1, "height": 1} for n in range(5)]
+    process_new_data.load_embeddings_to_snowflake(conn, documents, embeddings.tolist())
+    process_new_data.load_embeddings_to_snowflake(conn, documents, embeddings.tolist())
+
+    assert registry.value("ingest_documents_total", result="inserted") == 5
+    assert registry.value("ingest_documents_total", result="unchanged") == 5
+    assert registry.value("db_commits_total", operation="upsert") == 2
+
+    retriever = get_retriever(conn, config)
+    retriever.search(embeddings[:3], k=2, threshold=-1.0)
+    retriever.search(embeddings[:1], k=2, threshold=-1.0)
+    assert registry.value("search_queries_total", strategy="client") == 4
+    assert registry.value("index_cache_requests_total", result="miss") == 1
+    assert registry.value("index_cache_requests_total", result="hit") == 1
+    assert registry.value("index_documents") == 5
+    scanned = registry.histogram("search_rows_scanned", strategy="client")
+    assert scanned.count == 4 and scanned.max == 5
+    assert registry.histogram("search_seconds", strategy="client").count == 2
+    retriever.documents_changed()
+    conn.close()
+
+def test_chat_history_is_counted(registry):
+    conn = SQLiteConnection()
+    store_chat_message(conn, "s1", "user", "text", "hello")
+    store_chat_message(conn, "s1", "agent", "text", "hi")
+    assert retrieve_session_history(conn, "s1") == ["hello", "hi"]
+    retrieve_session_history(conn, "unknown")
+
+    assert registry.value("history_messages_written_total", message_type="text") == 2
+    assert registry.value("db_commits_total", operation="history") == 2
+    assert registry.value("db_rows_read_total", table="chat_history") == 2
+    reads = registry.histogram("history_rows_read")
+    assert reads.count == 2 and reads.max == 2
+    conn.close()
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test the streaming PDF downloader against a local HTTP server
+
+The server supports Range/If-Range and can cut a response short, so fresh
+downloads, cache hits and resumed downloads are all exercised offline.
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pdf_download import PdfCache, download_pdf_to, local_pdf_path
+
+BODY = bytes(range(256)) * 400  # 100 KiB
+
+class PdfHandler(BaseHTTPRequestHandler):
+    """Serves BODY at /paper.pdf, honouring Range requests while the ETag matches"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.path != "/paper.pdf":
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body, status, start = server.body, 200, 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == server.etag:
+            # range_shift makes the server answer with a different range than requested
+            start = int(range_header.split("=")[1].rstrip("-")) + server.range_shift
+            status = 206
+
+        payload = body[start:]
+        if server.chunked:
+            # Chunked responses ignore Range and always carry the whole body
+            self.send_chunked(body)
+            return
+        self.send_response(status)
+        self.send_header("ETag", server.etag)
+        if server.send_length:
+            self.send_header("Content-Length", str(len(payload)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        # Simulate a dropped connection by sending only part of the payload
+        self.wfile.write(payload[:server.cut_after] if server.cut_after else payload)
+
+    def send_chunked(self, payload):
+        """Full response with chunked transfer encoding and no Content-Length"""
+        self.protocol_version = "HTTP/1.1"
+        self.send_response(200)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        if self.server.cut_after:
+            payload = payload[:self.server.cut_after]
+        for i in range(0, len(payload), 8192):
+            chunk = payload[i:i + 8192]
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        if not self.server.cut_after:
+            self.wfile.write(b"0\r\n\r\n")
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), PdfHandler)
+    httpd.body, httpd.etag, httpd.cut_after, httpd.requests = BODY, '"v1"', None, []
+    httpd.range_shift, httpd.send_length, httpd.chunked = 0, True, False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def url(server, path="/paper.pdf"):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def test_download_and_cache_hit(server, tmp_path):
+    """The first call streams the file; later calls are served from the cache without a request"""
+    cache = PdfCache(str(tmp_path))
+    path = cache.download(url(server), chunk_size=4096)
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert os.path.basename(path).endswith(".pdf")
+    assert len(server.requests) == 1
+
+    assert PdfCache(str(tmp_path)).download(url(server)) == path
+    assert len(server.requests) == 1
+
+def test_interrupted_download_resumes(server, tmp_path):
+    """A cut-off transfer is resumed with a Range request instead of starting over"""
+    cache = PdfCache(str(tmp_path))
+    server.cut_after = 30000
+    with pytest.raises(Exception):
+        cache.download(url(server), chunk_size=4096)
+
+    server.cut_after = None
+    path = cache.download(url(server), chunk_size=4096)
+
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    resumed_from = int(server.requests[-1]["Range"].split("=")[1].rstrip("-"))
+    assert 0 < resumed_from <= 30000
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    assert os.listdir(tmp_path / "partial") == []
+
+def test_changed_file_restarts(server, tmp_path):
+    """If the file changed since the partial download, the server's full response replaces it"""
+    cache = PdfCache(str(tmp_path))
+    server.cut_after = 30000
+    with pytest.raises(Exception):
+        cache.download(url(server))
+
+    server.cut_after = None
+    server.body, server.etag = BODY[::-1], '"v2"'
+    with open(cache.download(url(server)), "rb") as f:
+        assert f.read() == BODY[::-1]
+
+def test_mismatched_range_restarts(server, tmp_path):
+    """A 206 that does not start at the resume offset is not appended; the file is downloaded whole"""
+    cache = PdfCache(str(tmp_path))
+    server.cut_after = 30000
+    with pytest.raises(Exception):
+        cache.download(url(server), chunk_size=4096)
+
+    server.cut_after, server.range_shift = None, 1000
+    with open(cache.download(url(server), chunk_size=4096), "rb") as f:
+        assert f.read() == BODY
+    assert "Range" in server.requests[-2] and "Range" not in server.requests[-1]
+
+def test_chunked_response_is_cached(server, tmp_path):
+    """A full response without Content-Length is stored once its stream ends cleanly"""
+    cache = PdfCache(str(tmp_path))
+    server.chunked = True
+    path = cache.download(url(server), chunk_size=4096)
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert cache.lookup(url(server)) == path
+
+def test_cut_chunked_response_is_not_cached(server, tmp_path):
+    """A chunked response that stops before its last chunk is not stored"""
+    cache = PdfCache(str(tmp_path))
+    server.chunked, server.cut_after = True, 30000
+    with pytest.raises(Exception):
+        cache.download(url(server))
+    assert cache.lookup(url(server)) is None
+
+    server.cut_after = None
+    with open(cache.download(url(server)), "rb") as f:
+        assert f.read() == BODY
+
+def test_download_to_readable_path(server, tmp_path):
+    """The PDF is placed under its own name, while the cache stays keyed by content"""
+    path = local_pdf_path(url(server), str(tmp_path / "pdfs"))
+    assert path == str(tmp_path / "pdfs" / "paper.pdf")
+    assert local_pdf_path("https://arxiv.org/pdf/2501.12948", "data/pdfs") == os.path.join("data/pdfs", "2501.12948.pdf")
+
+    assert download_pdf_to(url(server), path, cache_dir=str(tmp_path / "cache")) == path
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+    assert download_pdf_to(url(server), path, cache_dir=str(tmp_path / "cache")) == path
+    assert len(server.requests) == 1
+
+def test_error_status(server, tmp_path):
+    with pytest.raises(ValueError, match="404"):
+        PdfCache(str(tmp_path)).download(url(server, "/missing.pdf"))
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test lazy PDF page records, render profiles and the rendered-page LRU cache
+
+Builds a small PDF with PyMuPDF so no download is needed.
+"""
+
+import os
+
+import pymupdf
+from PIL import Image
+
+from pdf_pages import (PageRenderCache, RenderProfile, create_page_records, is_text_only_page,
+                       render_pdf_pages)
+from vector_index import build_document_metadata, parse_page_key
+
+PREVIEW = RenderProfile("preview", 1.0)
+
+def make_pdf(path, pages=3, colored=False):
+    with pymupdf.Document() as pdf:
+        for n in range(pages):
+            page = pdf.new_page(width=200, height=100)
+            page.insert_text((20, 50), f"Page {n + 1}")
+            if colored:
+                page.draw_rect(pymupdf.Rect(120, 20, 180, 80), color=(1, 0, 0), fill=(0, 0, 1))
+        pdf.save(str(path))
+    return str(path)
+
+def test_page_records_are_not_rendered(tmp_path):
+    """Ingest records carry the page size at the context zoom without writing any image"""
+    pdf_path = make_pdf(tmp_path / "report.pdf")
+    records = create_page_records(pdf_path, zoom=3.0)
+
+    assert [r["key"] for r in records] == [f"{pdf_path}#page={n}" for n in (1, 2, 3)]
+    assert (records[0]["width"], records[0]["height"]) == (600, 300)
+    assert os.listdir(tmp_path) == ["report.pdf"]
+
+    assert parse_page_key(records[1]["key"]) == (pdf_path, 2)
+    assert build_document_metadata(records[1]["key"]) == {"document_type": "image", "source_file": "report.pdf"}
+
+def test_render_is_cached(tmp_path):
+    """A page is rendered once per profile and then served from disk"""
+    pdf_path = make_pdf(tmp_path / "report.pdf")
+    cache = PageRenderCache(str(tmp_path / "pages"))
+
+    path = cache.render(pdf_path, 2, PREVIEW)
+    with Image.open(path) as image:
+        assert image.size == (200, 100)
+    mtime = os.stat(path).st_mtime_ns
+
+    assert cache.render(pdf_path, 2, PREVIEW) == path
+    assert os.stat(path).st_mtime_ns >= mtime
+    assert cache.render(pdf_path, 2, PREVIEW._replace(zoom=2.0)) != path
+    assert len(os.listdir(tmp_path / "pages")) == 2
+
+    # A new cache instance picks up the pages already on disk
+    assert PageRenderCache(str(tmp_path / "pages")).total_bytes == cache.total_bytes
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    """The cache stays under its size bound by deleting the oldest renders"""
+    pdf_path = make_pdf(tmp_path / "report.pdf")
+    probe = PageRenderCache(str(tmp_path / "probe"))
+    page_bytes = os.path.getsize(probe.render(pdf_path, 1, PREVIEW))
+
+    cache = PageRenderCache(str(tmp_path / "pages"), max_bytes=int(page_bytes * 2.5))
+    first = cache.render(pdf_path, 1, PREVIEW)
+    second = cache.render(pdf_path, 2, PREVIEW)
+    cache.render(pdf_path, 1, PREVIEW)  # page 1 is now the most recently used
+    cache.render(pdf_path, 3, PREVIEW)
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert cache.total_bytes <= cache.max_bytes
+
+def test_profile_format_is_part_of_the_cache_key(tmp_path):
+    """The same page in another format or quality is a separate cache entry"""
+    pdf_path = make_pdf(tmp_path / "report.pdf")
+    cache = PageRenderCache(str(tmp_path / "pages"))
+
+    png = cache.render(pdf_path, 1, PREVIEW)
+    jpeg = cache.render(pdf_path, 1, PREVIEW._replace(format="jpeg"))
+    webp = cache.render(pdf_path, 1, PREVIEW._replace(format="webp", quality=40))
+
+    assert (png[-4:], jpeg[-4:], webp[-5:]) == (".png", ".jpg", ".webp")
+    with Image.open(webp) as image:
+        assert image.format == "WEBP"
+    assert PageRenderCache(str(tmp_path / "pages")).total_bytes == cache.total_bytes
+
+def test_text_only_pages_are_detected(tmp_path):
+    """Pages with colored drawings keep their color; plain text pages do not need it"""
+    with pymupdf.Document(make_pdf(tmp_path / "text.pdf", pages=1)) as pdf:
+        assert is_text_only_page(pdf[0])
+    with pymupdf.Document(make_pdf(tmp_path / "color.pdf", pages=1, colored=True)) as pdf:
+        assert not is_text_only_page(pdf[0])
+
+def test_pages_are_rendered_once_for_all_profiles(tmp_path):
+    """Eager rendering writes the context key plus a downscaled image per profile"""
+    pdf_path = make_pdf(tmp_path / "report.pdf", pages=2)
+    profiles = {
+        "context": RenderProfile("context", 3.0, "png", grayscale=True),
+        "embedding": RenderProfile("embedding", 1.0, "jpeg", quality=80, grayscale=True),
+        "thumbnail": RenderProfile("thumbnail", 0.5, "webp", quality=60, grayscale=True),
+    }
+    docs = render_pdf_pages(pdf_path, str(tmp_path / "images"), "report", profiles, str(tmp_path / "renders"))
+
+    assert [d["key"] for d in docs] == [str(tmp_path / "images" / f"report_page_{n}.png") for n in (1, 2)]
+    assert (docs[0]["width"], docs[0]["height"]) == (600, 300)
+    assert docs[0]["renders"] == {
+        "embedding": str(tmp_path / "renders" / "embedding" / "report_page_1.jpg"),
+        "thumbnail": str(tmp_path / "renders" / "thumbnail" / "report_page_1.webp"),
+    }
+    with Image.open(docs[0]["key"]) as image:
+        assert (image.size, image.mode) == ((600, 300), "L")
+    with Image.open(docs[0]["renders"]["embedding"]) as image:
+        assert (image.size, image.format) == ((200, 100), "JPEG")
+    with Image.open(docs[0]["renders"]["thumbnail"]) as image:
+        assert (image.size, image.format) == ((100, 50), "WEBP")
+
+def test_colored_pages_stay_in_color(tmp_path):
+    """Grayscale is only applied to pages without color"""
+    pdf_path = make_pdf(tmp_path / "report.pdf", pages=1, colored=True)
+    profiles = {"context": RenderProfile("context", 1.0, "png", grayscale=True)}
+    docs = render_pdf_pages(pdf_path, str(tmp_path / "images"), None, profiles, str(tmp_path / "renders"))
+
+    assert docs[0]["key"] == str(tmp_path / "images" / "1.png")
+    with Image.open(docs[0]["key"]) as image:
+        assert image.mode == "RGB"
+
+def test_agent_loads_page_keys(tmp_path, monkeypatch):
+    """Retrieved page keys are rendered when the answer context is built"""
+    import pdf_pages
+    from snowflake_solution_working_final import load_file_for_context
+
+    pdf_path = make_pdf(tmp_path / "report.pdf")
+    monkeypatch.setattr(pdf_pages, "_default_cache", PageRenderCache(str(tmp_path / "pages")))
+
+    image = load_file_for_context(f"{pdf_path}#page=1")
+    assert isinstance(image, Image.Image)
+    assert image.size == (600, 300)
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
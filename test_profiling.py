@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test the opt-in cProfile and sampling profilers
+
+Profiles are written per request ID, only for every Nth request, and the
+hottest function of a busy block shows up in both formats.
+"""
+
+import os
+import time
+
+import pytest
+
+import profiling
+import snowflake_solution
+from fake_backends import FakeGeminiClient
+from profiling import Profiler, SamplingProfiler, top_frames
+from snowflake_agent import SnowflakeAgent
+
+def busy_loop(seconds: float) -> int:
+    total = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+def test_off_profiles_nothing(tmp_path):
+    profiler = Profiler("off", output_dir=str(tmp_path))
+    with profiler.profile("execute_agent", "req") as path:
+        busy_loop(0.01)
+    assert path is None
+    assert os.listdir(tmp_path) == []
+
+def test_cprofile_every_nth_request(tmp_path):
+    profiler = Profiler("cprofile", every=2, output_dir=str(tmp_path))
+    paths = []
+    for n in range(4):
+        with profiler.profile("execute_agent", f"req-{n}") as path:
+            busy_loop(0.02)
+        paths.append(path)
+
+    assert paths[1] is None and paths[3] is None
+    assert sorted(os.listdir(tmp_path / "execute_agent")) == ["req-0.prof", "req-2.prof"]
+    function, self_seconds, _ = top_frames(paths[0], limit=1)[0]
+    assert "busy_loop" in function or "sum" in function
+    assert self_seconds > 0
+
+def test_sampling_writes_collapsed_stacks(tmp_path):
+    profiler = Profiler("sampling", output_dir=str(tmp_path), interval_seconds=0.001)
+    with profiler.profile("ingest") as path:
+        busy_loop(0.2)
+
+    assert os.path.dirname(path) == str(tmp_path / "ingest") and path.endswith(".collapsed")
+    with open(path) as f:
+        lines = f.read().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 10
+    assert "test_sampling_writes_collapsed_stacks (test_profiling.py" in stack
+    assert stack.split(";")[-1].startswith("busy_loop")
+
+    top = dict((name.split(" ")[0], total) for name, _, total in top_frames(path))
+    assert top["busy_loop"] > 0.9
+
+def test_sampler_samples_only_its_thread():
+    sampler = SamplingProfiler(interval_seconds=0.001)
+    sampler.start()
+    time.sleep(0.05)
+    sampler.stop()
+    assert sampler.counts
+    assert all("_sample (profiling.py" not in stack for stack in sampler.counts)
+
+def test_agent_turns_are_profiled_per_request(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(profiling, "_default_profiler", Profiler("cprofile", output_dir=str(tmp_path)))
+    agent = SnowflakeAgent(None, gemini_client=FakeGeminiClient(tool_call_rate=0.0), LLM="fake", serverless_url="")
+    agent.retrieve = lambda questions: []
+
+    agent.execute_agent("what is x", request_id="turn-1")
+    agent.execute_react_agent("what is y", request_id="turn-2")
+
+    assert os.path.exists(tmp_path / "execute_agent" / "turn-1.prof")
+    assert os.path.exists(tmp_path / "execute_react_agent" / "turn-2.prof")
+    assert "Profile:" in capsys.readouterr().out
+
+def test_solution_entry_points_are_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_default_profiler", Profiler("cprofile", output_dir=str(tmp_path)))
+    for name in ("generate_answer", "generate_answer_with_memory", "generate_answer_react"):
+        monkeypatch.setattr(snowflake_solution, name, lambda *args: "answer")
+
+    snowflake_solution.execute_agent(None, None, "fake", "what is x", request_id="turn-1")
+    snowflake_solution.execute_agent_with_memory(None, None, "fake", "1", "what is x", request_id="turn-2")
+    snowflake_solution.execute_react_agent(None, None, "fake", "what is x", request_id="turn-3")
+
+    assert os.path.exists(tmp_path / "execute_agent" / "turn-1.prof")
+    assert os.path.exists(tmp_path / "execute_agent_with_memory" / "turn-2.prof")
+    assert os.path.exists(tmp_path / "execute_react_agent" / "turn-3.prof")
+
+@pytest.mark.parametrize("request_id", ["../../x", "a/b", "..", "", "turn.1"])
+def test_request_id_cannot_escape_the_profile_dir(tmp_path, request_id):
+    # Rejected whether or not the request is profiled
+    for mode in ("off", "cprofile"):
+        with pytest.raises(ValueError):
+            with Profiler(mode, output_dir=str(tmp_path / "profiles")).profile("execute_agent", request_id):
+                pass
+    assert not os.path.exists(tmp_path / "x")
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        Profiler("perf")
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the ReAct agent loop without Snowflake or Gemini
+
+Uses a scripted LLM client and a stubbed retrieval tool to check that tool
+questions are parsed from the reasoning output, fanned out in parallel and
+that retrieved images are only added to the context once.
+"""
+
+import threading
+from types import SimpleNamespace
+
+import snowflake_solution
+from snowflake_solution import generate_answer_react
+from snowflake_utils import parse_tool_questions
+
+class ScriptedModels:
+    """Returns the scripted responses in order and records every request"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append(list(contents))
+        return SimpleNamespace(text=self.responses.pop(0))
+
+def make_client(responses):
+    """Create a fake Gemini client with scripted responses"""
+    return SimpleNamespace(models=ScriptedModels(responses))
+
+def test_parse_tool_questions():
+    """Multiple TOOL lines are returned in order without duplicates"""
+    answer = "Thinking...\nTOOL: accuracy on MATH500\ntool: accuracy on AIME\nTOOL: accuracy on MATH500\n"
+    assert parse_tool_questions(answer) == ["accuracy on MATH500", "accuracy on AIME"]
+    assert parse_tool_questions("ANSWER: 97.3%") == []
+
+def test_react_fans_out_and_deduplicates(monkeypatch):
+    """Several questions run in one iteration and duplicate images are skipped"""
+    threads = set()
+    # Both retrievals must be running at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    retrieved = {
+        "q1": ["data/images/1.png", "data/images/2.png"],
+        "q2": ["data/images/2.png", "data/images/3.png"],
+    }
+
+    def fake_retrieval(conn, user_query, serverless_url):
+        threads.add(threading.get_ident())
+        barrier.wait()
+        return retrieved[user_query]
+
+    monkeypatch.setattr(snowflake_solution, "get_information_for_question_answering", fake_retrieval)
+    monkeypatch.setattr(snowflake_solution.Image, "open", lambda path: f"<image {path}>")
+
+    client = make_client(["TOOL: q1\nTOOL: q2", "ANSWER: done"])
+    answer = generate_answer_react(None, client, "fake-llm", "question", images=[])
+
+    assert answer == "ANSWER: done"
+    assert len(threads) == 2
+    # One reasoning call per iteration, no separate tool-selection call
+    assert len(client.models.calls) == 2
+    second_context = client.models.calls[1][1:]
+    assert second_context == [
+        "<image data/images/1.png>",
+        "<image data/images/2.png>",
+        "<image data/images/3.png>",
+    ]
+
+def test_react_stops_when_nothing_new(monkeypatch):
+    """The loop terminates early when retrieval only returns known images"""
+    monkeypatch.setattr(
+        snowflake_solution,
+        "get_information_for_question_answering",
+        lambda conn, user_query, serverless_url: ["data/test.png"],
+    )
+    monkeypatch.setattr(snowflake_solution.Image, "open", lambda path: f"<image {path}>")
+
+    client = make_client(["TOOL: q1", "TOOL: q1", "TOOL: q1"])
+    answer = generate_answer_react(None, client, "fake-llm", "question", images=["data/test.png"])
+
+    assert answer == "I was unable to find sufficient information to answer your question."
+    assert len(client.models.calls) == 1
+
+def test_react_keeps_reasoning_without_a_tool_line(monkeypatch):
+    """A step that neither answers nor asks a question is not returned as the answer"""
+    monkeypatch.setattr(
+        snowflake_solution,
+        "get_information_for_question_answering",
+        lambda conn, user_query, serverless_url: ["data/images/1.png"],
+    )
+    monkeypatch.setattr(snowflake_solution.Image, "open", lambda path: f"<image {path}>")
+
+    client = make_client(["Let me think about this.", "TOOL: q1", "ANSWER: done"])
+    answer = generate_answer_react(None, client, "fake-llm", "question", images=[])
+
+    assert answer == "ANSWER: done"
+    assert len(client.models.calls) == 3
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test the pluggable retrieval strategies against the local SQLite stand-in
+
+The client and server strategies must agree, ingestion must run each strategy's
+hooks, and a custom strategy can be plugged into the agent.
+"""
+
+import copy
+import gc
+
+import numpy as np
+import pytest
+
+import multimodal_agents
+import process_new_data
+import retrieval
+from retrieval import ClientRetriever, Retriever, ServerRetriever, get_retriever, register_retriever
+from snowflake_agent import SnowflakeAgent
+from snowflake_config import get_config
+from sqlite_standin import SQLITE_VECTOR_CAST, SQLiteConnection
+
+def make_config(**overrides):
+    config = copy.copy(get_config())
+    config.embedding_dimensions = 8
+    config.mmr_lambda = 1.0
+    config.multi_vector_search = False
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return config
+
+def ingest(conn, config, count=6, seed=0):
+    """Documents written through process_new_data, which runs the strategy's hooks"""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(count, 8))
+    documents = [{"key": f"data/images/{n}.png", "width": 10, "height": 20} for n in range(count)]
+    saved = get_config().search_mode
+    get_config().search_mode = config.search_mode
+    try:
+        process_new_data.load_embeddings_to_snowflake(conn, documents, embeddings.tolist())
+    finally:
+        get_config().search_mode = saved
+    return [d["key"] for d in documents], embeddings
+
+def test_strategy_follows_search_mode(tmp_path):
+    assert isinstance(get_retriever(None, make_config(search_mode="client")), ClientRetriever)
+    assert isinstance(get_retriever(None, make_config(search_mode="server")), ServerRetriever)
+    assert isinstance(get_retriever(None, make_config(), mode="server"), ServerRetriever)
+    with pytest.raises(ValueError):
+        get_retriever(None, make_config(search_mode="variant"))
+
+    # MULTI_VECTOR_SEARCH only applies once tile embeddings exist
+    tiles = tmp_path / "tiles.json"
+    config = make_config(multi_vector_search=True, tile_embeddings_file=str(tiles))
+    assert get_retriever(None, config).name == "client"
+    tiles.write_text("[]")
+    assert get_retriever(None, config).name == "multi_vector"
+
+def test_client_and_server_agree(monkeypatch):
+    monkeypatch.setattr(ServerRetriever, "vector_cast", SQLITE_VECTOR_CAST)
+    results = {}
+    for mode in ("client", "server"):
+        conn = SQLiteConnection()
+        config = make_config(search_mode=mode)
+        keys, embeddings = ingest(conn, config)
+        retriever = get_retriever(conn, config)
+        found = retriever.search([embeddings[2], embeddings[4]], k=3, threshold=-1.0)
+        results[mode] = [[r["key"] for r in query_results] for query_results in found]
+        assert results[mode][0][0] == keys[2] and results[mode][1][0] == keys[4]
+        assert retriever.demo_embedding() == pytest.approx(embeddings[0].tolist())
+        retriever.documents_changed()
+        conn.close()
+    assert results["client"] == results["server"]
+
+def test_ingest_refreshes_the_client_index():
+    conn = SQLiteConnection()
+    config = make_config(search_mode="client")
+    ingest(conn, config, count=3)
+    assert len(get_retriever(conn, config).index) == 3
+
+    ingest(conn, config, count=5, seed=1)
+    assert len(get_retriever(conn, config).index) == 5
+    get_retriever(conn, config).documents_changed()
+    conn.close()
+
+def test_client_index_is_dropped_with_its_connection():
+    config = make_config(search_mode="client")
+    conn = SQLiteConnection()
+    ingest(conn, config, count=3)
+    assert len(get_retriever(conn, config).index) == 3
+    conn.close()
+    del conn
+    gc.collect()
+    assert len(retrieval._vector_indexes) == 0
+
+    # A new connection never sees the old connection's documents, even at the same address
+    conn = SQLiteConnection()
+    ingest(conn, config, count=5, seed=1)
+    assert len(get_retriever(conn, config).index) == 5
+    conn.close()
+
+class FixedRetriever(Retriever):
+    """Returns the same keys for every query"""
+    name = "fixed"
+
+    def demo_embedding(self):
+        return [1.0]
+
+    def search(self, query_embeddings, k, threshold, filters=None):
+        return [[{"key": f"fixed-{n}", "similarity_score": 1.0} for n in range(k)] for _ in query_embeddings]
+
+def test_custom_strategy_plugs_into_the_agent(monkeypatch):
+    monkeypatch.setitem(retrieval.RETRIEVERS, "fixed", FixedRetriever)
+    config = make_config(search_mode="fixed", max_results=2)
+    monkeypatch.setattr(get_config(), "max_results", 2)
+
+    agent = SnowflakeAgent(None, gemini_client=object(), LLM="fake", serverless_url="", config=config)
+    assert isinstance(agent.retriever, FixedRetriever)
+    assert agent.retrieve(["a"]) == ["fixed-0", "fixed-1"]
+    assert agent.retrieve(["a", "b"]) == ["fixed-0", "fixed-1"] * 2
+
+    # Or passed explicitly, whatever SEARCH_MODE says
+    agent = SnowflakeAgent(None, gemini_client=object(), LLM="fake", serverless_url="",
+                           retriever=FixedRetriever(None, make_config()))
+    assert agent.retrieve(["a"]) == ["fixed-0", "fixed-1"]
+
+def test_register_retriever(monkeypatch):
+    monkeypatch.setattr(retrieval, "RETRIEVERS", dict(retrieval.RETRIEVERS))
+    register_retriever("fixed", FixedRetriever)
+    assert isinstance(get_retriever(None, make_config(search_mode="fixed")), FixedRetriever)
+
+def test_incomplete_strategy_is_rejected(monkeypatch):
+    monkeypatch.setattr(retrieval, "RETRIEVERS", dict(retrieval.RETRIEVERS))
+
+    class NoSearch(Retriever):
+        def demo_embedding(self):
+            return [1.0]
+
+    with pytest.raises(TypeError, match="search"):
+        register_retriever("no_search", NoSearch)
+    with pytest.raises(TypeError):
+        NoSearch(None, make_config())
+    assert "no_search" not in retrieval.RETRIEVERS
+
+def test_package_exports():
+    for name in multimodal_agents.__all__:
+        assert hasattr(multimodal_agents, name)
+    assert multimodal_agents.get_retriever is get_retriever
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test server-side top-k search against a local SQLite stand-in
+
+SQLite gets VECTOR_COSINE_SIMILARITY and a vector cast registered as functions,
+so the same SQL that runs in Snowflake can be checked without credentials.
+"""
+
+import numpy as np
+
+from embedding_codec import format_embedding_for_snowflake
+from server_search import build_search_query, materialize_search_columns, search_top_k
+from sqlite_standin import SQLITE_VECTOR_CAST, SQLiteConnection
+
+def make_connection():
+    """Table with a few documents, ingested the way load_embeddings_to_snowflake does"""
+    rng = np.random.default_rng(0)
+    keys = [f"data/images/{n}.png" for n in range(1, 7)] + ["data/text/Carotid_20.docx"]
+    embeddings = rng.normal(size=(len(keys), 8))
+    conn = SQLiteConnection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO multimodal_documents (key, width, height, embedding) VALUES (%s, %s, %s, %s)",
+        [(key, 10, 20, format_embedding_for_snowflake(e)) for key, e in zip(keys, embeddings)],
+    )
+    materialize_search_columns(conn, dimensions=8, vector_cast=SQLITE_VECTOR_CAST)
+    conn.rows_fetched = 0
+    return conn, keys, embeddings
+
+def test_materialize_fills_columns():
+    """Metadata and vector columns are filled for every ingested row"""
+    conn, _, _ = make_connection()
+    rows = conn.sqlite.execute(
+        "SELECT document_type, source_file FROM multimodal_documents WHERE embedding_vector IS NOT NULL"
+    ).fetchall()
+    assert len(rows) == 7
+    assert ("text", "Carotid_20.docx") in rows
+
+def test_materialize_updates_all_rows_at_once():
+    """Materializing new rows runs a fixed number of UPDATE statements, whatever the row count"""
+    conn, _, _ = make_connection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO multimodal_documents (key, width, height, embedding) VALUES (%s, %s, %s, %s)",
+        [(f"data/images/new-{n}.png", 10, 20, ",".join(["0.5"] * 8)) for n in range(20)],
+    )
+    statements = []
+    conn.sqlite.set_trace_callback(statements.append)
+    materialize_search_columns(conn, dimensions=8, vector_cast=SQLITE_VECTOR_CAST)
+    conn.sqlite.set_trace_callback(None)
+
+    assert len([s for s in statements if s.lstrip().startswith("UPDATE")]) == 2
+    assert conn.sqlite.execute(
+        "SELECT COUNT(*) FROM multimodal_documents WHERE embedding_vector IS NULL OR document_type IS NULL"
+    ).fetchone()[0] == 0
+    assert conn.sqlite.execute(
+        "SELECT source_file FROM multimodal_documents WHERE key = 'data/images/new-3.png'"
+    ).fetchone() == ("new-3.png",)
+
+def test_top_k_matches_brute_force_and_fetches_only_k_rows():
+    """The database returns the same top k as local scoring, and nothing else"""
+    conn, keys, embeddings = make_connection()
+    query = embeddings[3] + 0.1
+
+    scores = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+    expected = [keys[i] for i in np.argsort(-scores)[:2]]
+
+    results = search_top_k(conn, [query], k=2, dimensions=8, vector_cast=SQLITE_VECTOR_CAST)[0]
+    assert [r["key"] for r in results] == expected
+    assert set(results[0]) == {"key", "similarity_score"}
+    assert conn.rows_fetched == 2
+
+def test_filters_and_threshold():
+    """Filters and the threshold are applied in SQL"""
+    conn, keys, embeddings = make_connection()
+    texts = search_top_k(conn, [embeddings[0]], k=5, threshold=-1.0, filters={"document_type": "text", "modality": None},
+                         dimensions=8, vector_cast=SQLITE_VECTOR_CAST)[0]
+    assert [r["key"] for r in texts] == ["data/text/Carotid_20.docx"]
+
+    exact = search_top_k(conn, [embeddings[0]], k=5, threshold=0.999, dimensions=8,
+                         vector_cast=SQLITE_VECTOR_CAST)[0]
+    assert [r["key"] for r in exact] == [keys[0]]
+
+def test_snowflake_query_casts_query_once():
+    """The Snowflake SQL scores the typed column, not a re-cast of the stored string"""
+    sql, params = build_search_query({"source_file": ["1.png", "2.png"]}, dimensions=1024)
+    assert "VECTOR_COSINE_SIMILARITY(embedding_vector, STRTOK_TO_ARRAY(%s, ',')::VECTOR(FLOAT, 1024))" in sql
+    assert "source_file IN (%s, %s)" in sql
+    assert params == ["1.png", "2.png"]
+
+def test_working_final_server_mode(monkeypatch):
+    """search_many pushes the search down instead of loading the table"""
+    import retrieval
+    import snowflake_solution_working_final as solution
+    import server_search
+
+    conn, keys, _ = make_connection()
+    monkeypatch.setattr(solution.get_config(), "search_mode", "server")
+    monkeypatch.setattr(solution.get_config(), "embedding_dimensions", 8)
+    monkeypatch.setattr(server_search, "SNOWFLAKE_VECTOR_CAST", SQLITE_VECTOR_CAST)
+    monkeypatch.setattr(retrieval, "get_vector_index", lambda conn, **kwargs: (_ for _ in ()).throw(AssertionError))
+
+    results = solution.search_many(conn, ["q"], k=1)
+    assert [r["key"] for r in results[0]] == [keys[0]]
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test the long-lived SnowflakeAgent without Snowflake or Gemini
+
+Checks that generation configs are built once per agent and that tool calls are
+routed through the registry's dispatch table.
+"""
+
+from types import SimpleNamespace
+
+from google.genai.types import FunctionCall
+
+from snowflake_agent import SnowflakeAgent, ToolRegistry
+
+class RecordingModels:
+    """Returns scripted function calls / answers and records the configs used"""
+
+    def __init__(self, function_calls, answers):
+        self.function_calls = list(function_calls)
+        self.answers = list(answers)
+        self.configs = []
+
+    def generate_content(self, model, contents, config=None):
+        self.configs.append(config)
+        if config is not None and config.tools:
+            call = self.function_calls.pop(0)
+            part = SimpleNamespace(function_call=call)
+            return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+        return SimpleNamespace(text=self.answers.pop(0))
+
+def make_registry(calls):
+    """Registry with a cheap lookup tool and a search tool"""
+    registry = ToolRegistry()
+    registry.register(
+        {"name": "search", "description": "search", "parameters": {"type": "object", "properties": {}}},
+        lambda conn, serverless_url, user_query: calls.append(("search", user_query)) or [],
+    )
+    registry.register(
+        {"name": "lookup", "description": "lookup", "parameters": {"type": "object", "properties": {}}},
+        lambda conn, serverless_url, key: calls.append(("lookup", key)) or [],
+    )
+    return registry
+
+def test_configs_are_reused_across_calls():
+    """Every call shares the configs built in the constructor"""
+    calls = []
+    models = RecordingModels(
+        [FunctionCall(name="lookup", args={"key": "a"}), FunctionCall(name="search", args={"user_query": "b"})],
+        ["first", "second"],
+    )
+    agent = SnowflakeAgent(None, gemini_client=SimpleNamespace(models=models), LLM="fake",
+                           serverless_url="", tools=make_registry(calls))
+
+    assert agent.generate_answer("q1") == "first"
+    assert agent.generate_answer("q2") == "second"
+
+    assert calls == [("lookup", "a"), ("search", "b")]
+    tool_configs = [c for c in models.configs if c.tools]
+    answer_configs = [c for c in models.configs if not c.tools]
+    assert all(c is agent.tools_config for c in tool_configs)
+    assert all(c is agent.answer_config for c in answer_configs)
+    assert [d.name for d in agent.tools_config.tools[0].function_declarations] == ["search", "lookup"]
+
+def test_retrieve_uses_batch_handler():
+    """Several ReAct questions are answered by one batched call when the tool supports it"""
+    batches = []
+    registry = ToolRegistry()
+    registry.register(
+        {"name": "search", "description": "search", "parameters": {"type": "object", "properties": {}}},
+        lambda conn, serverless_url, user_query: [f"single-{user_query}"],
+        lambda conn, serverless_url, queries: batches.append(queries) or [[f"batch-{q}"] for q in queries],
+    )
+    agent = SnowflakeAgent(None, gemini_client=SimpleNamespace(models=None), LLM="fake",
+                           serverless_url="", tools=registry)
+
+    assert agent.retrieve(["a"]) == ["single-a"]
+    assert agent.retrieve(["a", "b"]) == ["batch-a", "batch-b"]
+    assert batches == [["a", "b"]]
+
+def test_retrieval_tool_is_chosen_by_name():
+    """The ReAct loop retrieves with the vector search tool even when it is not registered first"""
+    registry = make_registry([])
+    registry.register(
+        {"name": "get_information_for_question_answering", "description": "vector search",
+         "parameters": {"type": "object", "properties": {}}},
+        lambda conn, serverless_url, user_query: [],
+    )
+    agent = SnowflakeAgent(None, gemini_client=SimpleNamespace(models=None), LLM="fake",
+                           serverless_url="", tools=registry)
+    assert agent.retrieval_tool == "get_information_for_question_answering"
+
+def test_empty_registry_is_rejected():
+    """An agent without tools has nothing to retrieve with"""
+    import pytest
+    with pytest.raises(ValueError):
+        SnowflakeAgent(None, gemini_client=SimpleNamespace(models=None), LLM="fake",
+                       serverless_url="", tools=ToolRegistry())
+
+def test_unknown_tool_is_ignored():
+    """Calls to tools that are not registered do not raise"""
+    registry = make_registry([])
+    assert registry.dispatch(FunctionCall(name="missing", args={})) is None
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
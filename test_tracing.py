@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test tracing spans, the ring buffer, the OTLP/JSON exporter and latency breakdowns
+
+The agent turn test uses a fake Gemini client and the SQLite stand-in from
+test_server_search, so no credentials are needed.
+"""
+
+import contextvars
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import tracing
+from tracing import JsonSpanExporter, Tracer, format_breakdown, latency_breakdown
+
+def test_spans_nest_and_share_a_trace():
+    """Spans opened inside another become its children"""
+    tracer = Tracer()
+    with tracer.span("turn", kind="agent") as root:
+        with tracer.span("llm", kind="llm", model="m") as child:
+            assert tracer.current_span() is child
+        assert tracer.current_span() is root
+
+    spans = tracer.last_trace()
+    assert [s.name for s in spans] == ["llm", "turn"]
+    assert spans[0].parent_id == root.span_id and spans[0].trace_id == root.trace_id
+    assert spans[0].attributes == {"model": "m"}
+    assert root.duration_seconds >= spans[0].duration_seconds
+
+def test_ring_buffer_keeps_the_latest_spans():
+    tracer = Tracer(capacity=3)
+    for n in range(5):
+        with tracer.span(f"s{n}"):
+            pass
+    assert [s.name for s in tracer.spans()] == ["s2", "s3", "s4"]
+
+def test_errors_are_recorded_and_reraised():
+    tracer = Tracer()
+    with pytest.raises(ValueError):
+        with tracer.span("sql", kind="sql"):
+            raise ValueError("boom")
+    assert tracer.spans()[0].error == "ValueError: boom"
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+    with tracer.span("turn") as span:
+        assert span is None
+    assert tracer.spans() == []
+
+def test_breakdown_uses_self_time():
+    """Stages add up to the turn's duration, nested time is not counted twice"""
+    tracer = Tracer()
+    with tracer.span("turn", kind="agent"):
+        with tracer.span("retrieval", kind="retrieval"):
+            with tracer.span("sql", kind="sql"):
+                time.sleep(0.02)
+        with tracer.span("llm", kind="llm"):
+            time.sleep(0.03)
+
+    breakdown = latency_breakdown(tracer.last_trace())
+    assert list(breakdown["stages"])[:2] == ["llm", "sql"]
+    assert sum(breakdown["stages"].values()) == pytest.approx(breakdown["total_seconds"], abs=1e-5)
+    assert breakdown["spans"] == {"sql": 1, "retrieval": 1, "llm": 1, "agent": 1}
+    assert format_breakdown(breakdown).startswith("total ")
+
+def test_breakdown_counts_parallel_children_once():
+    """Children running concurrently cover their parent's time once, not once per child"""
+    tracer = Tracer()
+
+    def search():
+        with tracer.span("sql", kind="sql"):
+            time.sleep(0.05)
+
+    with tracer.span("turn", kind="agent"):
+        with tracer.span("retrieval", kind="retrieval"):
+            threads = [threading.Thread(target=contextvars.copy_context().run, args=(search,)) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            time.sleep(0.02)
+
+    spans = tracer.last_trace()
+    retrieval = next(s for s in spans if s.kind == "retrieval")
+    assert [s.parent_id for s in spans if s.kind == "sql"] == [retrieval.span_id] * 3
+    breakdown = latency_breakdown(spans)
+    # The retrieval span's own time is the 20 ms after its children, not clamped to zero
+    assert breakdown["stages"]["retrieval"] >= 0.015
+    # The three 50 ms searches overlap, so each counts in full
+    assert breakdown["stages"]["sql"] >= 0.15 > breakdown["total_seconds"]
+
+def test_exporter_writes_one_otlp_record_per_trace(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    tracer = Tracer(exporter=JsonSpanExporter(str(path)))
+    for _ in range(2):
+        with tracer.span("turn", kind="agent"):
+            with tracer.span("llm", kind="llm", tokens=12):
+                pass
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["llm", "turn"]
+    assert spans[0]["parentSpanId"] == spans[1]["spanId"]
+    assert "parentSpanId" not in spans[1]
+    assert {"key": "tokens", "value": {"intValue": "12"}} in spans[0]["attributes"]
+    assert int(spans[1]["endTimeUnixNano"]) >= int(spans[1]["startTimeUnixNano"])
+
+def test_agent_turn_is_traced(monkeypatch):
+    """A turn records its LLM, retrieval and SQL spans under one trace"""
+    import server_search
+    import snowflake_solution_working_final as solution
+    from test_server_search import SQLITE_VECTOR_CAST, make_connection
+
+    conn, keys, _ = make_connection()
+    tracer = Tracer()
+    monkeypatch.setattr(tracing, "_default_tracer", tracer)
+    monkeypatch.setattr(solution.get_config(), "search_mode", "server")
+    monkeypatch.setattr(solution.get_config(), "embedding_dimensions", 8)
+    monkeypatch.setattr(server_search, "SNOWFLAKE_VECTOR_CAST", SQLITE_VECTOR_CAST)
+    monkeypatch.setattr(solution, "load_file_for_context", lambda path: None)
+
+    tool_call = SimpleNamespace(name="get_information_for_question_answering", args={"user_query": "q"})
+    responses = iter([
+        SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(function_call=tool_call)]))]),
+        SimpleNamespace(text="answer"),
+    ])
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=lambda **kwargs: next(responses)))
+
+    assert solution.generate_answer(conn, client, "model", "q", images=[]) == "answer"
+
+    spans = tracer.last_trace()
+    assert {s.name for s in spans} >= {"agent.turn", "llm.select_tool", "retrieval", "sql.search_top_k",
+                                       "llm.generate_answer"}
+    assert len({s.trace_id for s in spans}) == 1
+    assert set(latency_breakdown(spans)["stages"]) >= {"llm", "sql", "retrieval", "agent"}
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
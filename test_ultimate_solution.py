@@ -8,6 +8,7 @@ import json
 import snowflake.connector
 from snowflake.connector import DictCursor
 from tqdm import tqdm
+from embedding_codec import format_embedding_for_snowflake
 
 # Load environment variables
 try:
@@ -39,16 +40,6 @@ def setup_snowflake_connection():
     
     return conn
 
-def format_embedding_for_snowflake(embedding):
-    """Format embedding to avoid scientific notation issues"""
-    # Format each number to avoid scientific notation
-    formatted_values = []
-    for val in embedding:
-        # Use format to avoid scientific notation for small numbers
-        formatted_val = f"{val:.15f}".rstrip('0').rstrip('.')
-        formatted_values.append(formatted_val)
-    return ','.join(formatted_values)
-
 def load_embeddings_to_snowflake(conn):
     """Load pre-generated embeddings and store in Snowflake using STRING approach with proper formatting"""
     with open("data/embeddings.json", "r") as data_file:
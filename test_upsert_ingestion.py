@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test key- and hash-based upsert ingestion against a local SQLite stand-in
+
+Re-loading the same documents must write nothing, and changed documents must be
+updated in place instead of being appended a second time.
+"""
+
+import numpy as np
+
+from embedding_codec import format_embedding_for_snowflake
+from server_search import materialize_search_columns
+from snowflake_utils import UPSERT_STAGE, compute_content_hash, upsert_documents
+from test_server_search import SQLITE_VECTOR_CAST, SQLiteConnection
+
+def make_documents(seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"key": f"data/images/{n}.png", "width": 10, "height": 20, "embedding": rng.normal(size=8).tolist()}
+        for n in range(1, 5)
+    ]
+
+class RecordingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self.connection.statements.append(sql)
+        if sql.startswith("MERGE") and self.connection.fail_merge:
+            raise RuntimeError("warehouse suspended")
+        self.rows = self.connection.stored if sql.startswith("SELECT key, content_hash") else []
+
+    def executemany(self, sql, rows):
+        self.connection.statements.append((" ".join(sql.split()), list(rows)))
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+class RecordingConnection:
+    """Snowflake-like connection that records statements and stores the given (key, hash, width, height) rows"""
+
+    def __init__(self, stored, fail_merge=False):
+        self.stored = stored
+        self.fail_merge = fail_merge
+        self.statements = []
+
+    def cursor(self, cursor_class=None):
+        return RecordingCursor(self)
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def rollback(self):
+        self.statements.append("ROLLBACK")
+
+def stored_rows(conn):
+    return conn.sqlite.execute("SELECT key, embedding FROM multimodal_documents ORDER BY key").fetchall()
+
+def test_reload_is_idempotent():
+    """Loading the same documents twice inserts them once and then reports them unchanged"""
+    conn = SQLiteConnection()
+    docs = make_documents()
+
+    assert upsert_documents(conn, docs) == {"inserted": 4, "updated": 0, "unchanged": 0, "deleted": 0}
+    first = stored_rows(conn)
+    assert upsert_documents(conn, docs, batch_size=3) == {"inserted": 0, "updated": 0, "unchanged": 4, "deleted": 0}
+    assert stored_rows(conn) == first
+
+def test_changed_and_missing_documents():
+    """Only changed rows are rewritten, and missing keys are deleted when requested"""
+    conn = SQLiteConnection()
+    docs = make_documents()
+    upsert_documents(conn, docs)
+
+    changed = [dict(docs[0], embedding=make_documents(seed=1)[0]["embedding"])] + docs[1:3]
+    changed.append({"key": "data/text/Carotid_20.docx", "embedding": docs[3]["embedding"]})
+    counts = upsert_documents(conn, changed, batch_size=2, delete_missing=True)
+
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 2, "deleted": 1}
+    keys = [key for key, _ in stored_rows(conn)]
+    assert keys == ["data/images/1.png", "data/images/2.png", "data/images/3.png", "data/text/Carotid_20.docx"]
+
+def test_snowflake_upsert_is_one_merge_in_a_transaction():
+    """On Snowflake new, changed and deleted rows are staged and applied by a single MERGE"""
+    docs = make_documents()
+    unchanged_hash = compute_content_hash(10, 20, format_embedding_for_snowflake(docs[1]["embedding"]))
+    conn = RecordingConnection([
+        ("data/images/1.png", "old-hash", 10, 20),
+        ("data/images/2.png", unchanged_hash, 10, 20),
+        ("data/images/9.png", "gone", 10, 20),
+    ])
+    counts = upsert_documents(conn, docs[:3], delete_missing=True)
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1, "deleted": 1}
+
+    statements = [s if isinstance(s, str) else s[0] for s in conn.statements]
+    commands = [s.split()[0] for s in statements if UPSERT_STAGE in s or s in ("BEGIN", "COMMIT")]
+    assert commands == ["CREATE", "BEGIN", "DELETE", "INSERT", "MERGE", "COMMIT"]
+    assert not any(s.startswith(("UPDATE multimodal_documents ", "DELETE FROM multimodal_documents "))
+                   for s in statements)
+    staged = next(rows for s, rows in (s for s in conn.statements if isinstance(s, tuple)) if UPSERT_STAGE in s)
+    assert sorted((row[0], row[-1]) for row in staged) == [
+        ("data/images/1.png", False), ("data/images/3.png", False), ("data/images/9.png", True),
+    ]
+
+    failing = RecordingConnection([], fail_merge=True)
+    try:
+        upsert_documents(failing, docs)
+    except RuntimeError:
+        pass
+    assert failing.statements[-1] == "ROLLBACK" and "COMMIT" not in failing.statements
+
+def test_merge_casts_into_a_vector_column():
+    """Against snowflake_setup.sql's `embedding VECTOR(FLOAT, 1024)` the staged strings are cast in the MERGE"""
+    docs = make_documents()
+    conn = RecordingConnection([("data/images/1.png", "old-hash", 10, 20)])
+    upsert_documents(conn, docs, vector_dimensions=1024)
+    merge = next(s for s in conn.statements if isinstance(s, str) and s.startswith("MERGE"))
+    cast = "STRTOK_TO_ARRAY(stage.embedding, ',')::VECTOR(FLOAT, 1024)"
+    assert f"embedding = {cast}" in merge and f"VALUES (stage.key, stage.width, stage.height, {cast}" in merge
+
+    # A STRING column takes the staged strings as they are
+    conn = RecordingConnection([])
+    upsert_documents(conn, docs)
+    merge = next(s for s in conn.statements if isinstance(s, str) and s.startswith("MERGE"))
+    assert "VECTOR" not in merge and "embedding = stage.embedding" in merge
+
+def test_updated_rows_are_recast_for_server_search():
+    """Updating an embedding clears its typed vector so the next materialization re-casts it"""
+    conn = SQLiteConnection()
+    docs = make_documents()
+    upsert_documents(conn, docs)
+    materialize_search_columns(conn, dimensions=8, vector_cast=SQLITE_VECTOR_CAST)
+
+    new_embedding = make_documents(seed=2)[0]["embedding"]
+    upsert_documents(conn, [dict(docs[0], embedding=new_embedding)], clear_vectors=True)
+    stale = conn.sqlite.execute("SELECT key FROM multimodal_documents WHERE embedding_vector IS NULL").fetchall()
+    assert stale == [("data/images/1.png",)]
+
+    materialize_search_columns(conn, dimensions=8, vector_cast=SQLITE_VECTOR_CAST)
+    vector, embedding = conn.sqlite.execute(
+        "SELECT embedding_vector, embedding FROM multimodal_documents WHERE key = 'data/images/1.png'"
+    ).fetchone()
+    assert vector == embedding
+
+def main():
+    """Main test function"""
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
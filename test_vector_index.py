@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory vector indexes used by the working final solution
+
+Runs without Snowflake: checks metadata derivation, pre-filtering, top-k and
+threshold handling against brute-force cosine similarity, and MaxSim scoring
+of the multi-vector index.
+"""
+
+import weakref
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from generate_tile_embeddings import split_page_into_tiles
+import vector_index
+from snowflake_utils import collapse_near_duplicates
+from vector_index import MultiVectorIndex, VectorIndex, build_document_metadata, find_near_duplicates, prune_vectors
+
+def make_index():
+    """Small index with images, a rendered PDF page, a DOCX file and an MR sidecar"""
+    rng = np.random.default_rng(0)
+    keys = [
+        "data/images/1.png",
+        "data/images/report_page_2.png",
+        "data/text/Carotid_20.docx",
+        "data/images/sub-01_T2TSE.json",
+    ]
+    docs = [{"key": key, "width": 10, "height": 20, "embedding": rng.normal(size=8).tolist()} for key in keys]
+    return VectorIndex.from_documents(docs, dimensions=8), docs
+
+def test_document_metadata():
+    """Document type, source file and MR modality are derived from the key"""
+    assert build_document_metadata("data/images/1.png") == {"document_type": "image", "source_file": "1.png"}
+    assert build_document_metadata("data/images/report_page_2.png")["source_file"] == "report.pdf"
+    assert build_document_metadata("data/text/Carotid_20.docx")["document_type"] == "text"
+
+    sidecar = build_document_metadata("data/images/sub-01_T2TSE.json")
+    assert sidecar["document_type"] == "metadata"
+    assert sidecar["modality"] == "MR"
+    assert sidecar["body_part"] == "SPINE"
+
+def test_search_matches_brute_force():
+    """Unfiltered search ranks documents like a plain cosine similarity loop"""
+    index, docs = make_index()
+    query = docs[2]["embedding"]
+
+    def cosine(a, b):
+        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+    expected = sorted(docs, key=lambda d: cosine(query, d["embedding"]), reverse=True)[:3]
+    results = index.search(query, k=3)
+
+    assert [r["key"] for r in results] == [d["key"] for d in expected]
+    assert abs(results[0]["similarity_score"] - 1.0) < 1e-5
+
+def test_filters_are_applied_before_scoring():
+    """Only documents matching every filter are returned"""
+    index, docs = make_index()
+
+    images = index.search(docs[2]["embedding"], k=10, filters={"document_type": "image"})
+    assert {r["key"] for r in images} == {"data/images/1.png", "data/images/report_page_2.png"}
+
+    mr = index.search(docs[0]["embedding"], k=10, filters={"modality": "MR", "document_type": ["metadata", "text"]})
+    assert [r["key"] for r in mr] == ["data/images/sub-01_T2TSE.json"]
+
+    assert index.search(docs[0]["embedding"], k=10, filters={"modality": "CT"}) == []
+
+@pytest.mark.parametrize("gather_fraction", [0.0, 1.0])
+def test_gathered_and_masked_scoring_agree(monkeypatch, gather_fraction):
+    """Filtered searches rank the same whether the candidate rows are gathered or the full scores masked"""
+    rng = np.random.default_rng(1)
+    docs = [{"key": f"data/{'images' if n % 3 else 'text'}/{n}.{'png' if n % 3 else 'docx'}",
+             "embedding": rng.normal(size=8).tolist()} for n in range(60)]
+    index = VectorIndex.from_documents(docs, dimensions=8)
+    query = rng.normal(size=8)
+    expected = [r["key"] for r in index.search(query, k=5, filters={"document_type": "text"}, mmr_lambda=0.5)]
+
+    monkeypatch.setattr(vector_index, "GATHER_FRACTION", gather_fraction)
+    results = index.search(query, k=5, filters={"document_type": "text"}, mmr_lambda=0.5)
+    assert [r["key"] for r in results] == expected
+    assert all(r["document_type"] == "text" for r in results)
+
+def test_unfiltered_search_skips_the_mask(monkeypatch):
+    index, docs = make_index()
+    monkeypatch.setattr(index, "filter_mask", lambda filters=None: pytest.fail("mask built without filters"))
+    assert index.search(docs[0]["embedding"], k=1)[0]["key"] == docs[0]["key"]
+    assert index.search(docs[0]["embedding"], k=1, filters={"modality": None})[0]["key"] == docs[0]["key"]
+
+def test_k_and_threshold():
+    """k caps the number of results and the threshold drops weak matches"""
+    index, docs = make_index()
+    assert len(index.search(docs[0]["embedding"], k=1)) == 1
+    assert [r["key"] for r in index.search(docs[0]["embedding"], k=10, threshold=0.999)] == ["data/images/1.png"]
+
+def test_search_many_matches_single_queries():
+    """Batched search returns the same ranking as one search per query"""
+    index, docs = make_index()
+    queries = [doc["embedding"] for doc in docs]
+
+    batched = index.search_many(queries, k=2, filters={"document_type": ["image", "text"]})
+    single = [index.search(q, k=2, filters={"document_type": ["image", "text"]}) for q in queries]
+
+    assert [[r["key"] for r in results] for results in batched] == [[r["key"] for r in results] for results in single]
+    assert index.search_many([], k=2) == []
+
+class FakeCursor:
+    """Cursor returning the stored rows for the full-table select"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.rows)
+
+def test_working_final_search_many_embeds_once(monkeypatch):
+    """search_many sends every query in one embedding request"""
+    import retrieval
+    import snowflake_solution_working_final as solution
+
+    _, docs = make_index()
+    rows = [
+        {"KEY": d["key"], "WIDTH": 10, "HEIGHT": 20, "EMBEDDING": ",".join(map(str, d["embedding"]))}
+        for d in docs
+    ]
+    requests_sent = []
+
+    def fake_post(url, json, timeout):
+        requests_sent.append(json)
+        return SimpleNamespace(json=lambda: {"embeddings": [docs[0]["embedding"], docs[2]["embedding"]]},
+                               raise_for_status=lambda: None)
+
+    monkeypatch.setattr(solution.requests, "post", fake_post)
+    monkeypatch.setattr(retrieval, "_vector_indexes", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(solution.get_config(), "embedding_dimensions", 8)
+
+    results = solution.search_many(FakeConnection(rows), ["q1", "q2"], k=1, serverless_url="http://embed")
+
+    assert len(requests_sent) == 1
+    assert requests_sent[0]["data"]["input"] == ["q1", "q2"]
+    assert [r[0]["key"] for r in results] == ["data/images/1.png", "data/text/Carotid_20.docx"]
+
+def test_mmr_skips_near_duplicates():
+    """A near-duplicate of the best match does not take the second slot"""
+    query, a, b = np.eye(8)[:3]
+    docs = [
+        {"key": "data/text/Carotid_20.docx", "embedding": (0.9 * query + 0.44 * a).tolist()},
+        {"key": "data/text/Copy of Carotid_20.docx", "embedding": (0.9 * query + 0.43 * a).tolist()},
+        {"key": "data/text/TTE_20.docx", "embedding": (0.8 * query + 0.6 * b).tolist()},
+    ]
+    index = VectorIndex.from_documents(docs, dimensions=8)
+
+    plain = [r["key"] for r in index.search(query, k=2)]
+    diverse = [r["key"] for r in index.search(query, k=2, mmr_lambda=0.7)]
+
+    assert plain == ["data/text/Copy of Carotid_20.docx", "data/text/Carotid_20.docx"]
+    assert diverse == ["data/text/Copy of Carotid_20.docx", "data/text/TTE_20.docx"]
+    assert index.search(query, k=2, mmr_lambda=1.0) == index.search(query, k=2)
+
+def test_collapse_near_duplicates():
+    """Identical files and near-identical embeddings are collapsed onto the first document"""
+    rng = np.random.default_rng(3)
+    base = rng.normal(size=8)
+    docs = [
+        {"key": "data/text/Carotid_20.docx"},
+        {"key": "data/text/Copy of Carotid_20.docx"},
+        {"key": "data/images/1.png", "embedding": base.tolist()},
+        {"key": "data/images/2.png", "embedding": (base * 1.0001).tolist()},
+        {"key": "data/images/3.png", "embedding": rng.normal(size=8).tolist()},
+    ]
+    unique, duplicates = collapse_near_duplicates(docs)
+
+    assert [d["key"] for d in unique] == ["data/text/Carotid_20.docx", "data/images/1.png", "data/images/3.png"]
+    assert duplicates == {
+        "data/text/Copy of Carotid_20.docx": "data/text/Carotid_20.docx",
+        "data/images/2.png": "data/images/1.png",
+    }
+
+def test_near_duplicates_across_blocks():
+    """Blockwise comparison finds the same canonical embeddings as comparing every pair"""
+    rng = np.random.default_rng(4)
+    base = rng.normal(size=(20, 8))
+    embeddings = base[rng.integers(0, 20, size=100)] + rng.normal(scale=1e-4, size=(100, 8))
+    expected = find_near_duplicates(embeddings, block_size=len(embeddings))
+    assert all(expected[expected[i]] == expected[i] <= i for i in range(100))
+    assert len(set(expected)) == 20
+    for block_size in (1, 7, 32):
+        assert find_near_duplicates(embeddings, block_size=block_size) == expected
+
+def test_maxsim_finds_page_by_single_tile():
+    """A page matching the query in one tile outranks pages that are only similar on average"""
+    rng = np.random.default_rng(1)
+    figure = rng.normal(size=8)
+    docs = [
+        {"key": f"data/images/{n}.png", "embeddings": rng.normal(size=(4, 8)).tolist()}
+        for n in range(1, 6)
+    ]
+    # Page 3 contains the figure in one of its four tiles
+    docs[2]["embeddings"][1] = figure.tolist()
+
+    index = MultiVectorIndex.from_documents(docs, dimensions=8)
+    results = index.search(figure, k=2)
+
+    assert results[0]["key"] == "data/images/3.png"
+    assert abs(results[0]["similarity_score"] - 1.0) < 1e-5
+    assert index.search(figure, k=2, filters={"source_file": "1.png"})[0]["key"] == "data/images/1.png"
+
+    # Pages added after the first search are found too
+    index.add("data/images/6.png", [figure.tolist()])
+    assert {r["key"] for r in index.search(figure, k=2)} == {"data/images/3.png", "data/images/6.png"}
+
+def test_prune_drops_duplicate_tiles():
+    """Near-identical tiles, like blank margins, are stored once"""
+    blank = np.ones(8, dtype=np.float32) / np.sqrt(8)
+    other = np.eye(8, dtype=np.float32)[0]
+    kept = prune_vectors(np.vstack([blank, blank, other, blank]))
+    assert len(kept) == 2
+
+def test_split_page_into_tiles():
+    """Tiles cover the page in a grid"""
+    tiles = split_page_into_tiles(Image.new("RGB", (100, 200)), grid=2, overlap=0.0)
+    assert [tile.size for tile in tiles] == [(50, 100)] * 4
+
+def main():
+    """Main test function"""
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+if __name__ == "__main__":
+    main()
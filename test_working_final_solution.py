@@ -10,6 +10,7 @@ from snowflake.connector import DictCursor
 from tqdm import tqdm
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
+from embedding_codec import format_embedding_for_snowflake, parse_embedding_from_string
 
 # Load environment variables
 try:
@@ -41,25 +42,6 @@ def setup_snowflake_connection():
     
     return conn
 
-def format_embedding_for_snowflake(embedding):
-    """Format embedding to avoid scientific notation issues"""
-    # Format each number to avoid scientific notation
-    formatted_values = []
-    for val in embedding:
-        # Use format to avoid scientific notation for small numbers
-        if abs(val) < 1e-10:
-            # For very small numbers, use scientific notation but ensure it's parseable
-            formatted_val = f"{val:.15g}"
-        else:
-            # For normal numbers, use fixed decimal format
-            formatted_val = f"{val:.15f}".rstrip('0').rstrip('.')
-        formatted_values.append(formatted_val)
-    return ','.join(formatted_values)
-
-def parse_embedding_from_string(embedding_str):
-    """Parse embedding from comma-separated string back to list"""
-    return [float(x) for x in embedding_str.split(',')]
-
 def load_embeddings_to_snowflake(conn):
     """Load pre-generated embeddings and store in Snowflake using STRING approach with proper formatting"""
     with open("data/embeddings.json", "r") as data_file:
@@ -0,0 +1,275 @@
+"""
+Lightweight latency tracing for Snowflake Multimodal Agents Lab
+
+Stages of an agent turn (LLM calls, query embedding, SQL, image decoding and chat
+history I/O) are wrapped in context-managed spans:
+
+    with get_tracer().span("llm.select_tool", kind="llm", model=LLM):
+        ...
+
+Spans nest through a context variable, so a span opened inside another becomes its
+child without passing anything around. Finished spans are kept in a fixed-size ring
+buffer; when a root span ends, its whole trace can be written to a JSON lines file
+in the OTLP/JSON layout used by the OpenTelemetry file exporter. `latency_breakdown`
+splits a turn's wall time by span kind, using each span's self time so the parts
+add up to the total.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from snowflake_config import get_config
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_ns", "end_ns", "_start_counter", "duration_seconds", "error")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._start_counter = time.perf_counter()
+        self.duration_seconds = 0.0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def _finish(self) -> None:
+        self.duration_seconds = time.perf_counter() - self._start_counter
+        self.end_ns = self.start_ns + int(self.duration_seconds * 1e9)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "duration_seconds": round(self.duration_seconds, 6),
+            "attributes": dict(self.attributes),
+            "error": self.error,
+        }
+
+    def __repr__(self) -> str:
+        return f"Span({self.name}, {self.duration_seconds * 1000:.1f} ms)"
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class JsonSpanExporter:
+    """
+    Append finished traces to a JSON lines file in the OTLP/JSON layout
+
+    Args:
+        path: Output file; one `resourceSpans` object is written per trace
+        service_name: `service.name` resource attribute
+    """
+
+    def __init__(self, path: str, service_name: str = "snowflake-multimodal-agent"):
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def _otlp_span(self, span: Span) -> Dict[str, Any]:
+        otlp = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in {"span.kind": span.kind, **span.attributes}.items()
+            ],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp["parentSpanId"] = span.parent_id
+        return otlp
+
+    def export(self, spans: List[Span]) -> None:
+        record = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(self.service_name)}]},
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [self._otlp_span(s) for s in spans]}],
+            }]
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(record)
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+class Tracer:
+    """
+    Creates spans and keeps the most recent ones in memory
+
+    Args:
+        capacity: Number of finished spans kept in the ring buffer
+        exporter: Receives every finished trace (root span and descendants)
+        enabled: If False, spans are not timed or recorded
+    """
+
+    def __init__(self, capacity: int = 2048, exporter: Optional[JsonSpanExporter] = None,
+                 enabled: bool = True):
+        self.enabled = enabled
+        self.exporter = exporter
+        self._buffer: deque = deque(maxlen=capacity)
+        self._open_traces: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+        self._current: contextvars.ContextVar = contextvars.ContextVar(f"span_{id(self)}", default=None)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes) -> Iterator[Optional[Span]]:
+        """
+        Time the enclosed block as a span
+
+        Args:
+            name: Span name, e.g. `llm.generate_answer`
+            kind: Stage the span belongs to in the latency breakdown (`llm`, `embedding`,
+                `sql`, `image`, `history`, ...)
+            **attributes: Attributes stored on the span
+
+        Yields:
+            Span: The open span (None when tracing is disabled)
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        parent = self._current.get()
+        span = Span(name, kind, parent.trace_id if parent else uuid.uuid4().hex,
+                    parent.span_id if parent else None, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.error = f"{type(error).__name__}: {error}"
+            raise
+        finally:
+            self._current.reset(token)
+            span._finish()
+            self._record(span, is_root=parent is None)
+
+    def _record(self, span: Span, is_root: bool) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            trace = self._open_traces.setdefault(span.trace_id, [])
+            trace.append(span)
+            if is_root:
+                del self._open_traces[span.trace_id]
+        if is_root and self.exporter is not None:
+            try:
+                self.exporter.export(trace)
+            except OSError as e:
+                print(f"Warning: Could not export trace {span.trace_id}: {e}")
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        """Finished spans in the ring buffer, oldest first, optionally for one trace"""
+        with self._lock:
+            spans = list(self._buffer)
+        return spans if trace_id is None else [s for s in spans if s.trace_id == trace_id]
+
+    def last_trace(self) -> List[Span]:
+        """Spans of the most recently finished trace"""
+        with self._lock:
+            root = next((s for s in reversed(self._buffer) if s.parent_id is None), None)
+        return self.spans(root.trace_id) if root else []
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffer.clear()
+
+def latency_breakdown(spans: List[Span]) -> Dict[str, Any]:
+    """
+    Split a trace's wall time by span kind
+
+    Each span contributes its self time: its duration minus the time covered by at
+    least one of its direct children. Children that ran concurrently (e.g. parallel
+    tool calls) cover their parent's time once, so when stages run sequentially they
+    add up to the root span's duration. Concurrent children each count their own
+    full duration, so with parallel stages the sum can exceed the total.
+
+    Args:
+        spans: Spans of one trace
+
+    Returns:
+        Dict[str, Any]: `total_seconds`, `stages` (seconds per kind, largest first)
+            and `spans` (count per kind)
+    """
+    root = next((s for s in spans if s.parent_id is None), None)
+    if root is None:
+        return {"total_seconds": 0.0, "stages": {}, "spans": {}}
+
+    child_intervals: Dict[str, List[Tuple[int, int]]] = {}
+    for span in spans:
+        if span.parent_id and span.end_ns is not None:
+            child_intervals.setdefault(span.parent_id, []).append((span.start_ns, span.end_ns))
+
+    # Union of each span's child intervals
+    child_seconds: Dict[str, float] = {}
+    for parent_id, intervals in child_intervals.items():
+        covered_ns, covered_until = 0, None
+        for start, end in sorted(intervals):
+            if covered_until is not None and start < covered_until:
+                start = covered_until
+            if end > start:
+                covered_ns += end - start
+                covered_until = end
+        child_seconds[parent_id] = covered_ns / 1e9
+
+    stages: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for span in spans:
+        self_seconds = max(0.0, span.duration_seconds - child_seconds.get(span.span_id, 0.0))
+        stages[span.kind] = stages.get(span.kind, 0.0) + self_seconds
+        counts[span.kind] = counts.get(span.kind, 0) + 1
+
+    return {
+        "total_seconds": round(root.duration_seconds, 6),
+        "stages": {kind: round(seconds, 6) for kind, seconds in sorted(stages.items(), key=lambda x: -x[1])},
+        "spans": counts,
+    }
+
+def format_breakdown(breakdown: Dict[str, Any]) -> str:
+    """One-line summary of a latency breakdown, e.g. `total 1234.5 ms (llm 1100.0, sql 80.2, ...)`"""
+    stages = ", ".join(f"{kind} {seconds * 1000:.1f}" for kind, seconds in breakdown["stages"].items())
+    return f"total {breakdown['total_seconds'] * 1000:.1f} ms ({stages})"
+
+_default_tracer: Optional[Tracer] = None
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer configured by `tracing_enabled`, `trace_buffer_size` and `trace_export_file`"""
+    global _default_tracer
+    if _default_tracer is None:
+        config = get_config()
+        exporter = JsonSpanExporter(config.trace_export_file) if config.trace_export_file else None
+        _default_tracer = Tracer(config.trace_buffer_size, exporter, config.tracing_enabled)
+    return _default_tracer
@@ -0,0 +1,544 @@
+"""
+In-memory vector index for Snowflake Multimodal Agents Lab
+
+Holds the document embeddings as a single normalized NumPy matrix so a query is
+scored with one matrix-vector product instead of parsing and comparing rows one at
+a time. Each document carries metadata (document type, source file and, for MR
+JSON sidecars, modality and body part) indexed as posting lists, so filters select
+the candidate rows before any scoring happens.
+
+MultiVectorIndex is the optional late-interaction variant that keeps one vector
+per page tile and scores pages with MaxSim.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+TEXT_EXTENSIONS = ('.txt', '.md', '.csv', '.docx')
+METADATA_EXTENSIONS = ('.json',)
+
+# Metadata fields that get posting lists and can be used as search filters
+FILTERABLE_FIELDS = ("document_type", "source_file", "modality", "body_part")
+# Filters keeping at most this fraction of the rows score only the gathered rows, others mask the full scores
+GATHER_FRACTION = 0.2
+
+# Rendered PDF pages are stored as `{base_name}_page_{n}.png` (or .jpg / .webp)
+PDF_PAGE_PATTERN = re.compile(r"^(?P<source>.+)_page_\d+\.(?:png|jpe?g|webp)$", re.IGNORECASE)
+# Pages ingested without rendering are referenced as `{pdf_path}#page={n}`
+PDF_PAGE_KEY_PATTERN = re.compile(r"^(?P<pdf>.+\.pdf)#page=(?P<page>\d+)$", re.IGNORECASE)
+
+def make_page_key(pdf_path: str, page_number: int) -> str:
+    """Key of a PDF page that is rendered on demand (page numbers start at 1)"""
+    return f"{pdf_path}#page={page_number}"
+
+def parse_page_key(key: str) -> Optional[tuple]:
+    """Split a page key into (pdf_path, page_number), or None if the key is not a page key"""
+    match = PDF_PAGE_KEY_PATTERN.match(key)
+    if match is None:
+        return None
+    return match.group("pdf"), int(match.group("page"))
+
+def get_document_type(key: str) -> str:
+    """
+    Classify a document key by its file extension
+
+    Args:
+        key: Document key (file path)
+
+    Returns:
+        str: One of `image`, `text`, `metadata` or `other`
+    """
+    lowered = key.lower()
+    if lowered.endswith(IMAGE_EXTENSIONS) or PDF_PAGE_KEY_PATTERN.match(key):
+        return "image"
+    if lowered.endswith(TEXT_EXTENSIONS):
+        return "text"
+    if lowered.endswith(METADATA_EXTENSIONS):
+        return "metadata"
+    return "other"
+
+def get_source_file(key: str) -> str:
+    """
+    Get the file a document came from
+
+    Rendered PDF pages and page keys map back to their PDF's file name; every other
+    document is its own source.
+
+    Args:
+        key: Document key (file path)
+
+    Returns:
+        str: Source file name
+    """
+    page = parse_page_key(key)
+    if page is not None:
+        return os.path.basename(page[0])
+    filename = os.path.basename(key)
+    match = PDF_PAGE_PATTERN.match(filename)
+    if match:
+        return f"{match.group('source')}.pdf"
+    return filename
+
+def build_document_metadata(key: str) -> Dict[str, Any]:
+    """
+    Derive the filterable metadata for a document key
+
+    For JSON imaging sidecars (e.g. `sub-01_T2TSE.json`) that exist locally, the
+    `Modality` and `BodyPartExamined` fields are included as well.
+
+    Args:
+        key: Document key (file path)
+
+    Returns:
+        Dict[str, Any]: Metadata with `document_type`, `source_file` and optionally `modality` / `body_part`
+    """
+    metadata = {
+        "document_type": get_document_type(key),
+        "source_file": get_source_file(key),
+    }
+
+    if metadata["document_type"] == "metadata" and os.path.exists(key):
+        try:
+            with open(key, "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+            if "Modality" in sidecar:
+                metadata["modality"] = sidecar["Modality"]
+            if "BodyPartExamined" in sidecar:
+                metadata["body_part"] = sidecar["BodyPartExamined"]
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read metadata from {key}: {e}")
+
+    return metadata
+
+class VectorIndex:
+    """
+    Normalized embedding matrix with posting-list metadata filters
+
+    Args:
+        dimensions: Embedding dimensions
+    """
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+        self.keys: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self._rows: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._postings: Optional[Dict[str, Dict[Any, np.ndarray]]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, embedding: Sequence[float], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Add a document to the index
+
+        Args:
+            key: Document key
+            embedding: Embedding values
+            metadata: Filterable metadata. Defaults to `build_document_metadata(key)`.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dimensions,):
+            raise ValueError(f"Expected {self.dimensions} dimensions for {key}, got {vector.shape}")
+
+        self.keys.append(key)
+        self.metadata.append(metadata if metadata is not None else build_document_metadata(key))
+        self._rows.append(vector)
+        self._matrix = None
+        self._postings = None
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]], dimensions: int = 1024) -> "VectorIndex":
+        """
+        Build an index from documents with `key` and `embedding` fields
+
+        Any other fields (e.g. width and height) are kept alongside the derived metadata.
+        """
+        index = cls(dimensions)
+        for doc in documents:
+            metadata = build_document_metadata(doc["key"])
+            metadata.update({k: v for k, v in doc.items() if k not in ("key", "embedding")})
+            index.add(doc["key"], doc["embedding"], metadata)
+        return index
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Row-normalized embedding matrix of shape (n, dimensions)"""
+        if self._matrix is None:
+            if self._rows:
+                matrix = np.vstack(self._rows)
+            else:
+                matrix = np.empty((0, self.dimensions), dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._matrix = matrix / norms
+        return self._matrix
+
+    def embedding(self, position: int) -> np.ndarray:
+        """Get the stored (unnormalized) embedding at a row position"""
+        return self._rows[position]
+
+    def _get_postings(self) -> Dict[str, Dict[Any, np.ndarray]]:
+        """Posting lists (sorted row positions) for each filterable metadata field"""
+        if self._postings is None:
+            rows_by_value: Dict[str, Dict[Any, List[int]]] = {field: {} for field in FILTERABLE_FIELDS}
+            for row, metadata in enumerate(self.metadata):
+                for field in FILTERABLE_FIELDS:
+                    if field in metadata:
+                        rows_by_value[field].setdefault(metadata[field], []).append(row)
+            self._postings = {
+                field: {value: np.asarray(rows, dtype=np.int64) for value, rows in values.items()}
+                for field, values in rows_by_value.items()
+            }
+        return self._postings
+
+    def filter_mask(self, filters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """
+        Build the row bitmap selected by metadata filters
+
+        Args:
+            filters: Field -> value, or field -> list of accepted values. Fields are ANDed, values ORed.
+
+        Returns:
+            np.ndarray: Boolean mask over the index rows
+        """
+        mask = np.ones(len(self.keys), dtype=bool)
+        if not filters:
+            return mask
+
+        postings = self._get_postings()
+        for field, accepted in filters.items():
+            if accepted is None:
+                continue
+            if field not in postings:
+                raise ValueError(f"Unsupported filter field: {field}. Use one of {', '.join(FILTERABLE_FIELDS)}")
+            if not isinstance(accepted, (list, tuple, set)):
+                accepted = [accepted]
+            field_mask = np.zeros(len(self.keys), dtype=bool)
+            for value in accepted:
+                rows = postings[field].get(value)
+                if rows is not None:
+                    field_mask[rows] = True
+            mask &= field_mask
+        return mask
+
+    def search(self, query_embedding: Sequence[float], k: int = 2, threshold: Optional[float] = None,
+               filters: Optional[Dict[str, Any]] = None, mmr_lambda: Optional[float] = None,
+               candidate_pool: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Find the documents most similar to a query
+
+        Args:
+            query_embedding: Query embedding values
+            k: Maximum number of results
+            threshold: Minimum cosine similarity for a result to be returned
+            filters: Metadata filters applied before scoring, see `filter_mask`
+            mmr_lambda: If set below 1, re-rank with maximal marginal relevance using this relevance weight
+            candidate_pool: Number of top-scoring documents MMR chooses from. Defaults to 4 * k.
+
+        Returns:
+            List[Dict[str, Any]]: Results with `key`, `similarity_score` and the document metadata, best first
+        """
+        return self.search_many([query_embedding], k, threshold, filters, mmr_lambda, candidate_pool)[0]
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int = 2, threshold: Optional[float] = None,
+                    filters: Optional[Dict[str, Any]] = None, mmr_lambda: Optional[float] = None,
+                    candidate_pool: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Find the documents most similar to each of several queries
+
+        All queries are scored against the candidate rows with a single matrix-matrix
+        product; arguments are as for `search`.
+
+        Returns:
+            List[List[Dict[str, Any]]]: Results for each query, in query order
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dimensions)
+        # Without active filters every row is a candidate; skip building and applying the mask
+        filtered = bool(filters) and any(accepted is not None for accepted in filters.values())
+        candidates = np.flatnonzero(self.filter_mask(filters)) if filtered else np.arange(len(self.keys))
+        if k <= 0 or candidates.size == 0:
+            return [[] for _ in range(len(queries))]
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        # (candidates x queries) similarity matrix in one GEMM. Gathering the candidate
+        # rows copies them, which only pays off when the filters keep few of them.
+        if filtered and candidates.size <= GATHER_FRACTION * len(self.keys):
+            scores = self.matrix[candidates] @ queries.T
+        else:
+            scores = self.matrix @ queries.T
+            if filtered:
+                scores = scores[candidates]
+
+        return [
+            self._rank(candidates, scores[:, q], k, threshold, mmr_lambda, candidate_pool)
+            for q in range(len(queries))
+        ]
+
+    def _rank(self, candidates: np.ndarray, scores: np.ndarray, k: int, threshold: Optional[float],
+              mmr_lambda: Optional[float], candidate_pool: Optional[int]) -> List[Dict[str, Any]]:
+        """Turn one query's candidate scores into the ranked result list"""
+        positions = np.arange(candidates.size)
+        if threshold is not None:
+            positions = positions[scores >= threshold]
+
+        use_mmr = mmr_lambda is not None and mmr_lambda < 1.0
+        pool = max(candidate_pool or 4 * k, k) if use_mmr else k
+
+        if positions.size > pool:
+            positions = positions[np.argpartition(-scores[positions], pool - 1)[:pool]]
+        positions = positions[np.argsort(-scores[positions], kind="stable")]
+
+        if use_mmr:
+            positions = positions[mmr_select(scores[positions], self.matrix[candidates[positions]], k, mmr_lambda)]
+
+        return [
+            {"key": self.keys[row], "similarity_score": float(scores[p]), **self.metadata[row]}
+            for p, row in zip(positions, candidates[positions])
+        ]
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, mmr_lambda: float = 0.7) -> np.ndarray:
+    """
+    Pick results by maximal marginal relevance
+
+    Each step picks the candidate maximizing
+    `mmr_lambda * relevance - (1 - mmr_lambda) * max similarity to the picks so far`,
+    so a near-duplicate of an earlier pick loses to a slightly less relevant but different document.
+
+    Args:
+        relevance: Query similarity of each candidate
+        vectors: Row-normalized candidate vectors
+        k: Number of results to pick
+        mmr_lambda: Weight of relevance versus diversity, between 0 and 1
+
+    Returns:
+        np.ndarray: Positions of the picked candidates, in pick order
+    """
+    k = min(k, len(relevance))
+    picked = np.empty(k, dtype=np.int64)
+    available = np.ones(len(relevance), dtype=bool)
+    redundancy = np.full(len(relevance), -np.inf, dtype=np.float32)
+
+    for step in range(k):
+        if step == 0:
+            marginal = np.asarray(relevance, dtype=np.float32).copy()
+        else:
+            marginal = mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        picked[step] = best
+        available[best] = False
+        # One matrix-vector product updates every candidate's similarity to the picks
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+
+    return picked
+
+def find_near_duplicates(embeddings: Sequence[Sequence[float]], similarity_threshold: float = 0.995,
+                         block_size: int = 1024) -> List[int]:
+    """
+    Map each embedding to the first earlier embedding it nearly duplicates
+
+    Embeddings are compared a block at a time: one matrix product against the
+    embeddings kept from earlier blocks, one within the block, so only the
+    within-block resolution runs row by row.
+
+    Args:
+        embeddings: Embeddings in ingestion order
+        similarity_threshold: Cosine similarity at or above which two embeddings are duplicates
+        block_size: Embeddings compared per matrix product
+
+    Returns:
+        List[int]: For each position, the position of its canonical embedding (itself if unique)
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.size == 0:
+        return []
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+
+    canonical = np.arange(len(matrix))
+    kept = np.empty(0, dtype=np.int64)
+    for start in range(0, len(matrix), block_size):
+        block = matrix[start:start + block_size]
+        earlier = block @ matrix[kept].T
+        earlier_best = earlier.argmax(axis=1) if len(kept) else None
+        within = block @ block.T
+        block_kept: List[int] = []
+        for offset in range(len(block)):
+            best_similarity, best = -np.inf, offset
+            if earlier_best is not None:
+                best_similarity, best = earlier[offset, earlier_best[offset]], kept[earlier_best[offset]]
+            if block_kept:
+                candidate = int(np.argmax(within[offset, block_kept]))
+                # Ties go to the earlier embedding, which is kept from an earlier block
+                if within[offset, block_kept[candidate]] > best_similarity:
+                    best_similarity, best = within[offset, block_kept[candidate]], start + block_kept[candidate]
+            if best_similarity >= similarity_threshold:
+                canonical[start + offset] = best
+            else:
+                block_kept.append(offset)
+        kept = np.concatenate([kept, start + np.asarray(block_kept, dtype=np.int64)])
+    return canonical.tolist()
+
+def prune_vectors(vectors: np.ndarray, similarity_threshold: float = 0.98,
+                  max_vectors: Optional[int] = None) -> np.ndarray:
+    """
+    Drop near-duplicate vectors, e.g. embeddings of blank page-margin tiles
+
+    Vectors are visited in order and kept only if their cosine similarity to every
+    vector kept so far is below the threshold.
+
+    Args:
+        vectors: Row-normalized vectors of shape (n, dimensions)
+        similarity_threshold: Vectors at least this similar to a kept vector are dropped
+        max_vectors: Keep at most this many vectors
+
+    Returns:
+        np.ndarray: The kept rows
+    """
+    kept: List[int] = []
+    for i in range(len(vectors)):
+        if max_vectors is not None and len(kept) >= max_vectors:
+            break
+        if not kept or np.max(vectors[kept] @ vectors[i]) < similarity_threshold:
+            kept.append(i)
+    return vectors[kept]
+
+class MultiVectorIndex:
+    """
+    Late-interaction index storing several vectors (one per tile) for each page
+
+    Pages are scored with MaxSim: for every query vector, the best matching tile
+    of the page, averaged over query vectors. To keep that affordable, a
+    VectorIndex over the per-page centroids first selects the most promising
+    pages (and applies any metadata filters); only those pages are scored tile by tile.
+
+    Args:
+        dimensions: Embedding dimensions
+        prune_threshold: Tiles at least this similar to another tile of the same page are dropped
+        max_vectors_per_page: Maximum number of tiles stored per page
+    """
+
+    def __init__(self, dimensions: int = 1024, prune_threshold: float = 0.98,
+                 max_vectors_per_page: Optional[int] = None):
+        self.dimensions = dimensions
+        self.prune_threshold = prune_threshold
+        self.max_vectors_per_page = max_vectors_per_page
+        self.centroids = VectorIndex(dimensions)
+        self._page_vectors: List[np.ndarray] = []
+        # Row of each page in the centroid index, kept up to date by add() instead of per query
+        self._positions: Dict[str, int] = {}
+        self._tiles: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def keys(self) -> List[str]:
+        return self.centroids.keys
+
+    def add(self, key: str, embeddings: Sequence[Sequence[float]], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Add a page with one embedding per tile
+
+        Args:
+            key: Page key
+            embeddings: Tile embeddings
+            metadata: Filterable metadata. Defaults to `build_document_metadata(key)`.
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimensions)
+        if len(vectors) == 0:
+            raise ValueError(f"No tile embeddings given for {key}")
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = prune_vectors(vectors / norms, self.prune_threshold, self.max_vectors_per_page)
+
+        self.centroids.add(key, vectors.mean(axis=0), metadata)
+        self._positions[key] = len(self.centroids) - 1
+        self._page_vectors.append(vectors)
+        self._tiles = None
+        self._offsets = None
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]], dimensions: int = 1024,
+                       **kwargs) -> "MultiVectorIndex":
+        """Build an index from documents with `key` and `embeddings` (list of tile embeddings) fields"""
+        index = cls(dimensions, **kwargs)
+        for doc in documents:
+            metadata = build_document_metadata(doc["key"])
+            metadata.update({k: v for k, v in doc.items() if k not in ("key", "embeddings")})
+            index.add(doc["key"], doc["embeddings"], metadata)
+        return index
+
+    @property
+    def vector_count(self) -> int:
+        """Total number of tile vectors stored after pruning"""
+        return sum(len(vectors) for vectors in self._page_vectors)
+
+    def _get_tiles(self):
+        """All tile vectors in one matrix plus the start row of each page"""
+        if self._tiles is None:
+            self._tiles = np.vstack(self._page_vectors)
+            sizes = [len(vectors) for vectors in self._page_vectors]
+            self._offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        return self._tiles, self._offsets
+
+    def search(self, query_embeddings, k: int = 2, threshold: Optional[float] = None,
+               filters: Optional[Dict[str, Any]] = None, candidates: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Find the pages most similar to a query using MaxSim
+
+        Args:
+            query_embeddings: A query embedding, or several (one per query token/region)
+            k: Maximum number of results
+            threshold: Minimum MaxSim score for a result to be returned
+            filters: Metadata filters applied to the centroid prefilter, see `VectorIndex.filter_mask`
+            candidates: Number of pages kept by the centroid prefilter. Defaults to max(4 * k, 32).
+
+        Returns:
+            List[Dict[str, Any]]: Results with `key`, `similarity_score` and the page metadata, best first
+        """
+        if k <= 0 or len(self) == 0:
+            return []
+
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dimensions)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        # Stage 1: cheap single-vector prefilter over page centroids
+        candidates = max(4 * k, 32) if candidates is None else candidates
+        shortlist = self.centroids.search(queries.mean(axis=0), k=candidates, filters=filters)
+        if not shortlist:
+            return []
+        pages = np.array([self._positions[result["key"]] for result in shortlist], dtype=np.int64)
+
+        # Stage 2: MaxSim over the tiles of the shortlisted pages only
+        tiles, offsets = self._get_tiles()
+        starts, ends = offsets[pages], offsets[pages + 1]
+        rows = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        similarities = tiles[rows] @ queries.T
+        segment_starts = np.concatenate([[0], np.cumsum(ends - starts)[:-1]])
+        scores = np.maximum.reduceat(similarities, segment_starts, axis=0).mean(axis=1)
+
+        if threshold is not None:
+            keep = scores >= threshold
+            pages, scores = pages[keep], scores[keep]
+
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [
+            {"key": self.centroids.keys[page], "similarity_score": float(scores[i]), **self.centroids.metadata[page]}
+            for i, page in zip(order, pages[order])
+        ]